@@ -6,14 +6,29 @@ botocore docs: http://botocore.readthedocs.io/en/latest/reference/services/logs.
 
 from __future__ import unicode_literals, print_function
 
+import heapq
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import maya
 from .gcdt_logging import getLogger
 
-from .utils import GracefulExit
+from .utils import GracefulExit, all_pages, iter_items
 
 
 log = getLogger(__name__)
 
+# log events can arrive late, this is how far we look back when tailing (ms)
+# note: each poll re-reads this window so keep it short, a busy log group
+# would otherwise be downloaded over and over
+TAIL_LOOKBACK = 5 * 1000
+TAIL_MAX_PAGES_PER_POLL = 10
+TAIL_MIN_INTERVAL = 0.5
+TAIL_MAX_INTERVAL = 10.0
+LOG_SLICE_SIZE = 15 * 60 * 1000  # ms
+LOG_SLICE_WORKERS = 4
+
 
 def delete_log_group(awsclient, log_group_name):
     """Delete the specified log group
@@ -53,37 +68,199 @@ def put_retention_policy(awsclient, log_group_name, retention_in_days):
     )
 
 
-def filter_log_events(awsclient, log_group_name, start_ts, end_ts=None):
+def filter_log_events(awsclient, log_group_name, start_ts, end_ts=None,
+                      filter_pattern=None):
     """
     Note: this is used to retrieve logs in ramuda.
 
     :param log_group_name: log group name
     :param start_ts: timestamp
     :param end_ts: timestamp
+    :param filter_pattern: cloudwatch logs filter pattern
     :return: list of log entries
     """
     client_logs = awsclient.get_client('logs')
-    # TODO use all_pages instead!
-    logs = []
-    next_token = None
-    while True:
-        request = {
-            'logGroupName': log_group_name,
-            'startTime': start_ts
-        }
-        if end_ts:
-            request['endTime'] = end_ts
-        if next_token:
-            request['nextToken'] = next_token
-        response = client_logs.filter_log_events(**request)
-        logs.extend(
-            [{'timestamp': e['timestamp'], 'message': e['message']}
-             for e in response['events']]
-        )
-        if 'nextToken' not in response:
-            break
-        next_token = response['nextToken']
-    return logs
+    request = {
+        'logGroupName': log_group_name,
+        'startTime': start_ts
+    }
+    if end_ts:
+        request['endTime'] = end_ts
+    if filter_pattern:
+        request['filterPattern'] = filter_pattern
+    return all_pages(
+        client_logs.filter_log_events,
+        request,
+        lambda r: [{'timestamp': e['timestamp'], 'message': e['message']}
+                   for e in r['events']]
+    )
+
+
+def iter_log_events(awsclient, log_group_name, start_ts, end_ts=None,
+                    slice_size=LOG_SLICE_SIZE, workers=LOG_SLICE_WORKERS,
+                    executor=None, filter_pattern=None):
+    """Generator for the log entries of a log group ordered by timestamp.
+    The time range is split into slices which are fetched concurrently and
+    returned in order. Only `workers` slices are held in memory at a time.
+
+    :param log_group_name: log group name
+    :param start_ts: timestamp
+    :param end_ts: timestamp (defaults to now)
+    :param slice_size: duration of a slice in ms
+    :param workers: number of slices fetched concurrently
+    :param executor: use this executor (e.g. shared by several log groups)
+    :param filter_pattern: cloudwatch logs filter pattern
+    :return: generator of log entries
+    """
+    if end_ts is None:
+        end_ts = int(time.time() * 1000)
+    slices = _get_slices(start_ts, end_ts, slice_size)
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+
+    def _submit():
+        next_slice = next(slices, None)
+        if next_slice:
+            pending.append(executor.submit(_fetch_slice, awsclient,
+                                           log_group_name, next_slice[0],
+                                           next_slice[1], filter_pattern))
+
+    try:
+        for _ in range(workers):
+            _submit()
+        while pending:
+            entries = pending.popleft().result()
+            _submit()  # fetch ahead while we output this slice
+            for e in entries:
+                yield e
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False)
+
+
+def _get_slices(start_ts, end_ts, slice_size):
+    # the slices do not overlap since endTime is inclusive
+    while start_ts <= end_ts:
+        yield start_ts, min(start_ts + slice_size - 1, end_ts)
+        start_ts += slice_size
+
+
+def _fetch_slice(awsclient, log_group_name, start_ts, end_ts,
+                 filter_pattern=None):
+    entries = filter_log_events(awsclient, log_group_name, start_ts=start_ts,
+                                end_ts=end_ts, filter_pattern=filter_pattern)
+    return sorted(entries or [], key=lambda e: e['timestamp'])
+
+
+class LogTailer(object):
+    def __init__(self, awsclient, log_group_name, start_ts,
+                 lookback=TAIL_LOOKBACK):
+        """Incrementally fetch new log events of a log group (tail mode).
+        Each poll re-reads the lookback window so late events are not lost,
+        events we already returned are skipped by their eventId. If a poll
+        does not finish all pages the next poll resumes with the nextToken.
+
+        :param log_group_name: log group name
+        :param start_ts: timestamp
+        :param lookback: window in ms in which late events are expected
+        """
+        self._awsclient = awsclient
+        self._log_group_name = log_group_name
+        self._start_ts = start_ts
+        self._lookback = lookback
+        self._latest_ts = start_ts
+        self._next_token = None
+        self._request = None
+        self._seen = set()  # eventIds within the lookback window
+        self._expiry = []  # heap of (timestamp, eventId)
+        self.interval = TAIL_MIN_INTERVAL  # seconds until the next poll
+
+    def poll(self):
+        """Fetch the events which arrived since the last poll.
+
+        :return: list of new log entries ordered by timestamp
+        """
+        client_logs = self._awsclient.get_client('logs')
+        if self._next_token is None:
+            self._request = {
+                'logGroupName': self._log_group_name,
+                'startTime': max(self._start_ts,
+                                 self._latest_ts - self._lookback),
+                'interleaved': True
+            }
+        entries = []
+        for _ in range(TAIL_MAX_PAGES_PER_POLL):
+            request = dict(self._request)
+            if self._next_token:
+                request['nextToken'] = self._next_token
+            response = client_logs.filter_log_events(**request)
+            for e in response.get('events', []):
+                if e['eventId'] in self._seen:
+                    continue
+                self._seen.add(e['eventId'])
+                heapq.heappush(self._expiry, (e['timestamp'], e['eventId']))
+                entries.append({'timestamp': e['timestamp'],
+                                'message': e['message']})
+            self._next_token = response.get('nextToken')
+            if not self._next_token:
+                break
+        entries.sort(key=lambda e: e['timestamp'])
+        if entries:
+            self._latest_ts = max(self._latest_ts, entries[-1]['timestamp'])
+        self._expire()
+        self._adapt_interval(bool(entries) or bool(self._next_token))
+        return entries
+
+    def _expire(self):
+        # events older than the lookback window are not requested again
+        cutoff = self._latest_ts - self._lookback
+        while self._expiry and self._expiry[0][0] < cutoff:
+            self._seen.discard(heapq.heappop(self._expiry)[1])
+
+    def _adapt_interval(self, busy):
+        if busy:
+            # poll again soon (right away if there are more pages)
+            self.interval = 0.0 if self._next_token else TAIL_MIN_INTERVAL
+        else:
+            self.interval = min(max(self.interval, TAIL_MIN_INTERVAL) * 2,
+                                TAIL_MAX_INTERVAL)
+
+
+def merge_log_events(sources):
+    """Merge the log entries of several sources into one stream ordered by
+    timestamp (k-way merge).
+
+    :param sources: list of (source, log entries) tuples, the log entries of
+        each source must be ordered by timestamp
+    :return: generator of log entries (with 'source')
+    """
+    def _decorate(idx, source, entries):
+        # (timestamp, idx, n) is unique so the entries are never compared
+        for n, e in enumerate(entries):
+            yield e['timestamp'], idx, n, dict(e, source=source)
+
+    iterables = [_decorate(idx, source, entries or [])
+                 for idx, (source, entries) in enumerate(sources)]
+    for _, _, _, e in heapq.merge(*iterables):
+        yield e
+
+
+def list_log_groups(awsclient, log_group_name_prefix):
+    """Names of the log groups which start with the given prefix.
+
+    :param log_group_name_prefix: log group name prefix
+    :return: list of log group names
+    """
+    client_logs = awsclient.get_client('logs')
+    return list(iter_items(
+        client_logs.describe_log_groups,
+        {'logGroupNamePrefix': log_group_name_prefix},
+        lambda r: [lg['logGroupName'] for lg in r['logGroups']]
+    ))
 
 
 # these functions we need so we can test a log group lifecycle
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Local cache for cloudwatch log events.
+Every log group has its own SQLite database (in GCDT_CACHE_DIR) which holds
+the log events and the time ranges that have been fetched already. Only the
+missing ranges are requested from cloudwatch logs, filtering runs locally.
+Log events older than 'GCDT_LOG_CACHE_MAX_AGE' seconds (default one week)
+are dropped from the cache, databases which were not written for as long
+are removed.
+"""
+from __future__ import unicode_literals, print_function
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+from .cloudwatch_logs import iter_log_events, TAIL_LOOKBACK
+from .gcdt_cache import get_cache_dir
+from .gcdt_logging import getLogger
+
+log = getLogger(__name__)
+
+SCHEMA_VERSION = 1
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60  # seconds
+
+
+class LogCache(object):
+    def __init__(self, awsclient, log_group_name, filename, max_age=None):
+        """Cache for the log events of a log group.
+
+        :param log_group_name: log group name
+        :param filename: SQLite database, see get_log_cache_file
+        :param max_age: drop cached log events older than this (seconds),
+            defaults to get_max_age()
+        """
+        self._awsclient = awsclient
+        self._log_group_name = log_group_name
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        self._db = sqlite3.connect(filename, timeout=30)
+        self._db.create_function('regexp', 2, _regexp)
+        self._init_schema()
+        self._prune(get_max_age() if max_age is None else max_age)
+
+    def close(self):
+        self._db.close()
+
+    def iter_log_events(self, start_ts, end_ts=None, pattern=None,
+                        executor=None):
+        """Generator for the log entries of the log group ordered by
+        timestamp. Ranges which are not in the cache are fetched (and
+        streamed) from cloudwatch logs.
+
+        :param start_ts: timestamp
+        :param end_ts: timestamp (defaults to now)
+        :param pattern: only return entries with messages matching the regex
+        :param executor: executor to fetch the log events
+        :return: generator of log entries
+        """
+        if end_ts is None:
+            end_ts = int(time.time() * 1000)
+        regex = re.compile(pattern) if pattern else None
+        for seg_start, seg_end, cached in \
+                _get_segments(self.get_ranges(), start_ts, end_ts):
+            if cached:
+                events = self._query(seg_start, seg_end, pattern)
+            else:
+                events = self._fetch(seg_start, seg_end, executor)
+                if regex:
+                    events = (e for e in events if regex.search(e['message']))
+            for e in events:
+                yield e
+
+    def get_ranges(self):
+        """Time ranges in the cache.
+
+        :return: sorted list of (start_ts, end_ts) tuples
+        """
+        return [tuple(r) for r in self._db.execute(
+            'SELECT start, end FROM ranges ORDER BY start')]
+
+    def _init_schema(self):
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self._db:
+                self._db.execute('DROP TABLE IF EXISTS events')
+                self._db.execute('DROP TABLE IF EXISTS ranges')
+                self._db.execute(
+                    'CREATE TABLE events (timestamp INTEGER, message TEXT)')
+                self._db.execute(
+                    'CREATE INDEX events_timestamp ON events (timestamp)')
+                self._db.execute(
+                    'CREATE TABLE ranges (start INTEGER, end INTEGER)')
+                self._db.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+    def _prune(self, max_age):
+        cutoff = int((time.time() - max_age) * 1000)
+        ranges = [(max(start_ts, cutoff), end_ts)
+                  for start_ts, end_ts in self.get_ranges()
+                  if end_ts >= cutoff]
+        with self._db:
+            self._db.execute('DELETE FROM events WHERE timestamp < ?',
+                             (cutoff,))
+            self._db.execute('DELETE FROM ranges')
+            self._db.executemany(
+                'INSERT INTO ranges (start, end) VALUES (?, ?)', ranges)
+
+    def _query(self, start_ts, end_ts, pattern=None):
+        sql = 'SELECT timestamp, message FROM events ' \
+              'WHERE timestamp BETWEEN ? AND ?'
+        params = [start_ts, end_ts]
+        if pattern:
+            sql += ' AND message REGEXP ?'
+            params.append(pattern)
+        sql += ' ORDER BY timestamp, rowid'
+        for timestamp, message in self._db.execute(sql, params):
+            yield {'timestamp': timestamp, 'message': message}
+
+    def _fetch(self, start_ts, end_ts, executor=None):
+        # events can arrive late so we do not cache the most recent ones
+        complete_ts = min(end_ts, int(time.time() * 1000) - TAIL_LOOKBACK)
+        log.debug('fetching \'%s\' %d - %d', self._log_group_name, start_ts,
+                  end_ts)
+        try:
+            for e in iter_log_events(self._awsclient, self._log_group_name,
+                                     start_ts, end_ts, executor=executor):
+                if e['timestamp'] <= complete_ts:
+                    self._db.execute(
+                        'INSERT INTO events (timestamp, message) VALUES (?, ?)',
+                        (e['timestamp'], e['message']))
+                yield e
+        except BaseException:
+            # incomplete range (e.g. stopped by the user), keep the cache
+            # consistent
+            self._db.rollback()
+            raise
+        if complete_ts >= start_ts:
+            self._add_range(start_ts, complete_ts)
+        self._db.commit()
+
+    def _add_range(self, start_ts, end_ts):
+        ranges = _merge_ranges(self.get_ranges() + [(start_ts, end_ts)])
+        self._db.execute('DELETE FROM ranges')
+        self._db.executemany('INSERT INTO ranges (start, end) VALUES (?, ?)',
+                             ranges)
+
+
+def get_log_cache_file(account_id, region, log_group_name):
+    """Location of the cache for the log group (log groups of different
+    accounts and regions can have the same name).
+
+    :param account_id: AWS account id
+    :param region: AWS region
+    :param log_group_name: log group name
+    :return: path
+    """
+    key = '%s:%s:%s' % (account_id, region, log_group_name)
+    return os.path.join(get_cache_dir(), 'logs', '%s.sqlite' %
+                        hashlib.sha256(key.encode('utf-8')).hexdigest()[:32])
+
+
+def get_max_age():
+    """Max. age of the cached log events ('GCDT_LOG_CACHE_MAX_AGE' seconds).
+
+    :return: seconds
+    """
+    return float(os.getenv('GCDT_LOG_CACHE_MAX_AGE', DEFAULT_MAX_AGE))
+
+
+def prune_log_cache_files(max_age=None):
+    """Remove the caches of log groups which were not used for a while.
+
+    :param max_age: seconds since the last write, defaults to get_max_age()
+    """
+    if max_age is None:
+        max_age = get_max_age()
+    folder = os.path.join(get_cache_dir(), 'logs')
+    if not os.path.isdir(folder):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(folder):
+        filename = os.path.join(folder, name)
+        try:
+            if name.endswith('.sqlite') and \
+                    os.path.getmtime(filename) < cutoff:
+                log.debug('removing log cache \'%s\'', filename)
+                os.remove(filename)
+        except OSError as e:
+            log.debug('could not remove log cache: %s', e)
+
+
+def _regexp(pattern, value):
+    return _get_regex(pattern).search(value or '') is not None
+
+
+_regex_cache = {}
+
+
+def _get_regex(pattern):
+    if pattern not in _regex_cache:
+        _regex_cache[pattern] = re.compile(pattern)
+    return _regex_cache[pattern]
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for start_ts, end_ts in sorted(ranges):
+        if merged and start_ts <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end_ts))
+        else:
+            merged.append((start_ts, end_ts))
+    return merged
+
+
+def _get_segments(ranges, start_ts, end_ts):
+    """Split the time range into cached and missing segments.
+
+    :param ranges: sorted list of cached (start_ts, end_ts) tuples
+    :return: list of (start_ts, end_ts, cached) tuples
+    """
+    segments = []
+    pos = start_ts
+    for r_start, r_end in ranges:
+        if r_end < pos:
+            continue
+        if r_start > end_ts:
+            break
+        if r_start > pos:
+            segments.append((pos, r_start - 1, False))
+        segments.append((max(pos, r_start), min(r_end, end_ts), True))
+        pos = min(r_end, end_ts) + 1
+        if pos > end_ts:
+            break
+    if pos <= end_ts:
+        segments.append((pos, end_ts, False))
+    return segments
@@ -4,38 +4,196 @@ This module abstracts the botocore session and clients
 to provide a simpler interface.
 """
 from __future__ import unicode_literals, print_function
+import threading
+from contextlib import contextmanager
+
 from botocore.exceptions import ClientError  # used in plugins -> keep!!
 
 from . import __version__
+from .gcdt_cache import ResponseCache
+from .gcdt_logging import getLogger
+from .gcdt_metrics import ApiCallMetrics
+from .gcdt_ratelimit import RateLimiter
+
+# botocore uses a pool of 10 connections per client by default, this is the
+# size we use for clients which are shared between threads
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+# same as the advisory refresh window of botocore's RefreshableCredentials
+CREDENTIALS_REFRESH_WINDOW = 15 * 60
+
+log = getLogger(__name__)
 
 
 class AWSClient(object):
     # note this is heavily inspired by TypedAWSClient:
     # https://github.com/awslabs/chalice/blob/master/chalice/awsclient.py
-    def __init__(self, session):
+    def __init__(self, session, max_pool_connections=None, per_thread=False,
+                 rate_limiter=None, response_cache_ttl=None):
+        """Create a AWSClient to hand out botocore clients.
+
+        Botocore clients are thread-safe once they are created but
+        creating them via the session is not. So client creation is
+        guarded by a lock and clients are cached per (service, region).
+
+        :param session: botocore session
+        :param max_pool_connections: size of the HTTP connection pool of each
+            client (use this to run calls on thread pools)
+        :param per_thread: hand out one client per thread instead of sharing
+            the client between threads
+        :param rate_limiter: RateLimiter shared by all clients, per default
+            a new adaptive RateLimiter is used
+        :param response_cache_ttl: cache responses of describe / get / list
+            calls for this many seconds (default: no caching)
+        """
         self._session = session
         self._client_cache = {}
+        self._lock = threading.RLock()
+        self._max_pool_connections = max_pool_connections
+        self._per_thread = per_thread
+        self._thread_local = threading.local()
+        self._response_cache = None
+        if response_cache_ttl:
+            # the cache needs to be registered first so cache hits do not
+            # count as api calls
+            self._response_cache = ResponseCache(response_cache_ttl)
+            self._response_cache.register(self._session)
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+        self._rate_limiter = rate_limiter
+        self._rate_limiter.register(self._session)
+        self._api_metrics = ApiCallMetrics()
+        self._api_metrics.register(self._session)
+        self._credentials_warned = False
         _set_user_agent_for_session(self._session)
 
     def get_client(self, service_name, region_name=None, **kwargs):
         if region_name is None:
             # use the region from the session
-            region_name = self._session.get_config_variable('region')
+            region_name = self.get_region()
+
+        client_cache = self._get_client_cache()
+        key = (service_name, region_name)
+        if key not in client_cache:
+            with self._lock:
+                if key not in client_cache:
+                    if self._max_pool_connections and 'config' not in kwargs:
+                        kwargs['config'] = _get_pool_config(
+                            self._max_pool_connections)
+                    client_cache[key] = self._session.create_client(
+                        service_name, region_name, **kwargs)
+        return client_cache[key]
+
+    def create_client(self, service_name, region_name=None,
+                      rate_limited=True, **kwargs):
+        """Create a new botocore client which is not cached, e.g. for a
+        client with its own config.
+
+        :param service_name: AWS service
+        :param region_name: defaults to the region from the session
+        :param rate_limited: False to exempt the client from rate limiting
+            (it then makes exactly the calls it is asked to make)
+        :param kwargs: passed on to session.create_client
+        :return: botocore client
+        """
+        if region_name is None:
+            region_name = self.get_region()
+        with self._lock:
+            client = self._session.create_client(service_name, region_name,
+                                                 **kwargs)
+        if not rate_limited:
+            self._rate_limiter.unregister(client.meta.events)
+        return client
+
+    @property
+    def api_metrics(self):
+        """Metrics on the api calls made through this AWSClient."""
+        return self._api_metrics
 
-        if (service_name, region_name) not in self._client_cache:
-            self._client_cache[(service_name, region_name)] = \
-                self._session.create_client(service_name, region_name, **kwargs)
-        return self._client_cache[(service_name, region_name)]
+    @property
+    def response_cache(self):
+        """ResponseCache (None if caching is not enabled)."""
+        return self._response_cache
+
+    @contextmanager
+    def uncached(self):
+        """Bypass the response cache in the current thread, e.g. for polling."""
+        if self._response_cache is None:
+            yield
+        else:
+            with self._response_cache.disabled():
+                yield
 
     def get_region(self):
         """Get region from the session."""
-        return self._session.get_config_variable('region')
+        with self._lock:
+            return self._session.get_config_variable('region')
+
+    def get_credentials(self):
+        """Get the credentials from the session (None if there are none)."""
+        with self._lock:
+            return self._session.get_credentials()
+
+    def credentials_expire_within(self, seconds):
+        """Check whether the session credentials expire within the given
+        number of seconds (static credentials do not expire).
+
+        :param seconds:
+        :return: True / False
+        """
+        credentials = self.get_credentials()
+        if not hasattr(credentials, 'refresh_needed'):
+            return False
+        return credentials.refresh_needed(seconds)
+
+    def refresh_credentials(self, seconds=CREDENTIALS_REFRESH_WINDOW):
+        """Refresh temporary credentials ahead of time if they expire within
+        the given number of seconds. Long running operations (polling,
+        log tailing) call this between their api calls so the credentials
+        do not run out in the middle of an operation.
+        Note: botocore only refreshes within its own refresh window, for a
+        bigger window this just reports the state.
+
+        :param seconds:
+        :return: True if the credentials are valid for longer than `seconds`
+        """
+        if not self.credentials_expire_within(seconds):
+            return True
+        # botocore refreshes RefreshableCredentials when they are accessed
+        self.get_credentials().get_frozen_credentials()
+        if not self.credentials_expire_within(seconds):
+            return True
+        if not self._credentials_warned:
+            self._credentials_warned = True
+            log.warning('The credentials expire in less than %ds and could '
+                        'not be refreshed', seconds)
+        return False
 
     def get_account_id(self):
         """Get account id using session."""
         sts = self.get_client('sts')
         return sts.get_caller_identity()["Account"]
 
+    def _get_client_cache(self):
+        """Return the client cache for the current thread (per_thread mode)
+        or the shared client cache."""
+        if not self._per_thread:
+            return self._client_cache
+        if not hasattr(self._thread_local, 'client_cache'):
+            self._thread_local.client_cache = {}
+        return self._thread_local.client_cache
+
+
+def _get_pool_config(max_pool_connections):
+    """Botocore client config with a connection pool of the given size.
+    Connections are kept alive and reused between calls.
+    """
+    from botocore.config import Config  # expensive import
+    options = {'max_pool_connections': max_pool_connections}
+    if 'tcp_keepalive' in Config.OPTION_DEFAULTS:
+        # tcp_keepalive is only available in recent botocore versions
+        options['tcp_keepalive'] = True
+    return Config(**options)
+
 
 def _set_user_agent_for_session(session):
     session.user_agent_name = 'gcdt'
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Request-scoped cache for idempotent AWS api calls.
+During one gcdt run the same describe / get / list calls are issued over and
+over. If enabled, the AWSClient registers a ResponseCache with the botocore
+session which answers these calls from memory (read-through). Entries expire
+after a TTL and are invalidated once a mutating call hits the same resource.
+"""
+from __future__ import unicode_literals, print_function
+import copy
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import six
+
+from .gcdt_logging import getLogger
+
+log = getLogger(__name__)
+
+DEFAULT_TTL = 3  # seconds, keep this below the intervals we poll with
+CACHEABLE_PREFIXES = ('Describe', 'Get', 'List', 'Head')
+# log events and metrics change all the time
+NON_CACHEABLE_SERVICES = ['logs', 'cloudwatch']
+
+_CACHE_KEY = 'gcdt_cache_key'
+_CACHE_HIT = 'gcdt_cache_hit'
+
+
+class _CachedHttpResponse(object):
+    status_code = 200
+
+
+class ResponseCache(object):
+    def __init__(self, ttl=DEFAULT_TTL):
+        """Read-through cache for botocore responses.
+
+        :param ttl: seconds a cached response is valid
+        """
+        self._ttl = ttl
+        self._entries = {}  # key -> (expires, identifiers, parsed)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, session):
+        """Register the cache with the botocore session.
+        Note: this needs to happen before the clients are created and before
+        other 'before-call' handlers are registered.
+
+        :param session: botocore session
+        """
+        session.register('before-parameter-build.*.*',
+                         self._before_parameter_build)
+        session.register('before-call.*.*', self._before_call)
+        session.register('after-call.*.*', self._after_call)
+
+    @contextmanager
+    def disabled(self):
+        """Bypass the cache in the current thread (use this for polling)."""
+        previous = getattr(self._local, 'disabled', False)
+        self._local.disabled = True
+        try:
+            yield
+        finally:
+            self._local.disabled = previous  # uncached blocks can be nested
+
+    def invalidate(self, service_name=None):
+        """Drop cached responses (of one service or all)."""
+        with self._lock:
+            if service_name is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == service_name]:
+                    del self._entries[key]
+
+    def _before_parameter_build(self, params, model, context, **kwargs):
+        service_name = model.service_model.service_name
+        if not is_cacheable(model):
+            self._invalidate_resource(service_name, _get_identifiers(params))
+        elif not getattr(self._local, 'disabled', False):
+            context[_CACHE_KEY] = (
+                service_name, model.name,
+                json.dumps(params, sort_keys=True, default=str))
+
+    def _before_call(self, context, **kwargs):
+        key = context.get(_CACHE_KEY)
+        if key is None:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return
+            self.hits += 1
+        log.debug('cache hit: %s.%s', key[0], key[1])
+        context[_CACHE_HIT] = True
+        return _CachedHttpResponse(), copy.deepcopy(entry[2])
+
+    def _after_call(self, http_response, parsed, context, **kwargs):
+        key = context.pop(_CACHE_KEY, None)
+        if context.pop(_CACHE_HIT, False) or key is None:
+            return
+        if http_response is None or http_response.status_code >= 300:
+            return
+        identifiers = _get_identifiers(json.loads(key[2]))
+        with self._lock:
+            self._entries[key] = (time.time() + self._ttl, identifiers,
+                                  copy.deepcopy(parsed))
+
+    def _invalidate_resource(self, service_name, identifiers):
+        # invalidate cached responses on the same resource. Responses without
+        # identifiers (listings) and mutations we can not attribute to a
+        # resource invalidate broadly
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if key[0] != service_name:
+                    continue
+                if not identifiers or not entry[1] or \
+                        identifiers & entry[1]:
+                    del self._entries[key]
+
+
+def is_cacheable(model):
+    """Check whether the operation is a read call we can cache.
+
+    :param model: botocore operation model
+    :return: True / False
+    """
+    return model.name.startswith(CACHEABLE_PREFIXES) and \
+        model.service_model.service_name not in NON_CACHEABLE_SERVICES and \
+        not model.has_streaming_output
+
+
+def _get_identifiers(params):
+    """Extract the values which identify the resource from api params."""
+    return set(
+        v for k, v in params.items()
+        if isinstance(v, six.string_types) and
+        (k.lower().endswith(('name', 'id', 'arn')) or k in ['Bucket', 'Key'])
+    )
+
+
+def get_cache_dir():
+    """Folder for the gcdt on-disk caches ('GCDT_CACHE_DIR', defaults to
+    ~/.gcdt/cache).
+
+    :return: path
+    """
+    return os.getenv('GCDT_CACHE_DIR',
+                     os.path.join(os.path.expanduser('~'), '.gcdt', 'cache'))
+
+
+def write_json_atomic(filename, data):
+    """Write data to a json file (missing folders are created). The data is
+    written to a temp file which is renamed so concurrent gcdt runs never
+    read a partial file.
+
+    :param filename: path of the json file
+    :param data: json serializable data
+    :raises: IOError / OSError if the file could not be written
+    """
+    folder = os.path.dirname(filename)
+    if not os.path.isdir(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:
+            if not os.path.isdir(folder):  # created by a concurrent run
+                raise
+    tmp = '%s.%d.%d' % (filename, os.getpid(),
+                         threading.current_thread().ident)
+    try:
+        with open(tmp, 'w') as jfile:
+            json.dump(data, jfile)
+        if os.name == 'nt' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmp, filename)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
@@ -25,7 +25,7 @@ DEFAULT_CONFIG = {
         'runtime': ['python2.7', 'python3.6', 'python3.7', 'nodejs4.3', 'nodejs6.10', 'nodejs8.10'],
         'python_bundle_venv_dir': '.gcdt/venv',
         'keep': False,
-        'non_config_commands': ['logs', 'invoke']  # this commands do not require config
+        'non_config_commands': ['logs', 'invoke', 'stats', 'metrics', 'warm']  # this commands do not require config
     },
     'tenkai': {
         'settings_file': 'settings.json',
@@ -1,22 +1,25 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
+import glob
 import os
 import imp
 import logging
 import signal
 import sys
+import time
 from logging.config import dictConfig
 import traceback
 
-import botocore.session
 from docopt import docopt
 
 from .utils import GracefulExit, signal_handler, fix_old_kumo_config
 from . import gcdt_signals
-from .gcdt_awsclient import AWSClient
+from .gcdt_awsclient import AWSClient, DEFAULT_MAX_POOL_CONNECTIONS
 from .gcdt_cmd_dispatcher import cmd, get_command
 from .gcdt_logging import logging_config
+from .gcdt_metrics import report_api_metrics
 from .gcdt_plugins import load_plugins
+from .gcdt_tracing import LifecycleTracer, report_lifecycle_trace
 from .gcdt_signals import check_hook_mechanism_is_intact, \
     check_register_present
 from .utils import get_context, check_gcdt_update, are_credentials_still_valid, \
@@ -25,6 +28,8 @@ from .gcdt_defaults import DEFAULT_CONFIG
 
 log = logging.getLogger(__name__)
 
+DEFAULT_WORKERS = 4
+
 
 def _load_hooks(path):
     """Load hook module and register signals.
@@ -49,35 +54,76 @@ def lifecycle(awsclient, env, tool, command, arguments):
     """Tool lifecycle which provides hooks into the different stages of the
     command execution. See signals for hook details.
     """
+    tracer = LifecycleTracer()
+    try:
+        return _lifecycle(tracer, awsclient, env, tool, command, arguments)
+    finally:
+        report_lifecycle_trace(tracer)
+
+
+def _lifecycle(tracer, awsclient, env, tool, command, arguments):
+    exit_code, context, config = _prepare(tracer, awsclient, env, tool,
+                                          command, arguments)
+    if exit_code:
+        return exit_code
+
+    exit_code = _run_command(tracer, context, config, tool, command, arguments)
+    if exit_code:
+        return exit_code
+
+    # TODO reporting (in case you want to get a summary / output to the user)
+
+    gcdt_signals.finalized.connect(report_api_metrics)
+    tracer.send(gcdt_signals.finalized, context)
+    log.debug('### finalized')
+    return 0
+
+
+def _prepare(tracer, awsclient, env, tool, command, arguments, checks=True,
+             hooks=True):
+    """Lifecycle up to the command (init, config, lookup, validation, bundle).
+
+    :param checks: check for gcdt updates and expired credentials
+    :param hooks: load the hookfile of the config
+    :return: exit_code, context, config
+    """
     log.debug('### init')
-    load_plugins()
-    context = get_context(awsclient, env, tool, command, arguments)
+    with tracer.span('load_plugins'):
+        load_plugins()
+    with tracer.span('get_context'):
+        context = get_context(awsclient, env, tool, command, arguments)
     # every tool needs a awsclient so we provide this via the context
     context['_awsclient'] = awsclient
     log.debug('### context:')
     log.debug(context)
+    # config is "assembled" by config_reader NOT here!
+    config = {}
     if 'error' in context:
         # no need to send an 'error' signal here
-        return 1
+        return 1, context, config
 
     ## initialized
-    gcdt_signals.initialized.send(context)
+    tracer.send(gcdt_signals.initialized, context)
     log.debug('### initialized')
     if 'error' in context:
         log.error(context['error'])
-        return 1
-    check_gcdt_update()
+        return 1, context, config
+    if checks:
+        check_gcdt_update()
 
-    # config is "assembled" by config_reader NOT here!
-    config = {}
-
-    gcdt_signals.config_read_init.send((context, config))
+    tracer.send(gcdt_signals.config_read_init, (context, config))
     log.debug('### config_read_init')
-    gcdt_signals.config_read_finalized.send((context, config))
+    tracer.send(gcdt_signals.config_read_finalized, (context, config))
     log.debug('### config_read_finalized')
     # TODO we might want to be able to override config via env variables?
     # here would be the right place to do this
     if 'hookfile' in config:
+        if not hooks:
+            # hooks listen to all signals so they would fire for all configs
+            context['error'] = 'hookfile is not supported for multiple configs'
+            log.error(context['error'])
+            tracer.send(gcdt_signals.error, (context, config))
+            return 1, context, config
         # load hooks from hookfile
         _load_hooks(config['hookfile'])
     if 'kumo' in config:
@@ -85,98 +131,228 @@ def lifecycle(awsclient, env, tool, command, arguments):
         fix_old_kumo_config(config)
 
     # check_credentials
-    gcdt_signals.check_credentials_init.send((context, config))
+    tracer.send(gcdt_signals.check_credentials_init, (context, config))
     log.debug('### check_credentials_init')
-    gcdt_signals.check_credentials_finalized.send((context, config))
+    tracer.send(gcdt_signals.check_credentials_finalized, (context, config))
     log.debug('### check_credentials_finalized')
     if 'error' in context:
         log.error(context['error'])
-        gcdt_signals.error.send((context, config))
-        return 1
+        tracer.send(gcdt_signals.error, (context, config))
+        return 1, context, config
 
     ## lookup
-    gcdt_signals.lookup_init.send((context, config))
+    tracer.send(gcdt_signals.lookup_init, (context, config))
     log.debug('### lookup_init')
-    gcdt_signals.lookup_finalized.send((context, config))
+    tracer.send(gcdt_signals.lookup_finalized, (context, config))
     log.debug('### lookup_finalized')
     log.debug('### config after lookup:')
     log.debug(config)
 
     ## config validation
-    gcdt_signals.config_validation_init.send((context, config))
+    tracer.send(gcdt_signals.config_validation_init, (context, config))
     log.debug('### config_validation_init')
-    gcdt_signals.config_validation_finalized.send((context, config))
+    tracer.send(gcdt_signals.config_validation_finalized, (context, config))
     if context['command'] in \
             DEFAULT_CONFIG.get(context['tool'], {}).get('non_config_commands', []):
         pass  # we do not require a config for this command
     elif tool not in config and tool != 'gcdt':
         context['error'] = 'Configuration missing for \'%s\'.' % tool
         log.error(context['error'])
-        gcdt_signals.error.send((context, config))
-        return 1
+        tracer.send(gcdt_signals.error, (context, config))
+        return 1, context, config
     log.debug('### config_validation_finalized')
 
     ## check credentials are valid (AWS services)
     # DEPRECATED, use gcdt-logon plugin instead
-    if are_credentials_still_valid(awsclient):
-        context['error'] = \
-            'Your credentials have expired... Please renew and try again!'
-        log.error(context['error'])
-        gcdt_signals.error.send((context, config))
-        return 1
+    if checks:
+        with tracer.span('are_credentials_still_valid'):
+            credentials_expired = are_credentials_still_valid(awsclient)
+        if credentials_expired:
+            context['error'] = \
+                'Your credentials have expired... Please renew and try again!'
+            log.error(context['error'])
+            tracer.send(gcdt_signals.error, (context, config))
+            return 1, context, config
 
     ## bundle step
-    gcdt_signals.bundle_pre.send((context, config))
+    tracer.send(gcdt_signals.bundle_pre, (context, config))
     log.debug('### bundle_pre')
-    gcdt_signals.bundle_init.send((context, config))
+    tracer.send(gcdt_signals.bundle_init, (context, config))
     log.debug('### bundle_init')
-    gcdt_signals.bundle_finalized.send((context, config))
+    tracer.send(gcdt_signals.bundle_finalized, (context, config))
     log.debug('### bundle_finalized')
     if 'error' in context:
         log.error(context['error'])
-        gcdt_signals.error.send((context, config))
-        return 1
+        tracer.send(gcdt_signals.error, (context, config))
+        return 1, context, config
+    return 0, context, config
 
-    ## dispatch command providing context and config (= tooldata)
-    gcdt_signals.command_init.send((context, config))
+
+def _run_command(tracer, context, config, tool, command, arguments):
+    """Dispatch the command providing context and config (= tooldata).
+
+    :return: exit_code
+    """
+    _init_command(tracer, context, config)
+    exit_code = _dispatch_command(tracer, context, config, tool, command,
+                                  arguments)
+    return _finalize_command(tracer, context, config, command, exit_code)
+
+
+def _init_command(tracer, context, config):
+    tracer.send(gcdt_signals.command_init, (context, config))
     log.debug('### command_init')
+
+
+def _dispatch_command(tracer, context, config, tool, command, arguments):
+    """Run the command (this sends no signals so it can run on a worker
+    thread).
+
+    :return: exit_code
+    """
     try:
         if tool == 'gcdt':
             conf = config  # gcdt works on the whole config
         else:
             conf = config.get(tool, {})
-        exit_code = cmd.dispatch(arguments,
-                                 context=context,
-                                 config=conf)
+        with tracer.span('command', command=command):
+            return cmd.dispatch(arguments, context=context, config=conf)
     except GracefulExit:
         raise
     except Exception as e:
         log.debug(traceback.format_exc())
         context['error'] = str(e)
         log.error(context['error'])
-        exit_code = 1
+        return 1
+
+
+def _finalize_command(tracer, context, config, command, exit_code):
     if exit_code:
         if 'error' not in context or context['error'] == '':
             context['error'] = '\'%s\' command failed with exit code 1' % command
-        gcdt_signals.error.send((context, config))
+        tracer.send(gcdt_signals.error, (context, config))
         return 1
 
-    gcdt_signals.command_finalized.send((context, config))
+    tracer.send(gcdt_signals.command_finalized, (context, config))
     log.debug('### command_finalized')
+    return 0
 
-    # TODO reporting (in case you want to get a summary / output to the user)
 
-    gcdt_signals.finalized.send(context)
+def get_config_folders(env, path='.'):
+    """Sub folders of path which contain a gcdt config for env.
+
+    :param env: environment, e.g. 'dev'
+    :param path: parent folder
+    :return: sorted list of folders
+    """
+    folders = []
+    for name in sorted(os.listdir(path)):
+        folder = os.path.join(path, name)
+        if os.path.isdir(folder) and \
+                glob.glob(os.path.join(folder, 'gcdt_%s.*' % env)):
+            folders.append(folder)
+    return folders
+
+
+def lifecycle_all(awsclient, env, tool, command, arguments, folders,
+                  workers=DEFAULT_WORKERS):
+    """Run the command for the gcdt configs in the given folders.
+    The configs are read and bundled one after the other (the plugins work on
+    the current directory) then the commands run concurrently on a bounded
+    pool of workers. All commands share the awsclient (and its rate limits).
+
+    :param folders: list of folders containing a gcdt config
+    :param workers: max. number of commands running concurrently
+    :return: list of results (dicts with folder, artifact, exit_code,
+             duration and error), in order of folders
+    """
+    tracer = LifecycleTracer()
+    try:
+        return _lifecycle_all(tracer, awsclient, env, tool, command,
+                              arguments, folders, workers)
+    finally:
+        report_lifecycle_trace(tracer)
+
+
+def _lifecycle_all(tracer, awsclient, env, tool, command, arguments, folders,
+                   workers):
+    # the commands must not run in batch mode again
+    arguments = dict(arguments, **{'--all': False, '--workers': None,
+                                   '<folder>': []})
+    results = []
+    prepared = []
+    cwd = os.getcwd()
+    for folder in folders:
+        result = {'folder': folder, 'artifact': '', 'exit_code': 1,
+                  'duration': 0.0, 'error': ''}
+        results.append(result)
+        start = time.time()
+        try:
+            os.chdir(folder)
+            with tracer.span('prepare', folder=folder):
+                exit_code, context, config = _prepare(
+                    tracer, awsclient, env, tool, command, arguments,
+                    checks=not prepared, hooks=False)
+        finally:
+            os.chdir(cwd)
+        result['duration'] = time.time() - start
+        if exit_code:
+            result['error'] = context.get('error', '')
+            continue
+        prepared.append((result, context, config))
+
+    def _dispatch(result, context, config):
+        start = time.time()
+        exit_code = _dispatch_command(tracer, context, config, tool, command,
+                                      arguments)
+        result['duration'] += time.time() - start
+        return exit_code
+
+    # plugins expect their signals one at a time on the main thread so only
+    # the commands run on the pool
+    for result, context, config in prepared:
+        _init_command(tracer, context, config)
+    # expensive import, only load when needed
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_dispatch, *p) for p in prepared]
+        for (result, context, config), future in zip(prepared, futures):
+            result['exit_code'] = _finalize_command(
+                tracer, context, config, command, future.result())
+            result['artifact'] = context.get('artifact', '')
+            result['error'] = context.get('error', '')
+
+    for result, context, config in prepared:
+        if not result['exit_code']:
+            tracer.send(gcdt_signals.finalized, context)
     log.debug('### finalized')
-    return 0
+    if prepared:
+        report_api_metrics(prepared[0][1])  # the awsclient is shared
+    return results
+
+
+def format_results(results):
+    """Format the results of lifecycle_all as table.
+
+    :param results: list of results
+    :return: table
+    """
+    from tabulate import tabulate
+    header = ['folder', 'artifact', 'result', 'duration [s]', 'error']
+    table = [[r['folder'], r['artifact'],
+              'failed' if r['exit_code'] else 'ok',
+              '%0.1f' % r['duration'], r['error']] for r in results]
+    return tabulate(table, headers=header, tablefmt='fancy_grid')
 
 
-def main(doc, tool, dispatch_only=None):
+def main(doc, tool, dispatch_only=None, batch_commands=None):
     """gcdt tools parametrized main function to initiate gcdt lifecycle.
 
     :param doc: docopt string
     :param tool: gcdt tool (gcdt, kumo, tenkai, ramuda, yugen)
     :param dispatch_only: list of commands which do not use gcdt lifecycle
+    :param batch_commands: list of commands which run for the configs in
+        multiple folders if used with '--all'
     :return: exit_code
     """
     # Use signal handler to throw exception which can be caught to allow
@@ -209,7 +385,26 @@ def main(doc, tool, dispatch_only=None):
                 log.error('\'ENV\' environment variable not set!')
                 return 1
 
-            awsclient = AWSClient(botocore.session.get_session())
+            import botocore.session  # expensive import, only load when needed
+            awsclient = AWSClient(
+                botocore.session.get_session(),
+                max_pool_connections=int(os.getenv(
+                    'GCDT_MAX_POOL_CONNECTIONS',
+                    DEFAULT_MAX_POOL_CONNECTIONS)),
+                response_cache_ttl=float(os.getenv(
+                    'GCDT_RESPONSE_CACHE_TTL', '0')))
+            if command in (batch_commands or []) and arguments.get('--all'):
+                folders = arguments.get('<folder>') or get_config_folders(env)
+                if not folders:
+                    log.error('No folders with a config for \'%s\' found!',
+                              env)
+                    return 1
+                results = lifecycle_all(
+                    awsclient, env, tool, command, arguments, folders,
+                    workers=int(arguments.get('--workers') or
+                                DEFAULT_WORKERS))
+                log.info(format_results(results))
+                return 1 if any(r['exit_code'] for r in results) else 0
             return lifecycle(awsclient, env, tool, command, arguments)
     except GracefulExit as e:
         log.info('Received %s signal - exiting command \'%s %s\'',
@@ -9,9 +9,7 @@ import json
 from . import utils
 from . import gcdt_lifecycle
 from .gcdt_cmd_dispatcher import cmd
-from banana.router import Router
-#from banana.routes import run
-from whaaaaat import color_print as cp
+# note: the scaffolding modules are imported in the cmds to keep the startup fast
 
 
 GCDT_GENERATOR_GROUP = 'gcdtgen10'
@@ -34,6 +32,9 @@ def version_cmd():
 
 @cmd(spec=['generate', '<generator>'])
 def generate_cmd(generator):
+    from banana.router import Router
+    #from banana.routes import run
+    from whaaaaat import color_print as cp
     insight = None
     env = {}
     router = Router(env, insight, group=GCDT_GENERATOR_GROUP)
@@ -47,6 +48,7 @@ def generate_cmd(generator):
 
 @cmd(spec=['list'])
 def list_cmd():
+    from banana.router import Router
     router = Router(None, {}, group=GCDT_GENERATOR_GROUP)
     print('Installed gcdt generators:')
     for g in router.generators:
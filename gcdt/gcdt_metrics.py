@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Collect metrics on AWS api calls.
+The AWSClient registers ApiCallMetrics with the botocore session so we know
+how many api calls a gcdt command makes and where the time goes.
+Set 'GCDT_API_METRICS' to 'table' or 'json' to output a summary when the
+command has finished (otherwise the table is only shown in DEBUG mode).
+"""
+from __future__ import unicode_literals, print_function
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import os
+
+from .gcdt_logging import getLogger
+from .gcdt_ratelimit import is_throttling_error
+from .utils import percentile
+
+log = getLogger(__name__)
+
+_START_TIME = 'gcdt_metrics_start_time'
+
+
+class ApiCallMetrics(object):
+    def __init__(self):
+        """Count, latency, retries and throttles per service.operation."""
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def register(self, session):
+        """Register the event handlers with the botocore session.
+        Note: this needs to happen before the clients are created.
+
+        :param session: botocore session
+        """
+        session.register('before-call.*.*', self._before_call)
+        session.register('after-call.*.*', self._after_call)
+        session.register('needs-retry.*.*', self._needs_retry)
+
+    def _get_entry(self, model):
+        key = '%s.%s' % (model.service_model.service_name, model.name)
+        if key not in self._calls:
+            self._calls[key] = {'durations': [], 'retries': 0, 'throttles': 0}
+        return self._calls[key]
+
+    def _before_call(self, context, **kwargs):
+        # the request context is passed to before-call and after-call
+        context[_START_TIME] = time.time()
+
+    def _after_call(self, parsed, model, context, **kwargs):
+        start = context.pop(_START_TIME, None)
+        if start is None:
+            return
+        duration = time.time() - start
+        retries = 0
+        if parsed:
+            retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        with self._lock:
+            entry = self._get_entry(model)
+            entry['durations'].append(duration)
+            entry['retries'] += retries
+
+    def _needs_retry(self, operation, response=None, **kwargs):
+        # must return None so the botocore retry handler decides
+        if response is not None and is_throttling_error(response[1]):
+            with self._lock:
+                self._get_entry(operation)['throttles'] += 1
+
+    def summary(self):
+        """Summary of the api calls ordered by total time spent.
+
+        :return: list of dicts (one entry per service.operation)
+        """
+        with self._lock:
+            calls = [(k, dict(v, durations=list(v['durations'])))
+                     for k, v in self._calls.items()]
+        result = []
+        for key, entry in calls:
+            durations = entry['durations']
+            total = sum(durations)
+            result.append(OrderedDict([
+                ('operation', key),
+                ('count', len(durations)),
+                ('total', total),
+                ('avg', total / len(durations) if durations else 0.0),
+                ('p95', percentile(durations, 95) or 0.0),
+                ('retries', entry['retries']),
+                ('throttles', entry['throttles'])
+            ]))
+        return sorted(result, key=lambda e: e['total'], reverse=True)
+
+
+def format_summary(summary, fmt='table'):
+    """Format the api call summary.
+
+    :param summary: as returned by ApiCallMetrics.summary()
+    :param fmt: 'table' or 'json'
+    :return: formatted summary
+    """
+    if fmt == 'json':
+        return json.dumps(summary, indent=2)
+    from tabulate import tabulate
+    header = ['operation', 'count', 'total [s]', 'avg [s]', 'p95 [s]',
+              'retries', 'throttles']
+    table = [[e['operation'], e['count'], '%0.3f' % e['total'],
+              '%0.3f' % e['avg'], '%0.3f' % e['p95'], e['retries'],
+              e['throttles']] for e in summary]
+    return tabulate(table, headers=header, tablefmt='fancy_grid')
+
+
+def report_api_metrics(context):
+    """Output the api call summary (receiver for the 'finalized' signal).
+
+    :param context: gcdt context
+    """
+    metrics = getattr(context.get('_awsclient'), 'api_metrics', None)
+    if metrics is None:
+        return
+    summary = metrics.summary()
+    if not summary:
+        return
+    fmt = os.getenv('GCDT_API_METRICS', '').lower()
+    if fmt in ['table', 'json']:
+        log.info('AWS api calls:')
+        log.info(format_summary(summary, fmt))
+    else:
+        log.debug('AWS api calls:')
+        log.debug(format_summary(summary))
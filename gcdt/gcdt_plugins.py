@@ -1,40 +1,276 @@
 # -*- coding: utf-8 -*-
+"""Discover and load the installed gcdt plugins.
+Scanning the entry points with pkg_resources is expensive so we keep an index
+of the installed plugins on disk (in GCDT_CACHE_DIR). The index is rebuilt
+once the content of the site-packages changes (mtime of the sys.path folders).
+The index also records which signals a plugin listens to. Plugins are
+imported and registered once one of these signals fires.
+"""
 from __future__ import unicode_literals, print_function
-
+import hashlib
+import importlib
+import json
 import logging
+import os
+import sys
+import threading
+import weakref
 
-import pkg_resources
+from blinker import NamedSignal
 
-from gcdt.gcdt_signals import check_hook_mechanism_is_intact, \
+from . import gcdt_signals
+from .gcdt_cache import get_cache_dir, write_json_atomic
+from .gcdt_signals import check_hook_mechanism_is_intact, \
     check_register_present
 
+try:
+    # weak references to methods in blinker < 1.5
+    from blinker._saferef import BoundMethodWeakref
+    _WEAK_REFS = (weakref.ref, BoundMethodWeakref)
+except ImportError:
+    _WEAK_REFS = (weakref.ref,)
+
 log = logging.getLogger(__name__)
 
+INDEX_VERSION = 1
+
+_lazy_plugins = {}  # (module, attrs) -> _LazyPlugin
+_lazy_plugins_lock = threading.Lock()
+
 
 # TODO we have all plugins in one single repo so we need a mechanism to filter
 # the ones we want to use!
 
 
-def load_plugins(group='gcdt10'):
+def load_plugins(group='gcdt10', cached=True):
     """Load and register installed gcdt plugins.
+
+    :param group: entry point group
+    :param cached: use the plugin index and load the plugins on demand
     """
     # on using entrypoints:
     # http://stackoverflow.com/questions/774824/explain-python-entry-points
     # TODO: make sure we do not have conflicting generators installed!
-    for ep in pkg_resources.iter_entry_points(group, name=None):
-        plugin = ep.load()  # load the plugin
-        if check_hook_mechanism_is_intact(plugin):
-            if check_register_present(plugin):
-                plugin.register()   # register the plugin so it listens to gcdt_signals
-        else:
-            log.warning('No valid hook configuration: %s. Not using hooks!', plugin)
+    if not cached:
+        import pkg_resources  # expensive import, only load when needed
+        for ep in pkg_resources.iter_entry_points(group, name=None):
+            _register(ep.load())  # load the plugin
+        return
+
+    index, entries = _get_index_entries(group)
+    changed = False
+    for entry in entries:
+        plugin = _get_lazy_plugin(entry)
+        plugin.connect()
+        if entry['signals'] is None:
+            # first use of the plugin, record the signals it listens to
+            entry['signals'] = sorted(plugin.load().keys())
+            changed = True
+    if changed:
+        _write_index(index)
 
 
 def get_plugin_versions(group='gcdt10'):
-    """Load and register installed gcdt plugins.
+    """Versions of the installed gcdt plugins.
+
+    :param group: entry point group
+    :return: dict of distribution name -> version
     """
-    versions = {}
+    _, entries = _get_index_entries(group)
+    return {e['dist']: e['version'] for e in entries}
+
+
+def get_index_file():
+    """Location of the plugin index (one per python installation).
+
+    :return: path
+    """
+    executable = hashlib.sha256(sys.executable.encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir(), 'plugins-%s.json' % executable[:12])
+
+
+def _get_fingerprint():
+    """The index is valid as long as the sys.path folders are not modified."""
+    cwd = os.getcwd()
+    paths = []
+    for path in sys.path:
+        # the current working directory changes all the time
+        if not path or os.path.abspath(path) == cwd:
+            continue
+        try:
+            paths.append([path, os.stat(path).st_mtime])
+        except OSError:
+            continue
+    return hashlib.sha256(
+        json.dumps([sys.executable, paths]).encode('utf-8')).hexdigest()
+
+
+def _read_index():
+    try:
+        with open(get_index_file(), 'r') as jfile:
+            return json.load(jfile)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _write_index(index):
+    try:
+        write_json_atomic(get_index_file(), index)
+    except (IOError, OSError) as e:
+        log.debug('could not write the plugin index: %s', e)
+
+
+def _scan_entry_points(group):
+    import pkg_resources  # expensive import, only load when needed
+    entries = []
     for ep in pkg_resources.iter_entry_points(group, name=None):
-        versions[ep.dist.project_name] = ep.dist.version
+        entries.append({
+            'name': ep.name,
+            'module': ep.module_name,
+            'attrs': list(ep.attrs),
+            'dist': ep.dist.project_name,
+            'version': ep.dist.version,
+            'signals': None  # recorded once the plugin is registered
+        })
+    return entries
+
+
+def _get_index_entries(group):
+    """Read the index entries for the entry point group (rebuild if stale).
+
+    :param group: entry point group
+    :return: index, entries
+    """
+    fingerprint = _get_fingerprint()
+    index = _read_index()
+    if not index or index.get('version') != INDEX_VERSION or \
+            index.get('fingerprint') != fingerprint:
+        index = {'version': INDEX_VERSION, 'fingerprint': fingerprint,
+                 'groups': {}}
+    if group not in index['groups']:
+        index['groups'][group] = _scan_entry_points(group)
+        _write_index(index)
+    return index, index['groups'][group]
+
+
+def _load_entry(entry):
+    """Import the plugin (like pkg_resources EntryPoint.load without the
+    requirements check).
+    """
+    plugin = importlib.import_module(entry['module'])
+    for attr in entry['attrs']:
+        plugin = getattr(plugin, attr)
+    return plugin
+
+
+def _get_signals():
+    return [s for s in vars(gcdt_signals).values()
+            if isinstance(s, NamedSignal)]
+
+
+def _register(plugin):
+    """Register the plugin so it listens to gcdt_signals.
+
+    :param plugin: plugin module
+    :return: dict of signal name -> receivers connected by the plugin
+    """
+    if not check_hook_mechanism_is_intact(plugin):
+        log.warning('No valid hook configuration: %s. Not using hooks!', plugin)
+        return {}
+    if not check_register_present(plugin):
+        return {}
+    before = {s.name: set(s.receivers) for s in _get_signals()}
+    plugin.register()
+    receivers = {}
+    for s in _get_signals():
+        new = [r for rid, r in s.receivers.items()
+               if rid not in before.get(s.name, set())]
+        if new:
+            receivers[s.name] = new
+    return receivers
+
+
+def _get_lazy_plugin(entry):
+    key = (entry['module'], tuple(entry['attrs']))
+    with _lazy_plugins_lock:
+        if key not in _lazy_plugins:
+            _lazy_plugins[key] = _LazyPlugin(entry)
+        return _lazy_plugins[key]
+
+
+class _LazyPlugin(object):
+    def __init__(self, entry):
+        """Placeholder for a plugin which is not imported yet. It listens to
+        the signals of the plugin and imports and registers the plugin once
+        the first one fires. The proxies stay connected and delegate to the
+        plugin receivers so plugins keep their order on shared signals.
+
+        :param entry: plugin index entry
+        """
+        self._entry = entry
+        self._proxies = {}
+        self._receivers = None
+        self._lock = threading.RLock()
+
+    def connect(self):
+        with self._lock:
+            if self._proxies:
+                return  # the proxies delegate to the plugin (once loaded)
+            if self._receivers is not None:
+                # already imported (cheap), same as load_plugins without index
+                _register(_load_entry(self._entry))
+                return
+            if self._entry['signals'] is None:
+                # we do not know the signals yet so we can not defer this
+                self.load()
+                return
+            for name in self._entry['signals']:
+                self._proxies[name] = self._make_proxy(name)
+                gcdt_signals.signal(name).connect(self._proxies[name],
+                                                  weak=False)
+
+    def disconnect(self):
+        """Disconnect the proxies from the signals."""
+        with self._lock:
+            for name, proxy in self._proxies.items():
+                gcdt_signals.signal(name).disconnect(proxy)
+            self._proxies = {}
+
+    def _make_proxy(self, name):
+        def _receivers():
+            receivers = [_resolve(r) for r in self.load().get(name, [])]
+            return [r for r in receivers if r is not None]
+
+        def _proxy(sender, **kwargs):
+            for receiver in _receivers():
+                receiver(sender, **kwargs)
+        # the lifecycle trace times the plugin import under this name and
+        # the plugin receivers (gcdt_receivers) each on their own
+        _proxy.__module__ = self._entry['module']
+        _proxy.__name__ = str('load')
+        _proxy.gcdt_receivers = _receivers
+        return _proxy
+
+    def load(self):
+        """Import and register the plugin (once).
+
+        :return: dict of signal name -> receivers connected by the plugin
+        """
+        with self._lock:
+            if self._receivers is None:
+                log.debug('loading plugin \'%s\'', self._entry['name'])
+                self._receivers = _register(_load_entry(self._entry))
+                # the proxies already hold the place of the plugin receivers
+                for name in self._proxies:
+                    for receiver in self._receivers.get(name, []):
+                        receiver = _resolve(receiver)
+                        if receiver is not None:
+                            gcdt_signals.signal(name).disconnect(receiver)
+        return self._receivers
+
 
-    return versions
+def _resolve(receiver):
+    """Receiver from a blinker receiver reference (weak or strong)."""
+    if isinstance(receiver, _WEAK_REFS):
+        return receiver()
+    return receiver
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Adaptive rate limiting for AWS api requests.
+The AWSClient registers a RateLimiter with the botocore session. Api calls
+are not limited until AWS throttles the requests to a service. From then on
+the service has its own token bucket. The rate is increased on successful
+calls and reduced if AWS throttles our requests (AIMD = additive increase,
+multiplicative decrease). Once the rate has recovered to the max. rate
+('GCDT_MAX_REQUEST_RATE') the service is not limited anymore.
+"""
+from __future__ import unicode_literals, print_function
+import logging
+import threading
+import time
+
+import os
+
+log = logging.getLogger(__name__)
+
+# requests per second
+DEFAULT_START_RATE = 10.0  # rate after AWS throttled a service
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_RATE = 100.0
+RATE_INCREASE = 0.5  # additive increase per successful request
+RATE_DECREASE = 0.5  # multiplicative decrease per throttled request
+
+_REQUEST = 'gcdt_ratelimit_request'
+
+THROTTLING_ERROR_CODES = [
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'ProvisionedThroughputExceededException',
+    'SlowDown',
+]
+
+
+class TokenBucket(object):
+    def __init__(self, rate, min_rate=DEFAULT_MIN_RATE,
+                 max_rate=DEFAULT_MAX_RATE):
+        """Thread-safe token bucket.
+
+        :param rate: requests per second
+        :param min_rate: lower bound for the rate
+        :param max_rate: upper bound for the rate
+        """
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._rate = min(max(rate, min_rate), max_rate)
+        self._tokens = 1.0
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def acquire(self):
+        """Take one token from the bucket, wait for it if necessary.
+
+        :return: seconds waited
+        """
+        with self._lock:
+            self._refill()
+            # reserve the token; waiting happens outside of the lock so
+            # other threads can queue up behind us
+            self._tokens -= 1.0
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def increase(self):
+        with self._lock:
+            self._rate = min(self._rate + RATE_INCREASE, self._max_rate)
+
+    def decrease(self):
+        with self._lock:
+            self._rate = max(self._rate * RATE_DECREASE, self._min_rate)
+
+    def _refill(self):
+        now = time.time()
+        # the burst size is one second worth of requests
+        self._tokens = min(self._tokens + (now - self._last) * self._rate,
+                           max(self._rate, 1.0))
+        self._last = now
+
+
+class RateLimiter(object):
+    def __init__(self, start_rate=DEFAULT_START_RATE,
+                 min_rate=DEFAULT_MIN_RATE, max_rate=None):
+        """Per service adaptive rate limiter shared by all gcdt tools.
+
+        :param start_rate: requests per second once a service is throttled
+        :param min_rate: lower bound for the rate
+        :param max_rate: services which recover to this rate are not limited
+            anymore (default: 'GCDT_MAX_REQUEST_RATE' or DEFAULT_MAX_RATE)
+        """
+        if max_rate is None:
+            max_rate = float(os.getenv('GCDT_MAX_REQUEST_RATE',
+                                       DEFAULT_MAX_RATE))
+        self._start_rate = min(start_rate, max_rate)
+        self._min_rate = min(min_rate, self._start_rate)
+        self._max_rate = max_rate
+        self._buckets = {}  # only services which are throttled
+        self._lock = threading.Lock()
+
+    def get_bucket(self, service_name):
+        """Token bucket of a throttled service.
+
+        :param service_name:
+        :return: TokenBucket or None if the service is not limited
+        """
+        with self._lock:
+            return self._buckets.get(service_name)
+
+    def register(self, session):
+        """Register the rate limiter with the botocore session.
+        Note: this needs to happen before the clients are created.
+
+        :param session: botocore session
+        """
+        session.register('before-call.*.*', self._before_call)
+        session.register('after-call.*.*', self._after_call)
+        session.register('needs-retry.*.*', self._needs_retry)
+
+    def unregister(self, events):
+        """Exempt a client from rate limiting, e.g. for a load test.
+
+        :param events: event emitter of the client (client.meta.events)
+        """
+        events.unregister('before-call.*.*', self._before_call)
+        events.unregister('after-call.*.*', self._after_call)
+        events.unregister('needs-retry.*.*', self._needs_retry)
+
+    def _before_call(self, model, context, **kwargs):
+        # responses from the cache return before this handler is called, the
+        # marker tells after-call that the request went to AWS
+        context[_REQUEST] = True
+        bucket = self.get_bucket(model.service_model.service_name)
+        if bucket is not None:
+            bucket.acquire()
+
+    def _after_call(self, http_response, model, context, **kwargs):
+        if not context.pop(_REQUEST, False):
+            return
+        if http_response is None or http_response.status_code >= 300:
+            return
+        service_name = model.service_model.service_name
+        bucket = self.get_bucket(service_name)
+        if bucket is None:
+            return
+        bucket.increase()
+        if bucket.rate >= self._max_rate:
+            with self._lock:
+                if self._buckets.get(service_name) is bucket:
+                    del self._buckets[service_name]
+            log.debug('%s requests are not limited anymore', service_name)
+
+    def _needs_retry(self, operation, response=None, **kwargs):
+        # note: this is called for every attempt and must return None so it
+        # does not interfere with the botocore retry handler
+        if response is not None and is_throttling_error(response[1]):
+            service_name = operation.service_model.service_name
+            with self._lock:
+                bucket = self._buckets.get(service_name)
+                if bucket is None:
+                    bucket = TokenBucket(self._start_rate, self._min_rate,
+                                         self._max_rate)
+                    self._buckets[service_name] = bucket
+                else:
+                    bucket.decrease()
+            log.debug('%s requests are throttled, reduce rate to %0.2f/s',
+                      service_name, bucket.rate)
+
+
+def is_throttling_error(parsed):
+    """Check whether the parsed response is a throttling error.
+
+    :param parsed: parsed botocore response
+    :return: True / False
+    """
+    if not parsed:
+        return False
+    return parsed.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
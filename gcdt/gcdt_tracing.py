@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Timing of the gcdt lifecycle.
+The lifecycle sends its signals through a LifecycleTracer which records the
+time spent in every signal and in every receiver (plugins, hooks). Set
+'GCDT_TRACE' to a filename to write the timeline as Chrome trace (open it in
+chrome://tracing or https://ui.perfetto.dev). Otherwise the slowest
+receivers are only shown in DEBUG mode.
+"""
+from __future__ import unicode_literals, print_function
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .gcdt_logging import getLogger
+
+log = getLogger(__name__)
+
+
+class LifecycleTracer(object):
+    def __init__(self):
+        """Record the timeline of lifecycle phases, signals and receivers."""
+        self._events = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, category='phase', **args):
+        """Time the enclosed block.
+
+        :param name: name of the timeline event
+        :param category: 'phase', 'signal' or 'receiver'
+        :param args: additional information for the timeline event
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self._add_event(name, category, start, time.time(), args)
+
+    def send(self, signal, sender):
+        """Send the signal and time the signal and each of its receivers
+        (same as blinker Signal.send).
+
+        :param signal: blinker signal
+        :param sender: the signal payload, e.g. (context, config)
+        :return: list of (receiver, return value) tuples
+        """
+        result = []
+        with self.span(signal.name, 'signal'):
+            for receiver in signal.receivers_for(sender):
+                for receiver in self._get_receivers(signal, receiver):
+                    with self.span(get_receiver_name(receiver), 'receiver',
+                                   signal=signal.name):
+                        result.append((receiver, receiver(sender)))
+        return result
+
+    def _get_receivers(self, signal, receiver):
+        # lazy plugins (see gcdt_plugins) connect a proxy which imports the
+        # plugin, we time the import and the plugin receivers separately
+        get_receivers = getattr(receiver, 'gcdt_receivers', None)
+        if get_receivers is None:
+            return [receiver]
+        with self.span(get_receiver_name(receiver), 'receiver',
+                       signal=signal.name):
+            return get_receivers()
+
+    @property
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def summary(self, category='receiver'):
+        """Total time per event name ordered by time spent.
+
+        :param category: 'phase', 'signal' or 'receiver'
+        :return: list of (name, seconds) tuples
+        """
+        totals = {}
+        for e in self.events:
+            if e['category'] == category:
+                totals[e['name']] = totals.get(e['name'], 0.0) + \
+                    e['end'] - e['start']
+        return sorted(totals.items(), key=lambda t: t[1], reverse=True)
+
+    def to_chrome_trace(self):
+        """Timeline in the Chrome trace event format.
+
+        :return: dict (json serializable)
+        """
+        pid = os.getpid()
+        trace_events = []
+        for e in self.events:
+            trace_events.append({
+                'name': e['name'],
+                'cat': e['category'],
+                'ph': 'X',  # complete event
+                'ts': int(e['start'] * 1000000),
+                'dur': int((e['end'] - e['start']) * 1000000),
+                'pid': pid,
+                'tid': e['thread'],
+                'args': e['args']
+            })
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def _add_event(self, name, category, start, end, args):
+        with self._lock:
+            self._events.append({
+                'name': name, 'category': category, 'start': start,
+                'end': end, 'thread': threading.current_thread().ident,
+                'args': args
+            })
+
+
+def get_receiver_name(receiver):
+    """Name of the receiver for the timeline, e.g. 'gcdt_lookups.lookup'."""
+    module = getattr(receiver, '__module__', None)
+    name = getattr(receiver, '__name__', None) or repr(receiver)
+    if module:
+        return '%s.%s' % (module, name)
+    return name
+
+
+def report_lifecycle_trace(tracer):
+    """Write the timeline to 'GCDT_TRACE' and output the slowest receivers.
+
+    :param tracer: LifecycleTracer
+    """
+    filename = os.getenv('GCDT_TRACE')
+    if filename:
+        try:
+            with open(filename, 'w') as tfile:
+                json.dump(tracer.to_chrome_trace(), tfile)
+            log.info('lifecycle trace written to \'%s\'', filename)
+        except (IOError, OSError) as e:
+            log.warning('could not write lifecycle trace: %s', e)
+    for name, duration in tracer.summary()[:10]:
+        log.debug('%0.3fs %s', duration, name)
@@ -241,7 +241,9 @@ def _poll_stack_events(awsclient, stack_name, last_event=None):
     print('%-50s %-25s %-50s %-25s\n' % ('Resource Status', 'Resource ID',
                                          'Reason', 'Timestamp'))
     while status not in finished_statuses:
-        response = client.describe_stack_events(StackName=stack_id)
+        awsclient.refresh_credentials()
+        with awsclient.uncached():
+            response = client.describe_stack_events(StackName=stack_id)
         for event in response['StackEvents'][::-1]:
             if event['EventId'] not in seen_events and \
                     (not last_event or event['Timestamp'] > last_event):
@@ -617,9 +619,11 @@ def describe_change_set(awsclient, change_set_name, stack_name):
 
     status = None
     while status not in ['CREATE_COMPLETE', 'FAILED']:
-        response = client.describe_change_set(
-            ChangeSetName=change_set_name,
-            StackName=stack_name)
+        awsclient.refresh_credentials()
+        with awsclient.uncached():
+            response = client.describe_change_set(
+                ChangeSetName=change_set_name,
+                StackName=stack_name)
         status = response['Status']
         # print('##### %s' % status)
         if status == 'FAILED':
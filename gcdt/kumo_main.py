@@ -14,17 +14,11 @@ import time
 from tempfile import NamedTemporaryFile
 
 from clint.textui import colored
-from pyspin.spin import Default, Spinner
 
 from . import utils
-from .kumo_core import get_parameter_diff, delete_stack, \
-    deploy_stack, write_template_to_file, list_stacks, create_change_set, \
-    describe_change_set, load_cloudformation_template, call_pre_hook, \
-    generate_template, info
-from .kumo_start_stop import stop_stack, start_stack
-from .kumo_viz import cfn_viz, svg_output
 from .gcdt_cmd_dispatcher import cmd
 from . import gcdt_lifecycle
+# note: the tool modules are imported in the cmds to keep the startup fast
 
 
 # creating docopt parameters and usage help
@@ -49,6 +43,7 @@ DOC = '''Usage:
 def load_template():
     """Bail out if template is not found.
     """
+    from .kumo_core import load_cloudformation_template
     cloudformation, found = load_cloudformation_template()
     if not found:
         print(colored.red('could not load cloudformation.py, bailing out...'))
@@ -63,6 +58,8 @@ def version_cmd():
 
 @cmd(spec=['dot'])
 def dot_cmd(**tooldata):
+    from .kumo_core import generate_template
+    from .kumo_viz import cfn_viz, svg_output
     context = tooldata.get('context')
     conf = tooldata.get('config')
     cloudformation = load_template()
@@ -80,6 +77,8 @@ def dot_cmd(**tooldata):
 
 @cmd(spec=['deploy', '--override-stack-policy'])
 def deploy_cmd(override, **tooldata):
+    from pyspin.spin import Default, Spinner
+    from .kumo_core import call_pre_hook, get_parameter_diff, deploy_stack
     context = tooldata.get('context')
     conf = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -106,6 +105,7 @@ def deploy_cmd(override, **tooldata):
 
 @cmd(spec=['delete', '-f'])
 def delete_cmd(force, **tooldata):
+    from .kumo_core import delete_stack
     context = tooldata.get('context')
     conf = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -114,6 +114,7 @@ def delete_cmd(force, **tooldata):
 
 @cmd(spec=['generate'])
 def generate_cmd(**tooldata):
+    from .kumo_core import write_template_to_file, generate_template
     conf = tooldata.get('config')
     cloudformation = load_template()
     write_template_to_file(conf, generate_template({}, conf, cloudformation))
@@ -122,6 +123,7 @@ def generate_cmd(**tooldata):
 
 @cmd(spec=['list'])
 def list_cmd(**tooldata):
+    from .kumo_core import list_stacks
     context = tooldata.get('context')
     awsclient = context.get('_awsclient')
     list_stacks(awsclient)
@@ -129,6 +131,8 @@ def list_cmd(**tooldata):
 
 @cmd(spec=['preview'])
 def preview_cmd(**tooldata):
+    from .kumo_core import get_parameter_diff, create_change_set, \
+        describe_change_set, delete_stack
     context = tooldata.get('context')
     conf = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -151,6 +155,7 @@ def preview_cmd(**tooldata):
 
 @cmd(spec=['stop', '<stack_name>'])
 def stop_cmd(stack_name, **tooldata):
+    from .kumo_start_stop import stop_stack
     context = tooldata.get('context')
     #conf = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -161,6 +166,7 @@ def stop_cmd(stack_name, **tooldata):
 
 @cmd(spec=['start', '<stack_name>'])
 def start_cmd(stack_name, **tooldata):
+    from .kumo_start_stop import start_stack
     context = tooldata.get('context')
     #conf = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -171,6 +177,7 @@ def start_cmd(stack_name, **tooldata):
 
 @cmd(spec=['info', '--json'])
 def info_cmd(json, **tooldata):
+    from .kumo_core import info
     context = tooldata.get('context')
     if json:
         context['format'] = 'json'
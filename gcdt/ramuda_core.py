@@ -6,10 +6,17 @@ Deploy Lambda functions to AWS
 
 from __future__ import unicode_literals, print_function
 
+import base64
+import itertools
 import json
 import logging
+import re
 import shutil
+import threading
 import time
+from collections import OrderedDict
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 import maya
 import os
@@ -19,14 +26,43 @@ from clint.textui import colored
 from gcdt.ramuda_utils import filter_bucket_notifications_with_arn
 from gcdt.ramuda_wire import unwire, unwire_deprecated
 from .cloudwatch_logs import put_retention_policy, delete_log_group, \
-    filter_log_events, decode_format_timestamp, datetime_to_timestamp
+    decode_format_timestamp, datetime_to_timestamp, \
+    LogTailer, merge_log_events, list_log_groups, iter_log_events
+from .cloudwatch_logs_cache import LogCache, get_log_cache_file, \
+    prune_log_cache_files
+from .gcdt_ratelimit import is_throttling_error
 from .ramuda_utils import s3_upload, \
-    lambda_exists, create_sha256, get_remote_code_hash, unit, \
-    aggregate_datapoints, build_filter_rules
-from .utils import GracefulExit, json2table
+    lambda_exists, get_function, get_bundle, get_remote_code_hash, unit, \
+    aggregate_datapoints, build_filter_rules, parse_report_line, \
+    parse_report_lines, get_report_stats, format_report_stats, \
+    get_load_test_stats, \
+    REPORT_FILTER_PATTERN
+from .utils import GracefulExit, json2table, iter_items, percentile
 
 log = logging.getLogger(__name__)
 ALIAS_NAME = 'ACTIVE'
+PING_PAYLOAD = '{"ramuda_action": "ping"}'
+LAMBDA_READY_TIMEOUT = 300  # seconds
+PROVISIONED_CONCURRENCY_TIMEOUT = 900  # seconds
+LOGS_MAX_WORKERS = 10
+METRICS_MAX_WORKERS = 4
+LIST_MAX_WORKERS = 10
+LOAD_TEST_COUNT = 100
+# GetMetricData supports 100 queries per request
+METRICS_MAX_QUERIES = 100
+# (column, metric name, statistic) per function
+FLEET_METRICS = [
+    ('invocations', 'Invocations', 'Sum'),
+    ('errors', 'Errors', 'Sum'),
+    ('throttles', 'Throttles', 'Sum'),
+    ('duration_sum', 'Duration', 'Sum'),
+    ('duration_p99', 'Duration', 'p99'),
+    ('concurrency_max', 'ConcurrentExecutions', 'Maximum'),
+    ('iterator_age_max', 'IteratorAge', 'Maximum'),
+]
+FLEET_METRICS_COLUMNS = ['function', 'invocations', 'errors', 'throttles',
+                         'duration_avg', 'duration_p99', 'concurrency_max',
+                         'iterator_age_max']
 
 
 def _create_alias(awsclient, function_name, function_version,
@@ -82,6 +118,25 @@ def _get_alias_version(awsclient, function_name, alias_name):
         return
 
 
+def _get_alias_configuration(awsclient, function_name, alias_name,
+                             latest_configuration=None):
+    """Configuration of the function version the alias points to.
+
+    :param latest_configuration: configuration of '$LATEST' (if known)
+    :return: function configuration or None if the alias does not exist
+    """
+    alias_version = _get_alias_version(awsclient, function_name, alias_name)
+    if alias_version is None:
+        return None
+    if alias_version == '$LATEST' and latest_configuration is not None:
+        return latest_configuration
+    client_lambda = awsclient.get_client('lambda')
+    return client_lambda.get_function_configuration(
+        FunctionName=function_name,
+        Qualifier=alias_version
+    )
+
+
 def _get_version_from_response(data):
     version = data['Version']
     return int(version) if version.isdigit() else 0
@@ -115,11 +170,132 @@ def _get_previous_version(awsclient, function_name, alias_name):
 
 
 def _deploy_alias(awsclient, function_name, function_version,
-                  alias_name=ALIAS_NAME):
+                  alias_name=ALIAS_NAME, provisioned_concurrency=None):
+    """Point the alias to the function version.
+
+    :param provisioned_concurrency: provisioned concurrent executions of the
+        alias (0 to remove, None to leave it as it is)
+    """
     if _alias_exists(awsclient, function_name, alias_name):
         _update_alias(awsclient, function_name, function_version, alias_name)
     else:
         _create_alias(awsclient, function_name, function_version, alias_name)
+    if provisioned_concurrency is not None:
+        _update_provisioned_concurrency(awsclient, function_name, alias_name,
+                                        provisioned_concurrency)
+
+
+def _update_reserved_concurrency(awsclient, function_name, reserved,
+                                 current=None):
+    """Reconcile the reserved concurrency of the function.
+
+    :param awsclient:
+    :param function_name:
+    :param reserved: reserved concurrent executions (None to remove)
+    :param current: current reserved concurrent executions
+    """
+    if reserved == current:
+        return
+    client_lambda = awsclient.get_client('lambda')
+    if reserved is None:
+        log.info('removing the reserved concurrency of \'%s\'', function_name)
+        client_lambda.delete_function_concurrency(FunctionName=function_name)
+    else:
+        log.info('setting the reserved concurrency of \'%s\' to %d',
+                 function_name, reserved)
+        client_lambda.put_function_concurrency(
+            FunctionName=function_name,
+            ReservedConcurrentExecutions=reserved
+        )
+
+
+def _get_provisioned_concurrency(awsclient, function_name, alias_name):
+    client_lambda = awsclient.get_client('lambda')
+    try:
+        with awsclient.uncached():
+            return client_lambda.get_provisioned_concurrency_config(
+                FunctionName=function_name,
+                Qualifier=alias_name
+            )
+    except ClientError as e:
+        if e.response['Error']['Code'] == \
+                'ProvisionedConcurrencyConfigNotFoundException':
+            return None
+        raise
+
+
+def _update_provisioned_concurrency(awsclient, function_name, alias_name,
+                                    provisioned):
+    """Reconcile the provisioned concurrency of the alias and wait until
+    the capacity is ready (also after the alias moved to a new version).
+
+    :param awsclient:
+    :param function_name:
+    :param alias_name:
+    :param provisioned: provisioned concurrent executions (0 to remove)
+    """
+    client_lambda = awsclient.get_client('lambda')
+    if not hasattr(client_lambda, 'get_provisioned_concurrency_config'):
+        if not provisioned:
+            return  # this botocore version can not have configured any
+        raise Exception('Provisioned concurrency needs a more recent '
+                        'botocore version')
+    config = _get_provisioned_concurrency(awsclient, function_name,
+                                          alias_name)
+    if not provisioned:
+        if config is not None:
+            log.info('removing the provisioned concurrency of \'%s:%s\'',
+                     function_name, alias_name)
+            client_lambda.delete_provisioned_concurrency_config(
+                FunctionName=function_name,
+                Qualifier=alias_name
+            )
+        return
+    if config is None or \
+            config['RequestedProvisionedConcurrentExecutions'] != provisioned:
+        log.info('setting the provisioned concurrency of \'%s:%s\' to %d',
+                 function_name, alias_name, provisioned)
+        config = client_lambda.put_provisioned_concurrency_config(
+            FunctionName=function_name,
+            Qualifier=alias_name,
+            ProvisionedConcurrentExecutions=provisioned
+        )
+    _wait_for_provisioned_concurrency(awsclient, function_name, alias_name,
+                                      config)
+
+
+def _wait_for_provisioned_concurrency(awsclient, function_name, alias_name,
+                                      config,
+                                      timeout=PROVISIONED_CONCURRENCY_TIMEOUT):
+    """Wait until the provisioned concurrency is ready. Poll intervals start
+    small and grow with the waiting time.
+
+    :param awsclient:
+    :param function_name:
+    :param alias_name:
+    :param config: provisioned concurrency config from the last api response
+    :param timeout: max. seconds to wait
+    :return: provisioned concurrency config
+    """
+    deadline = time.time() + timeout
+    delay = 1.0
+    if config.get('Status') == 'IN_PROGRESS':
+        log.info('waiting for the provisioned concurrency of \'%s:%s\'',
+                 function_name, alias_name)
+    while config.get('Status') == 'IN_PROGRESS':
+        if time.time() > deadline:
+            raise Exception('Provisioned concurrency of \'%s:%s\' is not '
+                            'ready after %ds' % (function_name, alias_name,
+                                                 timeout))
+        time.sleep(delay)
+        delay = min(delay * 1.5, 10)
+        awsclient.refresh_credentials()
+        config = _get_provisioned_concurrency(awsclient, function_name,
+                                              alias_name) or {}
+    if config.get('Status') == 'FAILED':
+        raise Exception('Provisioned concurrency of \'%s:%s\' failed: %s' % (
+            function_name, alias_name, config.get('StatusReason')))
+    return config
 
 
 def list_functions(awsclient):
@@ -127,9 +303,7 @@ def list_functions(awsclient):
 
     :return: exit_code
     """
-    client_lambda = awsclient.get_client('lambda')
-    response = client_lambda.list_functions()
-    for function in response['Functions']:
+    for function in iter_functions(awsclient):
         log.info(function['FunctionName'])
         log.info('\t' 'Memory: ' + str(function['MemorySize']))
         log.info('\t' 'Timeout: ' + str(function['Timeout']))
@@ -142,6 +316,107 @@ def list_functions(awsclient):
     return 0
 
 
+def iter_functions(awsclient, prefix=None, runtime=None):
+    """Generator for the deployed lambda functions (lazily paginated).
+
+    :param prefix: only functions starting with prefix
+    :param runtime: only functions with this runtime
+    :return: generator of function configurations
+    """
+    client_lambda = awsclient.get_client('lambda')
+    for function in iter_items(client_lambda.list_functions, {},
+                               lambda r: r['Functions']):
+        if prefix and not function['FunctionName'].startswith(prefix):
+            continue
+        if runtime and function.get('Runtime') != runtime:
+            continue
+        yield function
+
+
+def get_function_list(awsclient, prefix=None, runtime=None, details=False,
+                      versions=False):
+    """Overview of the deployed lambda functions.
+
+    :param prefix: only functions starting with prefix
+    :param runtime: only functions with this runtime
+    :param details: add the alias version and reserved concurrency (looked up
+        concurrently)
+    :param versions: add the number of versions (this pages through all
+        versions of each function)
+    :return: list of dicts (one per function) ordered by name
+    """
+    rows = []
+    futures = []
+    with ThreadPoolExecutor(max_workers=LIST_MAX_WORKERS) as executor:
+        for function in iter_functions(awsclient, prefix, runtime):
+            rows.append(OrderedDict([
+                ('function', function['FunctionName']),
+                ('runtime', function.get('Runtime')),
+                ('memory', function['MemorySize']),
+                ('timeout', function['Timeout']),
+                ('code_size', function['CodeSize']),
+                ('last_modified', function['LastModified'])
+            ]))
+            if details or versions:
+                # the lookups run while we fetch the next pages
+                futures.append(executor.submit(
+                    _get_function_details, awsclient,
+                    function['FunctionName'], details, versions))
+        for row, future in zip(rows, futures):
+            row.update(future.result())
+    return sorted(rows, key=lambda r: r['function'])
+
+
+def _get_function_details(awsclient, function_name, details=True,
+                          versions=False):
+    client_lambda = awsclient.get_client('lambda')
+    row = OrderedDict()
+    if details:
+        aliases = {a['Name']: a['FunctionVersion'] for a in iter_items(
+            client_lambda.list_aliases, {'FunctionName': function_name},
+            lambda r: r['Aliases'])}
+        row['active_version'] = aliases.get(ALIAS_NAME)
+    if versions:
+        row['versions'] = sum(1 for _ in iter_items(
+            client_lambda.list_versions_by_function,
+            {'FunctionName': function_name},
+            lambda r: [v['Version'] for v in r['Versions']
+                       if v['Version'] != '$LATEST']))
+    if details:
+        row['reserved_concurrency'] = _get_reserved_concurrency(
+            awsclient, function_name)
+    return row
+
+
+def _get_reserved_concurrency(awsclient, function_name):
+    client_lambda = awsclient.get_client('lambda')
+    if not hasattr(client_lambda, 'get_function_concurrency'):
+        # older botocore versions only return it with the whole function
+        function = get_function(awsclient, function_name) or {}
+        return function.get('Concurrency', {}).get(
+            'ReservedConcurrentExecutions')
+    response = client_lambda.get_function_concurrency(
+        FunctionName=function_name)
+    return response.get('ReservedConcurrentExecutions')
+
+
+def format_function_list(rows, fmt='table'):
+    """Format the function overview.
+
+    :param rows: as returned by get_function_list
+    :param fmt: 'table' or 'json'
+    :return: formatted function overview
+    """
+    if fmt == 'json':
+        return json.dumps(rows, indent=2)
+    from tabulate import tabulate  # expensive import, only load when needed
+    if not rows:
+        return ''
+    header = list(rows[0].keys())
+    table = [['-' if v is None else v for v in r.values()] for r in rows]
+    return tabulate(table, headers=header, tablefmt='fancy_grid')
+
+
 def deploy_lambda(awsclient, function_name, role, handler_filename,
                   handler_function,
                   folders, description, timeout, memory, subnet_ids=None,
@@ -149,7 +424,8 @@ def deploy_lambda(awsclient, function_name, role, handler_filename,
                   zipfile=None,
                   fail_deployment_on_unsuccessful_ping=False,
                   runtime='python2.7', settings=None, environment=None,
-                  retention_in_days=None
+                  retention_in_days=None, warm_containers=None,
+                  concurrency=None
                   ):
     """Create or update a lambda function.
 
@@ -168,20 +444,47 @@ def deploy_lambda(awsclient, function_name, role, handler_filename,
     :param zipfile:
     :param environment: environment variables
     :param retention_in_days: retention time of the cloudwatch logs
+    :param warm_containers: pre-warm this many containers after the deployment
+    :param concurrency: dict with 'reservedConcurrentExecutions' of the
+        function and 'provisionedConcurrentExecutions' of the alias (missing
+        ones are removed), None to leave the concurrency settings as they are
     :return: exit_code
     """
     # TODO: the signature of this function is too big, clean this up
     # also consolidate create, update, config and add waiters!
-    if lambda_exists(awsclient, function_name):
-        function_version = _update_lambda(awsclient, function_name,
-                                          handler_filename,
-                                          handler_function, folders, role,
-                                          description, timeout, memory,
-                                          subnet_ids, security_groups,
-                                          artifact_bucket=artifact_bucket,
-                                          zipfile=zipfile,
-                                          environment=environment
-                                          )
+    zipfile = get_bundle(zipfile)
+    up_to_date = False
+    function = get_function(awsclient, function_name)
+    if function:
+        configuration = function['Configuration']
+        code_changed = bool(zipfile) and \
+            zipfile.sha256 != configuration['CodeSha256']
+        changes = _get_configuration_changes(
+            configuration, role, handler_function, description, timeout,
+            memory, subnet_ids, security_groups, environment)
+        if not code_changed and not changes:
+            # the alias might still point to an older version, e.g. after a
+            # failed ping or a rollback
+            alias_configuration = _get_alias_configuration(
+                awsclient, function_name, ALIAS_NAME, configuration)
+            up_to_date = alias_configuration is not None and \
+                alias_configuration['CodeSha256'] == \
+                configuration['CodeSha256'] and \
+                not _get_configuration_changes(
+                    alias_configuration, role, handler_function, description,
+                    timeout, memory, subnet_ids, security_groups,
+                    environment)
+        if not up_to_date:
+            function_version = _update_lambda(awsclient, function_name,
+                                              handler_filename,
+                                              handler_function, folders, role,
+                                              description, timeout, memory,
+                                              subnet_ids, security_groups,
+                                              artifact_bucket=artifact_bucket,
+                                              zipfile=zipfile,
+                                              environment=environment,
+                                              configuration=configuration
+                                              )
     else:
         if not zipfile:
             return 1
@@ -198,6 +501,24 @@ def deploy_lambda(awsclient, function_name, role, handler_filename,
         log_group_name = '/aws/lambda/%s' % function_name
         put_retention_policy(awsclient, log_group_name, retention_in_days)
 
+    provisioned = None
+    if concurrency is not None:
+        _update_reserved_concurrency(
+            awsclient, function_name,
+            concurrency.get('reservedConcurrentExecutions'),
+            (function or {}).get('Concurrency', {}).get(
+                'ReservedConcurrentExecutions'))
+        provisioned = concurrency.get('provisionedConcurrentExecutions', 0)
+
+    if up_to_date:
+        # no need to ping and deploy the alias again
+        log.info('AWS Lambda function \'%s\' is up to date - nothing to '
+                 'deploy', function_name)
+        if provisioned is not None:
+            _update_provisioned_concurrency(awsclient, function_name,
+                                            ALIAS_NAME, provisioned)
+        return 0
+
     pong = ping(awsclient, function_name, version=function_version)
     if 'alive' in str(pong):
         log.info(colored.green('Great you\'re already accepting a ping ' +
@@ -209,7 +530,12 @@ def deploy_lambda(awsclient, function_name, role, handler_filename,
     else:
         log.info(colored.red('Please consider adding a reaction to a ' +
                           'ping event to your lambda function'))
-    _deploy_alias(awsclient, function_name, function_version)
+    _deploy_alias(awsclient, function_name, function_version,
+                  provisioned_concurrency=provisioned)
+    if warm_containers:
+        stats = warm(awsclient, function_name, warm_containers)
+        log.info('warmed \'%s\': %d cold, %d warm, %d errors', function_name,
+                 stats['cold'], stats['warm'], stats['errors'])
     return 0
 
 
@@ -227,6 +553,13 @@ def _create_lambda(awsclient, function_name, role, handler_filename,
     # function_name, role, handler_filename, str(folders), str(timeout), str(memory))
     if environment is None:
         environment = {}
+    zipfile = get_bundle(zipfile)
+    vpc_config = {'SubnetIds': [], 'SecurityGroupIds': []}
+    if subnet_ids and security_groups:
+        vpc_config = {
+            'SubnetIds': subnet_ids,
+            'SecurityGroupIds': security_groups
+        }
 
     if not artifact_bucket:
         log.debug('create without artifact bucket...')
@@ -237,7 +570,7 @@ def _create_lambda(awsclient, function_name, role, handler_filename,
             Role=role,
             Handler=handler_function,
             Code={
-                'ZipFile': zipfile
+                'ZipFile': zipfile.read()
             },
             Description=description,
             Timeout=int(timeout),
@@ -245,7 +578,8 @@ def _create_lambda(awsclient, function_name, role, handler_filename,
             Publish=True,
             Environment={
                 'Variables': environment
-            }
+            },
+            VpcConfig=vpc_config
         )
     elif artifact_bucket and zipfile:
         log.debug('create with artifact bucket...')
@@ -271,7 +605,8 @@ def _create_lambda(awsclient, function_name, role, handler_filename,
             Publish=True,
             Environment={
                 'Variables': environment
-            }
+            },
+            VpcConfig=vpc_config
         )
     else:
         log.debug('no zipfile and no artifact_bucket -> nothing to do!')
@@ -281,18 +616,8 @@ def _create_lambda(awsclient, function_name, role, handler_filename,
 
     function_version = response['Version']
     log.info(json2table(response))
-    # FIXME: 23.08.2016 WHY update configuration after create?
-    # timing issue:
-    # http://jenkins.dev.dp.glomex.cloud/job/packages/job/gcdt_pull_request/32/console
-    #       1) we need to wait till the function is available for update
-    #          is there a better way than sleep?
-    time.sleep(15)
-    #       2) I believe this was implemented as shortcut to set subnet, and sg
-    #          a way better way is to set this is using the using VPCConfig argument!
-    _update_lambda_configuration(
-        awsclient, function_name, role, handler_function, description,
-        timeout, memory, subnet_ids, security_groups
-    )
+    # the function can not be invoked or updated before it is ready
+    _wait_for_lambda_function(awsclient, function_name, response)
     return function_version
 
 
@@ -300,13 +625,27 @@ def _update_lambda(awsclient, function_name, handler_filename,
                    handler_function, folders,
                    role, description, timeout, memory, subnet_ids=None,
                    security_groups=None, artifact_bucket=None,
-                   zipfile=None, environment=None
+                   zipfile=None, environment=None, configuration=None
                    ):
+    """Update code and configuration of the lambda function.
+
+    :param configuration: remote function configuration (if it is known
+        the parts which did not change are not updated)
+    :return: function version
+    """
     log.debug('update lambda function: %s', function_name)
+    remote_hash = configuration['CodeSha256'] if configuration else None
     _update_lambda_function_code(awsclient, function_name,
                                  artifact_bucket=artifact_bucket,
-                                 zipfile=zipfile
+                                 zipfile=zipfile,
+                                 remote_hash=remote_hash
                                  )
+    if configuration and not _get_configuration_changes(
+            configuration, role, handler_function, description, timeout,
+            memory, subnet_ids, security_groups, environment):
+        log.info('AWS Lambda configuration hasn\'t changed - won\'t update '
+                 'configuration')
+        return configuration['Version']
     function_version = \
         _update_lambda_configuration(
             awsclient, function_name, role, handler_function,
@@ -323,10 +662,11 @@ def bundle_lambda(zipfile):
     :return: exit_code
     """
     # TODO have 'bundle.zip' as default config
+    zipfile = get_bundle(zipfile)
     if not zipfile:
         return 1
-    with open('bundle.zip', 'wb') as zfile:
-        zfile.write(zipfile)
+    with zipfile.open() as bfile, open('bundle.zip', 'wb') as zfile:
+        shutil.copyfileobj(bfile, zfile)
     log.info('Finished - a bundle.zip is waiting for you...')
     return 0
 
@@ -334,16 +674,19 @@ def bundle_lambda(zipfile):
 def _update_lambda_function_code(
         awsclient, function_name,
         artifact_bucket=None,
-        zipfile=None
+        zipfile=None,
+        remote_hash=None
 ):
     log.debug('Updating existing AWS Lambda function...')
     client_lambda = awsclient.get_client('lambda')
+    zipfile = get_bundle(zipfile)
     if not zipfile:
         return 1
-    local_hash = create_sha256(zipfile)
+    local_hash = zipfile.sha256
     log.debug('local_hash: %s', local_hash)
 
-    remote_hash = get_remote_code_hash(awsclient, function_name)
+    if remote_hash is None:
+        remote_hash = get_remote_code_hash(awsclient, function_name)
     log.debug('remote_hash: %s', remote_hash)
     if local_hash == remote_hash:
         log.warn('AWS Lambda code hasn\'t changed - won\'t upload code bundle')
@@ -352,7 +695,7 @@ def _update_lambda_function_code(
             log.warn('no stack bucket found')
             response = client_lambda.update_function_code(
                 FunctionName=function_name,
-                ZipFile=zipfile,
+                ZipFile=zipfile.read(),
                 Publish=True
             )
         else:
@@ -368,9 +711,81 @@ def _update_lambda_function_code(
                 Publish=True
             )
         log.info(json2table(response))
+        # the configuration can not be updated before the code update is done
+        _wait_for_lambda_function(awsclient, function_name, response)
     return 0
 
 
+def _wait_for_lambda_function(awsclient, function_name, configuration,
+                              timeout=LAMBDA_READY_TIMEOUT):
+    """Wait until the function is ready (not 'Pending' and no update in
+    progress). Poll intervals start small and grow with the waiting time.
+
+    :param awsclient:
+    :param function_name:
+    :param configuration: function configuration from the last api response
+    :param timeout: max. seconds to wait
+    :return: function configuration
+    """
+    client_lambda = awsclient.get_client('lambda')
+    deadline = time.time() + timeout
+    delay = 0.5
+    while configuration.get('State') == 'Pending' or \
+            configuration.get('LastUpdateStatus') == 'InProgress':
+        if time.time() > deadline:
+            raise Exception('Lambda function \'%s\' is not ready after %ds' %
+                            (function_name, timeout))
+        log.debug('waiting for lambda function \'%s\' to be ready',
+                  function_name)
+        time.sleep(delay)
+        delay = min(delay * 1.5, 5)
+        awsclient.refresh_credentials()
+        with awsclient.uncached():
+            configuration = client_lambda.get_function_configuration(
+                FunctionName=function_name)
+    if configuration.get('State') == 'Failed':
+        raise Exception('Lambda function \'%s\' failed: %s' %
+                        (function_name, configuration.get('StateReason')))
+    if configuration.get('LastUpdateStatus') == 'Failed':
+        raise Exception('Lambda function \'%s\' update failed: %s' % (
+            function_name, configuration.get('LastUpdateStatusReason')))
+    return configuration
+
+
+def _get_configuration_changes(configuration, role, handler_function,
+                               description, timeout, memory, subnet_ids=None,
+                               security_groups=None, environment=None):
+    """Compare the remote function configuration with the desired one.
+
+    :param configuration: remote function configuration
+    :return: list of the names of the changed fields
+    """
+    desired = {
+        'Role': role,
+        'Handler': handler_function,
+        'Description': description or '',
+        'Timeout': int(timeout),
+        'MemorySize': int(memory),
+        'Environment': environment or {}
+    }
+    remote = {
+        'Role': configuration.get('Role'),
+        'Handler': configuration.get('Handler'),
+        'Description': configuration.get('Description', ''),
+        'Timeout': configuration.get('Timeout'),
+        'MemorySize': configuration.get('MemorySize'),
+        'Environment':
+            configuration.get('Environment', {}).get('Variables', {})
+    }
+    if subnet_ids and security_groups:
+        # note: the VPC config is not removed by the configuration update
+        vpc_config = configuration.get('VpcConfig', {})
+        desired['VpcConfig'] = (sorted(subnet_ids), sorted(security_groups))
+        remote['VpcConfig'] = (sorted(vpc_config.get('SubnetIds', [])),
+                               sorted(vpc_config.get('SecurityGroupIds', [])))
+    return sorted(k for k in desired if desired[k] != remote[k])
+
+
 def _update_lambda_configuration(awsclient, function_name, role,
                                  handler_function,
                                  description, timeout, memory, subnet_ids=None,
@@ -412,6 +827,8 @@ def _update_lambda_configuration(awsclient, function_name, role,
             })
 
         log.info(json2table(response))
+    # publishing a version needs to wait for the update to complete
+    _wait_for_lambda_function(awsclient, function_name, response)
     function_version = response['Version']
     return function_version
 
@@ -450,6 +867,123 @@ def get_metrics(awsclient, name):
     return 0
 
 
+def get_function_names(awsclient, prefix=None):
+    """Names of the deployed lambda functions.
+
+    :param prefix: only functions starting with prefix
+    :return: sorted list of function names
+    """
+    return sorted(f['FunctionName'] for f in iter_functions(awsclient, prefix))
+
+
+def get_fleet_metrics(awsclient, function_names, period=3600,
+                      window=24 * 3600, end_dt=None):
+    """Lambda metrics of many functions using batched GetMetricData
+    requests.
+
+    :param function_names: list of function names
+    :param period: period of the datapoints in seconds
+    :param window: time window in seconds
+    :param end_dt: end of the time window (defaults to now)
+    :return: list of dicts (one per function)
+    """
+    end_dt = end_dt or maya.now().datetime()
+    start_dt = end_dt - timedelta(seconds=window)
+    queries = []
+    for fidx, name in enumerate(function_names):
+        for midx, (_, metric, stat) in enumerate(FLEET_METRICS):
+            queries.append({
+                'Id': 'm%d_%d' % (fidx, midx),
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'AWS/Lambda',
+                        'MetricName': metric,
+                        'Dimensions': [{'Name': 'FunctionName',
+                                        'Value': name}]
+                    },
+                    'Period': period,
+                    'Stat': stat
+                },
+                'ReturnData': True
+            })
+    client_cw = awsclient.get_client('cloudwatch')
+
+    def _fetch(batch):
+        return list(iter_items(
+            client_cw.get_metric_data,
+            {'MetricDataQueries': batch, 'StartTime': start_dt,
+             'EndTime': end_dt},
+            lambda r: r['MetricDataResults'],
+            tokens=[('NextToken', 'NextToken')]
+        ))
+
+    batches = [queries[i:i + METRICS_MAX_QUERIES]
+               for i in range(0, len(queries), METRICS_MAX_QUERIES)]
+    values = {}  # query id -> datapoints
+    with ThreadPoolExecutor(max_workers=METRICS_MAX_WORKERS) as executor:
+        for results in executor.map(_fetch, batches):
+            for r in results:
+                values.setdefault(r['Id'], []).extend(r['Values'])
+
+    rows = []
+    for fidx, name in enumerate(function_names):
+        row = {'function': name}
+        for midx, (column, _, stat) in enumerate(FLEET_METRICS):
+            datapoints = values.get('m%d_%d' % (fidx, midx), [])
+            if stat == 'Sum':
+                row[column] = sum(datapoints)
+            else:
+                # note: max of the p99 per period (upper bound for the window)
+                row[column] = max(datapoints) if datapoints else None
+        for column in ['invocations', 'errors', 'throttles']:
+            row[column] = int(row[column])
+        duration_sum = row.pop('duration_sum')
+        row['duration_avg'] = duration_sum / row['invocations'] \
+            if row['invocations'] else None
+        rows.append(row)
+    return rows
+
+
+def sort_fleet_metrics(rows, column='invocations'):
+    """Sort the metrics rows by column (descending, missing values last).
+
+    :param rows: as returned by get_fleet_metrics
+    :param column: column name
+    :return: sorted list of rows
+    """
+    if column not in FLEET_METRICS_COLUMNS:
+        raise ValueError('Unknown column \'%s\' (%s)' %
+                         (column, ', '.join(FLEET_METRICS_COLUMNS)))
+    if column == 'function':
+        return sorted(rows, key=lambda r: r['function'])
+    return sorted(rows, key=lambda r: (r[column] is not None, r[column]),
+                  reverse=True)
+
+
+def format_fleet_metrics(rows, fmt='table'):
+    """Format the metrics rows.
+
+    :param rows: as returned by get_fleet_metrics
+    :param fmt: 'table' or 'json'
+    :return: formatted metrics
+    """
+    if fmt == 'json':
+        return json.dumps([{c: r[c] for c in FLEET_METRICS_COLUMNS}
+                           for r in rows], indent=2)
+    from tabulate import tabulate  # expensive import, only load when needed
+
+    def _value(value):
+        if value is None:
+            return '-'
+        return '%0.1f' % value if isinstance(value, float) else value
+
+    header = ['function', 'invocations', 'errors', 'throttles',
+              'duration avg [ms]', 'duration p99 [ms]', 'concurrency max',
+              'iterator age max [ms]']
+    table = [[_value(r[c]) for c in FLEET_METRICS_COLUMNS] for r in rows]
+    return tabulate(table, headers=header, tablefmt='fancy_grid')
+
+
 def rollback(awsclient, function_name, alias_name=ALIAS_NAME, version=None):
     """Rollback a lambda function to a given version.
 
@@ -645,9 +1179,8 @@ def ping(awsclient, function_name, alias_name=ALIAS_NAME, version=None):
     :return: ping response payload
     """
     log.debug('sending ping to lambda function: %s', function_name)
-    payload = '{"ramuda_action": "ping"}'  # default to ping event
     # reuse invoke
-    return invoke(awsclient, function_name, payload, invocation_type=None,
+    return invoke(awsclient, function_name, PING_PAYLOAD, invocation_type=None,
                   alias_name=alias_name, version=version)
 
 
@@ -668,25 +1201,9 @@ def invoke(awsclient, function_name, payload, invocation_type=None,
     client_lambda = awsclient.get_client('lambda')
     if invocation_type is None:
         invocation_type = 'RequestResponse'
-    if payload.startswith('file://'):
-        log.debug('reading payload from file: %s' % payload)
-        with open(payload[7:], 'r') as pfile:
-            payload = pfile.read()
-
-    if version:
-        response = client_lambda.invoke(
-            FunctionName=function_name,
-            InvocationType=invocation_type,
-            Payload=payload,
-            Qualifier=version
-        )
-    else:
-        response = client_lambda.invoke(
-            FunctionName=function_name,
-            InvocationType=invocation_type,
-            Payload=payload,
-            Qualifier=alias_name
-        )
+    payload = _get_payload(payload)
+    response = _invoke(client_lambda, function_name, payload,
+                       invocation_type, version or alias_name)
 
     results = response['Payload'].read()  # payload is a 'StreamingBody'
     log.debug('invoke completed')
@@ -700,18 +1217,176 @@ def invoke(awsclient, function_name, payload, invocation_type=None,
         return results
 
 
-def logs(awsclient, function_name, start_dt, end_dt=None, tail=False):
-    """Send a ping request to a lambda function.
+def _get_payload(payload):
+    if payload.startswith('file://'):
+        log.debug('reading payload from file: %s' % payload)
+        with open(payload[7:], 'r') as pfile:
+            payload = pfile.read()
+    return payload
+
+
+def _invoke(client_lambda, function_name, payload, invocation_type,
+            qualifier, log_type=None):
+    kwargs = {}
+    if log_type:
+        kwargs['LogType'] = log_type
+    return client_lambda.invoke(
+        FunctionName=function_name,
+        InvocationType=invocation_type,
+        Payload=payload,
+        Qualifier=qualifier,
+        **kwargs
+    )
+
+
+def load_test(awsclient, function_name, payloads, count=LOAD_TEST_COUNT,
+              concurrency=1, alias_name=ALIAS_NAME, version=None):
+    """Invoke the lambda function count times from concurrency parallel
+    workers and measure the latency on the client side.
+    The requests are neither rate limited nor retried so throttling by AWS
+    shows up in the statistics.
+
+    :param awsclient:
+    :param function_name:
+    :param payloads: list of payloads, used round robin ('file://' works
+        like in invoke)
+    :param count: number of invocations
+    :param concurrency: number of parallel workers
+    :param alias_name:
+    :param version:
+    :return: dict with the statistics, see get_load_test_stats
+    """
+    from botocore.config import Config  # expensive import
+    client_lambda = awsclient.create_client(
+        'lambda', rate_limited=False,
+        config=Config(max_pool_connections=concurrency,
+                      retries={'max_attempts': 0}))
+    payloads = [_get_payload(p) for p in payloads]
+    qualifier = version or alias_name
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def _worker():
+        results = []
+        while True:
+            with lock:
+                idx = next(counter)
+            if idx >= count:
+                return results
+            start = time.time()
+            try:
+                response = _invoke(client_lambda, function_name,
+                                   payloads[idx % len(payloads)],
+                                   'RequestResponse', qualifier)
+                response['Payload'].read()
+                status = 'error' if 'FunctionError' in response else 'ok'
+            except GracefulExit:
+                raise
+            except ClientError as e:
+                status = 'throttled' if is_throttling_error(e.response) \
+                    else 'error'
+                log.debug('invocation failed: %s', e)
+            except Exception as e:
+                status = 'error'
+                log.debug('invocation failed: %s', e)
+            results.append(((time.time() - start) * 1000.0, status))
+
+    log.debug('invoking \'%s\' %d times with %d workers', function_name,
+              count, concurrency)
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(_worker) for _ in range(concurrency)]
+        results = [r for f in futures for r in f.result()]
+    return get_load_test_stats(results, time.time() - start)
+
+
+def warm(awsclient, function_name, containers, alias_name=ALIAS_NAME,
+         version=None):
+    """Send simultaneous pings to the lambda function so the given number of
+    execution environments (containers) are initialized. Cold starts are
+    detected by the 'Init Duration' in the REPORT line of the log tail.
 
     :param awsclient:
     :param function_name:
+    :param containers: number of simultaneous pings
+    :param alias_name:
+    :param version:
+    :return: dict with the number of cold / warm responses and errors
+    """
+    from botocore.config import Config  # expensive import
+    # the rate limiter would spread the pings so they reuse containers
+    client_lambda = awsclient.create_client(
+        'lambda', rate_limited=False,
+        config=Config(max_pool_connections=containers))
+    qualifier = version or alias_name
+    go = threading.Event()
+
+    def _ping():
+        go.wait()
+        try:
+            response = _invoke(client_lambda, function_name, PING_PAYLOAD,
+                               'RequestResponse', qualifier, log_type='Tail')
+            response['Payload'].read()
+        except GracefulExit:
+            raise
+        except Exception as e:
+            log.debug('ping failed: %s', e)
+            return None
+        if 'FunctionError' in response:
+            return None
+        report = {}
+        log_tail = base64.b64decode(response.get('LogResult', ''))
+        for line in log_tail.decode('utf-8', 'replace').splitlines():
+            report = parse_report_line(line) or report
+        return report
+
+    log.debug('sending %d pings to \'%s\'', containers, function_name)
+    with ThreadPoolExecutor(max_workers=containers) as executor:
+        futures = [executor.submit(_ping) for _ in range(containers)]
+        go.set()  # all workers are waiting, fire the pings together
+        reports = [f.result() for f in futures]
+    init_durations = [r['init_duration'] for r in reports
+                      if r and r.get('init_duration') is not None]
+    return {
+        'containers': containers,
+        'cold': len(init_durations),
+        'warm': len([1 for r in reports if r is not None]) -
+        len(init_durations),
+        'errors': len([1 for r in reports if r is None]),
+        'init_duration_p50': percentile(init_durations, 50),
+        'init_duration_max': max(init_durations) if init_durations else None
+    }
+
+
+def logs(awsclient, function_name, start_dt, end_dt=None, tail=False,
+         prefix=False, cache=False, pattern=None):
+    """Output the cloudwatch logs of one or more lambda functions.
+    The logs of several functions are fetched concurrently and merged into
+    one output ordered by timestamp.
+
+    :param awsclient:
+    :param function_name: function name or list of function names
     :param start_dt:
     :param end_dt:
     :param tail:
-    :return:
+    :param prefix: the function names are prefixes
+    :param cache: use the local log cache (not in tail mode)
+    :param pattern: only output log entries with messages matching the regex
+    :return: exit_code
     """
-    log.debug('Getting cloudwatch logs for: %s', function_name)
-    log_group_name = '/aws/lambda/%s' % function_name
+    if isinstance(function_name, (list, tuple)):
+        function_names = list(function_name)
+    else:
+        function_names = [function_name]
+    if prefix:
+        prefixes = function_names
+        function_names = _get_function_names_with_log_groups(awsclient,
+                                                             prefixes)
+        if not function_names:
+            log.error('No log groups found for: %s', ', '.join(prefixes))
+            return 1
+    log.debug('Getting cloudwatch logs for: %s', ', '.join(function_names))
+    log_group_names = ['/aws/lambda/%s' % f for f in function_names]
 
     current_date = None
     start_ts = datetime_to_timestamp(start_dt)
@@ -720,24 +1395,94 @@ def logs(awsclient, function_name, start_dt, end_dt=None, tail=False):
     else:
         end_ts = None
 
+    regex = re.compile(pattern) if pattern else None
+    caches = []
     # tail mode
-    # we assume that logs can arrive late but not out of order
-    # so we hold the timestamp of the last logentry and start the next iteration
-    # from there
-    while True:
-        logentries = filter_log_events(awsclient, log_group_name,
-                                       start_ts=start_ts, end_ts=end_ts)
-        if logentries:
-            for e in logentries:
-                actual_date, actual_time = decode_format_timestamp(e['timestamp'])
-                if current_date != actual_date:
-                    # print the date only when it changed
-                    current_date = actual_date
-                    log.info(current_date)
-                log.info('%s  %s' % (actual_time, e['message'].strip()))
-        if tail:
-            if logentries:
-                start_ts = logentries[-1]['timestamp'] + 1
-            time.sleep(2)
-            continue
-        break
+    # logs can arrive late and several events can share a timestamp so the
+    # tailer re-reads a lookback window and skips events it already returned
+    if tail:
+        tailers = [LogTailer(awsclient, lg, start_ts) for lg in log_group_names]
+    elif cache:
+        prune_log_cache_files()
+        account_id = awsclient.get_account_id()
+        caches = [LogCache(awsclient, lg, get_log_cache_file(
+                      account_id, awsclient.get_region(), lg))
+                  for lg in log_group_names]
+
+    try:
+        with ThreadPoolExecutor(max_workers=LOGS_MAX_WORKERS) as executor:
+            while True:
+                if tail:
+                    batches = list(executor.map(lambda t: t.poll(), tailers))
+                elif caches:
+                    # the cache filters locally (also the cached ranges)
+                    batches = [c.iter_log_events(start_ts, end_ts, pattern,
+                                                 executor=executor)
+                               for c in caches]
+                else:
+                    # time sliced and streamed so we can output right away
+                    batches = [iter_log_events(awsclient, lg, start_ts, end_ts,
+                                               executor=executor)
+                               for lg in log_group_names]
+                if regex and not caches:
+                    batches = [(e for e in b if regex.search(e['message']))
+                               for b in batches]
+                for e in merge_log_events(zip(function_names, batches)):
+                    actual_date, actual_time = decode_format_timestamp(e['timestamp'])
+                    if current_date != actual_date:
+                        # print the date only when it changed
+                        current_date = actual_date
+                        log.info(current_date)
+                    if len(function_names) > 1:
+                        log.info('%s  %s  %s' % (actual_time, e['source'],
+                                                 e['message'].strip()))
+                    else:
+                        log.info('%s  %s' % (actual_time, e['message'].strip()))
+                if tail:
+                    time.sleep(min(t.interval for t in tailers))
+                    awsclient.refresh_credentials()
+                    continue
+                break
+    finally:
+        for c in caches:
+            c.close()
+    return 0
+
+
+def stats(awsclient, function_name, start_dt, end_dt=None):
+    """Output performance statistics of a lambda function based on the
+    REPORT lines in its cloudwatch logs.
+
+    :param awsclient:
+    :param function_name:
+    :param start_dt:
+    :param end_dt:
+    :return: exit_code
+    """
+    log_group_name = '/aws/lambda/%s' % function_name
+    start_ts = datetime_to_timestamp(start_dt)
+    end_ts = datetime_to_timestamp(end_dt) if end_dt else None
+    # only the REPORT lines are transferred
+    entries = iter_log_events(awsclient, log_group_name, start_ts, end_ts,
+                              filter_pattern=REPORT_FILTER_PATTERN)
+    result = get_report_stats(
+        parse_report_lines(e['message'] for e in entries))
+    if result is None:
+        log.info('No invocations of \'%s\' found.', function_name)
+        return 0
+    log.info(format_report_stats(result))
+    return 0
+
+
+def _get_function_names_with_log_groups(awsclient, prefixes):
+    """Names of the functions which have a log group and start with one of
+    the prefixes.
+
+    :param prefixes: list of function name prefixes
+    :return: sorted list of function names
+    """
+    function_names = set()
+    for p in prefixes:
+        for lg in list_log_groups(awsclient, '/aws/lambda/%s' % p):
+            function_names.add(lg[len('/aws/lambda/'):])
+    return sorted(function_names)
@@ -15,12 +15,8 @@ from . import gcdt_lifecycle
 from . import utils
 from .gcdt_cmd_dispatcher import cmd
 from .gcdt_defaults import DEFAULT_CONFIG
-from .ramuda_core import list_functions, get_metrics, deploy_lambda, \
-    bundle_lambda, delete_lambda_deprecated, rollback,\
-    ping, info, cleanup_bundle, invoke, logs, delete_lambda
-from gcdt.ramuda_wire import wire, wire_deprecated, unwire, unwire_deprecated
-from .ramuda_utils import check_and_format_logs_params
 from .gcdt_logging import getLogger
+# note: the tool modules are imported in the cmds to keep the startup fast
 
 
 log = getLogger(__name__)
@@ -37,8 +33,10 @@ DOC = '''Usage:
         ramuda clean
         ramuda bundle [--keep] [-v]
         ramuda deploy [--keep] [-v]
-        ramuda list
-        ramuda metrics <lambda>
+        ramuda deploy --all [--workers=<workers>] [--keep] [-v] [<folder>...]
+        ramuda list [--prefix <lambda>] [--runtime=<runtime>] [--details] [--versions] [--json]
+        ramuda metrics <lambda> [--prefix] [--period=<period>] [--window=<window>] [--sort=<column>] [--json]
+        ramuda metrics --all [--period=<period>] [--window=<window>] [--sort=<column>] [--json]
         ramuda info
         ramuda wire [-v]
         ramuda unwire [-v]
@@ -46,20 +44,40 @@ DOC = '''Usage:
         ramuda rollback [-v] <lambda> [<version>]
         ramuda ping [-v] <lambda> [<version>]
         ramuda invoke [-v] <lambda> [<version>] [--invocation-type=<type>] --payload=<payload> [--outfile=<file>]
-        ramuda logs <lambda> [--start=<start>] [--end=<end>] [--tail]
+        ramuda invoke [-v] <lambda> [<version>] --concurrency=<concurrency> [--count=<count>] [--payload=<payload> | --payloads=<file>] [--json]
+        ramuda warm [-v] <lambda> [<version>] --containers=<containers> [--json]
+        ramuda logs <lambdas>... [--prefix] [--start=<start>] [--end=<end>] [--tail] [--cache] [--filter=<pattern>]
+        ramuda stats <lambda> [--start=<start>] [--end=<end>]
         ramuda version
 
 Options:
 -h --help               show this
 -v --verbose            show debug messages
 --keep                  keep (reuse) installed packages
+--all                   deploy: deploy the configs of all sub folders (or the given folders)
+                        metrics: metrics of all lambda functions in the account
+--workers=workers       number of concurrent deployments with '--all' (4)
 --payload=payload       '{"foo": "bar"}' or file://input.txt
 --invocation-type=type  Event, RequestResponse or DryRun
 --outfile=file          write the response to file
+--concurrency=n         load test with n parallel invocations
+--count=m               number of load test invocations (100)
+--payloads=file         JSONL file, one payload per line (used round robin)
+--containers=n          number of containers to warm with simultaneous pings
 --delete-logs           delete the log group and contained logs
 --start=start           log start UTC '2017-06-28 14:23' or '1h', '3d', '5w', ...
 --end=end               log end UTC '2017-06-28 14:25' or '2h', '4d', '6w', ...
 --tail                  continuously output logs (can't use '--end'), stop 'Ctrl-C'
+--prefix                all functions starting with <lambda(s)>
+--period=period         metrics period '60', '5m', '1h', ... (1h)
+--window=window         metrics time window '1h', '3d', '2w', ... (1d)
+--sort=column           sort metrics by invocations, errors, throttles, duration_avg, ...
+--json                  output json
+--runtime=runtime       only functions with this runtime, e.g. 'python3.6'
+--details               add active version and reserved concurrency
+--versions              add the number of versions (pages through all versions)
+--cache                 keep the logs in a local cache, only fetch missing time ranges
+--filter=pattern        only output log messages matching the regex pattern
 '''
 
 
@@ -70,18 +88,38 @@ def version_cmd():
 
 @cmd(spec=['clean'])
 def clean_cmd():
+    from .ramuda_core import cleanup_bundle
     return cleanup_bundle()
 
 
 @cmd(spec=['list'])
 def list_cmd(**tooldata):
+    from .ramuda_core import list_functions
     context = tooldata.get('context')
     awsclient = context.get('_awsclient')
     return list_functions(awsclient)
 
 
+@cmd(spec=['list', '<lambda>', '--prefix', '--runtime', '--details',
+           '--versions', '--json'])
+def list_table_cmd(prefix_name, prefix, runtime, details, versions,
+                   json_output, **tooldata):
+    from .ramuda_core import get_function_list, format_function_list
+    context = tooldata.get('context')
+    awsclient = context.get('_awsclient')
+    rows = get_function_list(awsclient, prefix=prefix_name, runtime=runtime,
+                             details=details, versions=versions)
+    if json_output:
+        print(format_function_list(rows, 'json'))
+    else:
+        log.info(format_function_list(rows))
+    return 0
+
+
 @cmd(spec=['deploy', '--keep'])
 def deploy_cmd(keep, **tooldata):
+    from .ramuda_core import deploy_lambda
+    from .ramuda_utils import get_bundle
     context = tooldata.get('context')
     context['keep'] = keep or DEFAULT_CONFIG['ramuda']['keep']
     config = tooldata.get('config')
@@ -89,6 +127,7 @@ def deploy_cmd(keep, **tooldata):
     fail_deployment_on_unsuccessful_ping = \
         config.get('failDeploymentOnUnsuccessfulPing', False)
     lambda_name = config['lambda'].get('name')
+    context['artifact'] = lambda_name
     lambda_description = config['lambda'].get('description')
     role_arn = config['lambda'].get('role')
     lambda_handler = config['lambda'].get('handlerFunction')
@@ -99,10 +138,12 @@ def deploy_cmd(keep, **tooldata):
     subnet_ids = config['lambda'].get('vpc', {}).get('subnetIds', None)
     security_groups = config['lambda'].get('vpc', {}).get('securityGroups', None)
     artifact_bucket = config.get('deployment', {}).get('artifactBucket', None)
-    zipfile = context['_zipfile']
+    zipfile = get_bundle(context['_zipfile'])
     runtime = config['lambda'].get('runtime', 'python2.7')
     environment = config['lambda'].get('environment', {})
     retention_in_days = config['lambda'].get('logs', {}).get('retentionInDays', None)
+    warm_containers = config['lambda'].get('warm', {}).get('containers', None)
+    concurrency = config['lambda'].get('concurrency', None)
     if runtime:
         assert runtime in DEFAULT_CONFIG['ramuda']['runtime']
     settings = config['lambda'].get('settings', None)
@@ -119,20 +160,53 @@ def deploy_cmd(keep, **tooldata):
         runtime=runtime,
         settings=settings,
         environment=environment,
-        retention_in_days=retention_in_days
+        retention_in_days=retention_in_days,
+        warm_containers=warm_containers,
+        concurrency=concurrency
     )
     return exit_code
 
 
 @cmd(spec=['metrics', '<lambda>'])
 def metrics_cmd(lambda_name, **tooldata):
+    from .ramuda_core import get_metrics
     context = tooldata.get('context')
     awsclient = context.get('_awsclient')
     return get_metrics(awsclient, lambda_name)
 
 
+@cmd(spec=['metrics', '<lambda>', '--all', '--prefix', '--period', '--window',
+           '--sort', '--json'])
+def fleet_metrics_cmd(lambda_name, all_functions, prefix, period, window,
+                      sort, json_output, **tooldata):
+    from .ramuda_core import get_function_names, get_fleet_metrics, \
+        sort_fleet_metrics, format_fleet_metrics
+    from .ramuda_utils import parse_duration
+    context = tooldata.get('context')
+    awsclient = context.get('_awsclient')
+    period = parse_duration(period or '1h')
+    if period < 60 or period % 60:
+        log.error(colored.red('\'--period\' must be a multiple of 60s.'))
+        return 1
+    if all_functions or prefix:
+        function_names = get_function_names(awsclient,
+                                            None if all_functions else
+                                            lambda_name)
+    else:
+        function_names = [lambda_name]
+    rows = get_fleet_metrics(awsclient, function_names, period=period,
+                             window=parse_duration(window or '1d'))
+    rows = sort_fleet_metrics(rows, sort or 'invocations')
+    if json_output:
+        print(format_fleet_metrics(rows, 'json'))
+    else:
+        log.info(format_fleet_metrics(rows))
+    return 0
+
+
 @cmd(spec=['delete', '-f', '<lambda>', '--delete-logs'])
 def delete_cmd(force, lambda_name, delete_logs, **tooldata):
+    from .ramuda_core import delete_lambda, delete_lambda_deprecated
     context = tooldata.get('context')
     config = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -156,6 +230,7 @@ def delete_cmd(force, lambda_name, delete_logs, **tooldata):
 
 @cmd(spec=['info'])
 def info_cmd(**tooldata):
+    from .ramuda_core import info
     context = tooldata.get('context')
     config = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -168,6 +243,7 @@ def info_cmd(**tooldata):
 
 @cmd(spec=['wire'])
 def wire_cmd(**tooldata):
+    from .ramuda_wire import wire, wire_deprecated
     context = tooldata.get('context')
     config = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -186,6 +262,7 @@ def wire_cmd(**tooldata):
 
 @cmd(spec=['unwire'])
 def unwire_cmd(**tooldata):
+    from .ramuda_wire import unwire, unwire_deprecated
     context = tooldata.get('context')
     config = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -204,12 +281,15 @@ def unwire_cmd(**tooldata):
 
 @cmd(spec=['bundle', '--keep'])
 def bundle_cmd(keep, **tooldata):
+    from .ramuda_core import bundle_lambda
+    from .ramuda_utils import get_bundle
     context = tooldata.get('context')
-    return bundle_lambda(context['_zipfile'])
+    return bundle_lambda(get_bundle(context['_zipfile']))
 
 
 @cmd(spec=['rollback', '<lambda>', '<version>'])
 def rollback_cmd(lambda_name, version, **tooldata):
+    from .ramuda_core import rollback
     context = tooldata.get('context')
     awsclient = context.get('_awsclient')
     if version:
@@ -222,6 +302,7 @@ def rollback_cmd(lambda_name, version, **tooldata):
 
 @cmd(spec=['ping', '<lambda>', '<version>'])
 def ping_cmd(lambda_name, version=None, **tooldata):
+    from .ramuda_core import ping
     context = tooldata.get('context')
     awsclient = context.get('_awsclient')
     if version:
@@ -239,6 +320,7 @@ def ping_cmd(lambda_name, version=None, **tooldata):
 
 @cmd(spec=['invoke', '<lambda>', '<version>', '--invocation-type', '--payload', '--outfile'])
 def invoke_cmd(lambda_name, version, itype, payload, outfile, **tooldata):
+    from .ramuda_core import invoke
     # samples
     # $ ramuda invoke infra-dev-sample-lambda-unittest --payload='{"ramuda_action": "ping"}'
     context = tooldata.get('context')
@@ -249,8 +331,77 @@ def invoke_cmd(lambda_name, version, itype, payload, outfile, **tooldata):
     log.info(results)
 
 
-@cmd(spec=['logs', '<lambda>', '--start', '--end', '--tail'])
-def logs_cmd(lambda_name, start, end, tail, **tooldata):
+def _get_positive_int(value, option):
+    """Parse the value of a cmd option (logs an error if it is invalid).
+
+    :return: int or None
+    """
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if number < 1:
+        log.error(colored.red('\'%s\' must be a positive number.' % option))
+        return None
+    return number
+
+
+@cmd(spec=['invoke', '<lambda>', '<version>', '--concurrency', '--count',
+           '--payload', '--payloads', '--json'])
+def load_test_cmd(lambda_name, version, concurrency, count, payload,
+                  payloads_file, json_output, **tooldata):
+    from .ramuda_core import load_test, LOAD_TEST_COUNT, PING_PAYLOAD
+    from .ramuda_utils import read_payloads, format_load_test_stats
+    context = tooldata.get('context')
+    awsclient = context.get('_awsclient')
+    concurrency = _get_positive_int(concurrency, '--concurrency')
+    count = _get_positive_int(count or LOAD_TEST_COUNT, '--count')
+    if concurrency is None or count is None:
+        return 1
+    if payloads_file:
+        payloads = read_payloads(payloads_file)
+        if not payloads:
+            log.error(colored.red('No payloads in \'%s\'.' % payloads_file))
+            return 1
+    else:
+        payloads = [payload or PING_PAYLOAD]
+    stats = load_test(awsclient, lambda_name, payloads, count=count,
+                      concurrency=concurrency, version=version)
+    if json_output:
+        print(format_load_test_stats(stats, 'json'))
+    else:
+        log.info(format_load_test_stats(stats))
+    if stats['errors'] or stats['throttles']:
+        log.error(colored.red('%d errors, %d throttles' % (
+            stats['errors'], stats['throttles'])))
+        return 1
+
+
+@cmd(spec=['warm', '<lambda>', '<version>', '--containers', '--json'])
+def warm_cmd(lambda_name, version, containers, json_output, **tooldata):
+    from .ramuda_core import warm
+    from .ramuda_utils import format_warm_stats
+    context = tooldata.get('context')
+    awsclient = context.get('_awsclient')
+    containers = _get_positive_int(containers, '--containers')
+    if containers is None:
+        return 1
+    stats = warm(awsclient, lambda_name, containers, version=version)
+    if json_output:
+        print(format_warm_stats(stats, 'json'))
+    else:
+        log.info(format_warm_stats(stats))
+    if stats['errors']:
+        log.error(colored.red('%d pings failed' % stats['errors']))
+        return 1
+
+
+@cmd(spec=['logs', '<lambdas>', '--start', '--end', '--tail', '--prefix',
+           '--cache', '--filter'])
+def logs_cmd(lambda_names, start, end, tail, prefix=False, cache=False,
+             pattern=None, **tooldata):
+    from .ramuda_core import logs
+    from .ramuda_utils import check_and_format_logs_params
 
     context = tooldata.get('context')
     awsclient = context.get('_awsclient')
@@ -266,12 +417,28 @@ def logs_cmd(lambda_name, start, end, tail, **tooldata):
 
     if tail:
         log.info(colored.yellow('Use \'Ctrl-C\' to exit tail mode'))
-    logs(awsclient, lambda_name, start_dt=start_dt, end_dt=end_dt, tail=tail)
+    return logs(awsclient, lambda_names, start_dt=start_dt, end_dt=end_dt,
+                tail=tail, prefix=prefix, cache=cache, pattern=pattern)
+
+
+@cmd(spec=['stats', '<lambda>', '--start', '--end'])
+def stats_cmd(lambda_name, start, end, **tooldata):
+    from .ramuda_core import stats
+    from .ramuda_utils import check_and_format_logs_params
+
+    context = tooldata.get('context')
+    awsclient = context.get('_awsclient')
+    start_dt, end_dt = check_and_format_logs_params(start, end, False)
+    if end and end_dt <= start_dt:
+        log.error(colored.red('\'--end\' value before \'--start\' value.'))
+        return 1
+    return stats(awsclient, lambda_name, start_dt=start_dt, end_dt=end_dt)
 
 
 def main():
     sys.exit(gcdt_lifecycle.main(DOC, 'ramuda',
-                                 dispatch_only=['version', 'clean']))
+                                 dispatch_only=['version', 'clean'],
+                                 batch_commands=['deploy']))
 
 
 if __name__ == '__main__':
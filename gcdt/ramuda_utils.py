@@ -2,17 +2,25 @@
 from __future__ import unicode_literals, print_function
 
 import base64
+import bisect
+import itertools
+from array import array
 import hashlib
+import io
+import json
 import logging
+import re
 import sys
 import threading
 import time
 
 import maya
 import os
-from s3transfer import S3Transfer
+from botocore.exceptions import ClientError
+from s3transfer.manager import TransferConfig, TransferManager
+from s3transfer.subscribers import BaseSubscriber
 
-from gcdt.utils import GracefulExit
+from gcdt.utils import GracefulExit, iter_items
 from . import utils
 
 PY3 = sys.version_info[0] >= 3
@@ -23,6 +31,25 @@ if PY3:
 
 log = logging.getLogger(__name__)
 
+DEFAULT_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 10
+BUNDLE_CHUNKSIZE = 1024 * 1024
+
+# upper bounds of the load test latency histogram buckets in ms
+LATENCY_BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+HISTOGRAM_WIDTH = 30
+
+# cloudwatch logs filter pattern for the lambda REPORT lines
+REPORT_FILTER_PATTERN = '"REPORT RequestId"'
+REPORT_RE = re.compile(
+    r'REPORT RequestId: (?P<request_id>\S+)\s+'
+    r'Duration: (?P<duration>[\d.]+) ms\s+'
+    r'Billed Duration: (?P<billed_duration>[\d.]+) ms\s+'
+    r'Memory Size: (?P<memory_size>\d+) MB\s+'
+    r'Max Memory Used: (?P<max_memory_used>\d+) MB'
+    r'(?:\s+Init Duration: (?P<init_duration>[\d.]+) ms)?')
+REPORT_BATCH_SIZE = 10000  # REPORT lines parsed at once
+
 
 def lambda_exists(awsclient, lambda_name):
     client_lambda = awsclient.get_client('lambda')
@@ -36,6 +63,22 @@ def lambda_exists(awsclient, lambda_name):
         return True
 
 
+def get_function(awsclient, function_name):
+    """Get the lambda function (code location and configuration).
+
+    :param awsclient:
+    :param function_name:
+    :return: get_function response or None if the function does not exist
+    """
+    client_lambda = awsclient.get_client('lambda')
+    try:
+        return client_lambda.get_function(FunctionName=function_name)
+    except GracefulExit:
+        raise
+    except Exception:
+        return None
+
+
 def unit(name):
     # used in get_metrics
     if name == 'Duration':
@@ -74,6 +117,79 @@ def create_sha256_urlsafe(code):
     return base64.urlsafe_b64encode(hashlib.sha256(code).digest())
 
 
+class Bundle(object):
+    def __init__(self, data=None, path=None):
+        """Handle on a lambda bundle (zip file) in memory or on disk.
+        Consumers stream the bundle via open() so it is not copied around
+        and the hashes are computed only once.
+
+        :param data: bundle content (bytes)
+        :param path: path of the bundle file
+        """
+        self._data = data
+        self._path = path
+        self._digest = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Open the bundle for reading (use this to stream the bundle).
+
+        :return: binary file-like object
+        """
+        if self._path is not None:
+            return open(self._path, 'rb')
+        return io.BytesIO(self._data)  # no copy of data until it is written
+
+    def read(self):
+        """Bundle content (only use this where the api needs bytes)."""
+        if self._path is not None:
+            with self.open() as bfile:
+                return bfile.read()
+        return self._data
+
+    @property
+    def size(self):
+        if self._path is not None:
+            return os.path.getsize(self._path)
+        return len(self._data)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def sha256(self):
+        """Base64 encoded SHA256 of the bundle (same as AWS CodeSha256)."""
+        return base64.b64encode(self._get_digest()).decode('ascii')
+
+    @property
+    def sha256_urlsafe(self):
+        return base64.urlsafe_b64encode(self._get_digest()).decode('ascii')
+
+    def _get_digest(self):
+        with self._lock:
+            if self._digest is None:
+                sha256 = hashlib.sha256()
+                with self.open() as bfile:
+                    for chunk in iter(lambda: bfile.read(BUNDLE_CHUNKSIZE),
+                                      b''):
+                        sha256.update(chunk)
+                self._digest = sha256.digest()
+            return self._digest
+
+
+def get_bundle(zipfile):
+    """Bundle handle for the given zipfile.
+
+    :param zipfile: bundle content (bytes), path of the bundle (text) or Bundle
+    :return: Bundle (None if zipfile is None)
+    """
+    if zipfile is None or isinstance(zipfile, Bundle):
+        return zipfile
+    if isinstance(zipfile, bytes):
+        return Bundle(data=zipfile)
+    return Bundle(path=zipfile)
+
+
 def create_aws_s3_arn(bucket_name):
     return 'arn:aws:s3:::' + bucket_name
 
@@ -126,9 +242,11 @@ def build_filter_rules(prefix, suffix):
 
 
 class ProgressPercentage(object):
-    def __init__(self, filename, out=sys.stdout):
+    def __init__(self, filename, out=sys.stdout, size=None):
         self._filename = filename
-        self._size = float(os.path.getsize(filename))
+        if size is None:
+            size = os.path.getsize(filename)
+        self._size = float(size)
         self._seen_so_far = 0
         self._lock = threading.Lock()
         self._time = time.time()
@@ -161,42 +279,95 @@ class ProgressPercentage(object):
             self._out.flush()
 
 
+def get_transfer_config():
+    """Config for S3 artifact uploads ('GCDT_S3_MAX_CONCURRENCY',
+    'GCDT_S3_MULTIPART_CHUNKSIZE' in bytes). Smaller artifacts are uploaded
+    with a single request.
+
+    :return: s3transfer TransferConfig
+    """
+    chunksize = int(os.getenv('GCDT_S3_MULTIPART_CHUNKSIZE',
+                              DEFAULT_MULTIPART_CHUNKSIZE))
+    return TransferConfig(
+        multipart_threshold=chunksize,
+        multipart_chunksize=chunksize,
+        max_request_concurrency=int(os.getenv('GCDT_S3_MAX_CONCURRENCY',
+                                              DEFAULT_MAX_CONCURRENCY))
+    )
+
+
+def _head_object(client_s3, bucket, key):
+    """head_object response or None if the object does not exist.
+    Without s3:ListBucket permission S3 answers 403 for missing objects so
+    we upload in this case, too.
+    """
+    try:
+        return client_s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        code = e.response['Error']['Code']
+        if code in ['404', 'NoSuchKey', 'NotFound']:
+            return None
+        if code in ['403', 'AccessDenied', 'Forbidden']:
+            log.debug('can not check whether the bundle exists in s3: %s', e)
+            return None
+        raise
+
+
 # TODO move this to s3 module
 @utils.retries(3)
 def s3_upload(awsclient, deploy_bucket, zipfile, lambda_name):
+    """Upload the bundle to S3 (straight from memory).
+    The key is the hash of the bundle (shared by all functions and
+    environments) so the upload is skipped if the object already exists.
+
+    :param awsclient:
+    :param deploy_bucket:
+    :param zipfile: bundle (bytes, path or Bundle)
+    :param lambda_name: the bundle is uploaded for this function
+    :return: dest_key, ETag, VersionId
+    """
     client_s3 = awsclient.get_client('s3')
     region = client_s3.meta.region_name
-    transfer = S3Transfer(client_s3)
     bucket = deploy_bucket
 
-    if not zipfile:
+    bundle = get_bundle(zipfile)
+    if not bundle:
         return
-    local_hash = str(create_sha256_urlsafe(zipfile))
-
-    # ramuda/eu-west-1/<lambda_name>/<local_hash>.zip
-    dest_key = 'ramuda/%s/%s/%s.zip' % (region, lambda_name, local_hash)
-
-    source_filename = '/tmp/' + local_hash
-    with open(source_filename, 'wb') as source_file:
-        source_file.write(zipfile)
-
-    # print 'uploading to S3'
-    # start = time.time()
-    transfer.upload_file(source_filename, bucket, dest_key,
-                         callback=ProgressPercentage(source_filename))
-    # end = time.time()
-    # print 'uploading took:'
-    # print(end - start)
-
-    response = client_s3.head_object(Bucket=bucket, Key=dest_key)
-    # print '\n'
-    # print response['ETag']
-    # print response['VersionId']
-    # print(dest_key)
-    # print()
+    local_hash = bundle.sha256_urlsafe
+
+    # ramuda/eu-west-1/bundles/<local_hash>.zip
+    dest_key = 'ramuda/%s/bundles/%s.zip' % (region, local_hash)
+
+    response = _head_object(client_s3, bucket, dest_key)
+    if response:
+        log.info('bundle for \'%s\' already exists in s3 - won\'t upload '
+                 'bundle', lambda_name)
+        return dest_key, response['ETag'], response['VersionId']
+
+    config = get_transfer_config()
+    with bundle.open() as body:
+        if bundle.size < config.multipart_threshold:
+            response = client_s3.put_object(Bucket=bucket, Key=dest_key,
+                                            Body=body)
+        else:
+            progress = ProgressPercentage(dest_key, size=bundle.size)
+            with TransferManager(client_s3, config) as manager:
+                future = manager.upload(
+                    body, bucket, dest_key,
+                    subscribers=[_ProgressSubscriber(progress)])
+                future.result()
+            response = client_s3.head_object(Bucket=bucket, Key=dest_key)
     return dest_key, response['ETag'], response['VersionId']
 
 
+class _ProgressSubscriber(BaseSubscriber):
+    def __init__(self, callback):
+        self._callback = callback
+
+    def on_progress(self, bytes_transferred, **kwargs):
+        self._callback(bytes_transferred)
+
+
 # helpers for ramuda logs command
 def check_and_format_logs_params(start, end, tail):
     """Helper to read the params for the logs command"""
@@ -227,6 +398,266 @@ def check_and_format_logs_params(start, end, tail):
     return start_dt, end_dt
 
 
+def parse_duration(value):
+    """Parse a duration like '300', '5m', '1h', '3d' or '2w'.
+
+    :param value: duration (plain numbers are seconds)
+    :return: seconds
+    """
+    factors = {'s': 1, 'm': 60, 'h': 3600, 'd': 24 * 3600,
+               'w': 7 * 24 * 3600}
+    value = str(value).strip()
+    if value and value[-1] in factors:
+        return int(value[:-1]) * factors[value[-1]]
+    return int(value)
+
+
+def parse_report_line(message):
+    """Parse the REPORT line lambda writes for each invocation.
+
+    :param message: log message
+    :return: dict (None if message is not a REPORT line)
+    """
+    m = REPORT_RE.search(message)
+    if not m:
+        return None
+    return {
+        'request_id': m.group('request_id'),
+        'duration': float(m.group('duration')),
+        'billed_duration': float(m.group('billed_duration')),
+        'memory_size': int(m.group('memory_size')),
+        'max_memory_used': int(m.group('max_memory_used')),
+        'init_duration': float(m.group('init_duration'))
+        if m.group('init_duration') else None
+    }
+
+
+def parse_report_lines(messages, batch_size=REPORT_BATCH_SIZE):
+    """Parse the REPORT lines of many invocations into columns.
+    The messages are parsed in batches: one regex scan over the joined
+    batch and the conversion of whole columns (no per line Python code).
+
+    :param messages: iterable of log messages (other lines are skipped)
+    :param batch_size: number of messages parsed at once
+    :return: dict of column name -> array ('init_duration' only holds the
+        values of the cold starts)
+    """
+    columns = {'duration': array(str('d')),
+               'billed_duration': array(str('d')),
+               'memory_size': array(str('l')),
+               'max_memory_used': array(str('l')),
+               'init_duration': array(str('d'))}
+    messages = iter(messages)
+    while True:
+        batch = list(itertools.islice(messages, batch_size))
+        if not batch:
+            return columns
+        matches = REPORT_RE.findall('\n'.join(batch))
+        if not matches:
+            continue
+        # same order as the groups in REPORT_RE
+        _, duration, billed_duration, memory_size, max_memory_used, \
+            init_duration = zip(*matches)
+        columns['duration'].extend(map(float, duration))
+        columns['billed_duration'].extend(map(float, billed_duration))
+        columns['memory_size'].extend(map(int, memory_size))
+        columns['max_memory_used'].extend(map(int, max_memory_used))
+        columns['init_duration'].extend(
+            map(float, filter(None, init_duration)))
+
+
+def get_report_stats(columns):
+    """Performance statistics of lambda invocations.
+
+    :param columns: parsed REPORT lines, see parse_report_lines
+    :return: dict with the statistics (None if there are no reports)
+    """
+    durations = columns['duration']
+    init_durations = columns['init_duration']
+    memory_used = columns['max_memory_used']
+    if not durations:
+        return None
+    memory_size = max(columns['memory_size'])
+    billed = sum(columns['billed_duration'])
+    max_memory_used = max(memory_used)
+    return {
+        'invocations': len(durations),
+        'duration_p50': utils.percentile(durations, 50),
+        'duration_p90': utils.percentile(durations, 90),
+        'duration_p99': utils.percentile(durations, 99),
+        'duration_max': max(durations),
+        'cold_starts': len(init_durations),
+        'cold_start_rate': len(init_durations) / float(len(durations)),
+        'init_duration_p50': utils.percentile(init_durations, 50),
+        'init_duration_p90': utils.percentile(init_durations, 90),
+        'init_duration_p99': utils.percentile(init_durations, 99),
+        'memory_size': memory_size,
+        'max_memory_used_p99': utils.percentile(memory_used, 99),
+        'max_memory_used': max_memory_used,
+        'memory_headroom': 1.0 - max_memory_used / float(memory_size),
+        'billed_duration': billed,
+        'billed_waste': 1.0 - sum(durations) / billed if billed else 0.0
+    }
+
+
+def format_report_stats(stats):
+    """Format the performance statistics as table.
+
+    :param stats: as returned by get_report_stats
+    :return: table
+    """
+    from tabulate import tabulate  # expensive import, only load when needed
+
+    def _ms(value):
+        return '-' if value is None else '%0.1f ms' % value
+
+    table = [
+        ['invocations', stats['invocations']],
+        ['duration p50 / p90 / p99', ' / '.join(
+            _ms(stats[k]) for k in
+            ['duration_p50', 'duration_p90', 'duration_p99'])],
+        ['duration max', _ms(stats['duration_max'])],
+        ['cold starts', '%d (%0.1f%%)' % (stats['cold_starts'],
+                                          stats['cold_start_rate'] * 100)],
+        ['init duration p50 / p90 / p99', ' / '.join(
+            _ms(stats[k]) for k in
+            ['init_duration_p50', 'init_duration_p90', 'init_duration_p99'])],
+        ['memory used p99 / max / size', '%d / %d / %d MB' % (
+            stats['max_memory_used_p99'], stats['max_memory_used'],
+            stats['memory_size'])],
+        ['memory headroom', '%0.1f%%' % (stats['memory_headroom'] * 100)],
+        ['billed duration waste', '%0.1f%%' % (stats['billed_waste'] * 100)]
+    ]
+    return tabulate(table, tablefmt='fancy_grid')
+
+
+def read_payloads(filename):
+    """Read the payloads for a load test from a JSONL file (one JSON
+    document per line, empty lines are skipped).
+
+    :param filename: JSONL file
+    :return: list of payloads
+    """
+    payloads = []
+    with io.open(filename, 'r', encoding='utf-8') as pfile:
+        for lineno, line in enumerate(pfile, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                json.loads(line)
+            except ValueError as e:
+                raise ValueError('%s:%d is not valid json: %s' %
+                                 (filename, lineno, e))
+            payloads.append(line)
+    return payloads
+
+
+def get_latency_histogram(latencies, buckets=LATENCY_BUCKETS):
+    """Count the latencies per bucket.
+
+    :param latencies: list of latencies in ms
+    :param buckets: sorted upper bounds of the buckets in ms
+    :return: list of (upper bound, count) tuples, the last bucket has the
+        upper bound None (latencies above the last bound)
+    """
+    counts = [0] * (len(buckets) + 1)
+    for latency in latencies:
+        counts[bisect.bisect_left(buckets, latency)] += 1
+    return list(zip(list(buckets) + [None], counts))
+
+
+def get_load_test_stats(results, duration):
+    """Statistics of a load test.
+
+    :param results: list of (latency in ms, status) tuples, status is 'ok',
+        'error' or 'throttled'
+    :param duration: duration of the load test in seconds
+    :return: dict with the statistics, the latencies are those of the
+        invocations which were not throttled
+    """
+    latencies = [l for l, status in results if status != 'throttled']
+    return {
+        'invocations': len(results),
+        'duration': duration,
+        'throughput': len(results) / duration if duration else 0.0,
+        'errors': len([1 for _, status in results if status == 'error']),
+        'throttles': len([1 for _, status in results
+                          if status == 'throttled']),
+        'latency_p50': utils.percentile(latencies, 50),
+        'latency_p95': utils.percentile(latencies, 95),
+        'latency_p99': utils.percentile(latencies, 99),
+        'latency_max': max(latencies) if latencies else None,
+        'histogram': get_latency_histogram(latencies)
+    }
+
+
+def format_load_test_stats(stats, fmt='table'):
+    """Format the load test statistics.
+
+    :param stats: as returned by get_load_test_stats
+    :param fmt: 'table' or 'json'
+    :return: formatted statistics
+    """
+    if fmt == 'json':
+        return json.dumps(stats, indent=2)
+    from tabulate import tabulate  # expensive import, only load when needed
+
+    def _ms(value):
+        return '-' if value is None else '%0.1f ms' % value
+
+    table = [
+        ['invocations', stats['invocations']],
+        ['duration', '%0.1f s' % stats['duration']],
+        ['throughput', '%0.1f / s' % stats['throughput']],
+        ['errors', stats['errors']],
+        ['throttles', stats['throttles']],
+        ['latency p50 / p95 / p99', ' / '.join(
+            _ms(stats[k]) for k in
+            ['latency_p50', 'latency_p95', 'latency_p99'])],
+        ['latency max', _ms(stats['latency_max'])]
+    ]
+    # histogram from the first to the last non empty bucket
+    histogram = stats['histogram']
+    used = [i for i, (_, count) in enumerate(histogram) if count]
+    if used:
+        most = max(count for _, count in histogram)
+        for i in range(used[0], used[-1] + 1):
+            bound, count = histogram[i]
+            if bound is None:
+                label = '> %d ms' % histogram[i - 1][0]
+            else:
+                label = '<= %d ms' % bound
+            bar = '#' * int(round(HISTOGRAM_WIDTH * count / float(most)))
+            table.append([label, '%-*s %d' % (HISTOGRAM_WIDTH, bar, count)])
+    return tabulate(table, tablefmt='fancy_grid')
+
+
+def format_warm_stats(stats, fmt='table'):
+    """Format the result of warming a lambda function.
+
+    :param stats: as returned by ramuda_core.warm
+    :param fmt: 'table' or 'json'
+    :return: formatted result
+    """
+    if fmt == 'json':
+        return json.dumps(stats, indent=2)
+    from tabulate import tabulate  # expensive import, only load when needed
+
+    def _ms(value):
+        return '-' if value is None else '%0.1f ms' % value
+
+    table = [
+        ['containers', stats['containers']],
+        ['cold', stats['cold']],
+        ['warm', stats['warm']],
+        ['errors', stats['errors']],
+        ['init duration p50 / max', ' / '.join(
+            _ms(stats[k]) for k in ['init_duration_p50', 'init_duration_max'])]
+    ]
+    return tabulate(table, tablefmt='fancy_grid')
+
+
 def filter_bucket_notifications_with_arn(lambda_function_configurations,
                                          lambda_arn, filter_rules=False):
     matching_notifications = []
@@ -247,12 +678,10 @@ def filter_bucket_notifications_with_arn(lambda_function_configurations,
 
 
 def all_pages(method, request, accessor, cond=None):
-    """Helper to process all pages using botocore service methods (exhausts NextToken).
+    """Helper to process all pages using botocore service methods (exhausts NextMarker).
     note: `cond` is optional... you can use it to make filtering more explicit
     if you like. Alternatively you can do the filtering in the `accessor` which
     is perfectly fine, too
-    Note: there is a generic helper for this in utils but lambda uses a slightly
-    different mechanism so we need this here.
 
     :param method: service method
     :param request: request dictionary for service call
@@ -260,23 +689,5 @@ def all_pages(method, request, accessor, cond=None):
     :param cond: filter function to return True / False based on a response
     :return: list of collected resources
     """
-    if cond is None:
-        cond = lambda x: True
-    result = []
-    next_token = None
-    while True:
-        if next_token:
-            request['Marker'] = next_token
-        response = method(**request)
-        if cond(response):
-            data = accessor(response)
-            if data:
-                if isinstance(data, list):
-                    result.extend(data)
-                else:
-                    result.append(data)
-        if 'NextMarker' not in response:
-            break
-        next_token = response['NextMarker']
-
-    return result
+    return list(iter_items(method, request, accessor, cond,
+                           tokens=[('Marker', 'NextMarker')]))
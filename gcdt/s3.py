@@ -4,6 +4,8 @@ import logging
 from s3transfer import S3Transfer
 from botocore.client import ClientError
 
+from .utils import iter_items
+
 log = logging.getLogger(__name__)
 
 
@@ -109,12 +111,11 @@ def ls(awsclient, bucket, prefix=None):
     :param prefix:
     :return:
     """
-    # this works until 1000 keys!
     params = {'Bucket': bucket}
     if prefix:
         params['Prefix'] = prefix
     client_s3 = awsclient.get_client('s3')
-    objects = client_s3.list_objects_v2(**params)
-    if objects['KeyCount'] > 0:
-        keys = [k['Key'] for k in objects['Contents']]
+    keys = list(iter_items(client_s3.list_objects_v2, params,
+                           lambda r: [k['Key'] for k in r.get('Contents', [])]))
+    if keys:
         return keys
@@ -10,6 +10,7 @@ from .s3 import upload_file_to_s3
 from .gcdt_logging import getLogger
 from .cloudwatch_logs import get_log_events, datetime_to_timestamp, \
     check_log_stream_exists
+from .utils import all_pages
 
 
 log = getLogger(__name__)
@@ -78,7 +79,10 @@ def output_deployment_status(awsclient, deployment_id, iterations=100):
     client_codedeploy = awsclient.get_client('codedeploy')
 
     while counter <= iterations:
-        response = client_codedeploy.get_deployment(deploymentId=deployment_id)
+        awsclient.refresh_credentials()
+        with awsclient.uncached():
+            response = client_codedeploy.get_deployment(
+                deploymentId=deployment_id)
         status = response['deploymentInfo']['status']
 
         if status not in steady_states:
@@ -122,23 +126,11 @@ def _list_deployment_instances(awsclient, deployment_id):
     :param deployment_id:
     """
     client_codedeploy = awsclient.get_client('codedeploy')
-
-    instances = []
-    next_token = None
-
-    # TODO refactor generic exhaust_function from this
-    while True:
-        request = {
-            'deploymentId': deployment_id
-        }
-        if next_token:
-            request['nextToken'] = next_token
-        response = client_codedeploy.list_deployment_instances(**request)
-        instances.extend(response['instancesList'])
-        if 'nextToken' not in response:
-            break
-        next_token = response['nextToken']
-    return instances
+    return all_pages(
+        client_codedeploy.list_deployment_instances,
+        {'deploymentId': deployment_id},
+        lambda r: r['instancesList']
+    )
 
 
 def _get_deployment_instance_summary(awsclient, deployment_id, instance_id):
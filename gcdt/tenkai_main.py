@@ -7,17 +7,13 @@ from __future__ import unicode_literals, print_function
 import os
 import sys
 
-import maya
-
 from . import utils
 from .gcdt_defaults import DEFAULT_CONFIG
-from .tenkai_core import deploy, output_deployment_status, stop_deployment, \
-    output_deployment_summary, output_deployment_diagnostics
-from gcdt.s3 import prepare_artifacts_bucket
 from .gcdt_cmd_dispatcher import cmd
 from .utils import GracefulExit
 from .gcdt_logging import getLogger
 from . import gcdt_lifecycle
+# note: the tool modules are imported in the cmds to keep the startup fast
 
 
 log = getLogger(__name__)
@@ -41,6 +37,11 @@ def version_cmd():
 
 @cmd(spec=['deploy'])
 def deploy_cmd(**tooldata):
+    import maya
+    from .tenkai_core import deploy, output_deployment_status, \
+        stop_deployment, output_deployment_summary, \
+        output_deployment_diagnostics
+    from .s3 import prepare_artifacts_bucket
     context = tooldata.get('context')
     config = tooldata.get('config')
     awsclient = context.get('_awsclient')
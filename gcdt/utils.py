@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
 
+import atexit
+import hashlib
+import math
 import random
 import string
 import sys
 import getpass
 import subprocess
+import threading
 import time
 from time import sleep
 import collections
@@ -13,10 +17,8 @@ import json
 
 import os
 from clint.textui import prompt, colored
-from tabulate import tabulate
 
 from . import __version__
-from .package_utils import get_package_versions
 from .gcdt_plugins import get_plugin_versions
 from .gcdt_logging import getLogger
 
@@ -28,6 +30,14 @@ if PY3:
 
 log = getLogger(__name__)
 
+DEFAULT_UPDATE_CHECK_TTL = 24 * 60 * 60  # check PyPi for updates once a day
+# how long gcdt waits at exit for a running update check (seconds)
+UPDATE_CHECK_JOIN_TIMEOUT = 1.0
+# a positive credential check is cached for this long, but only for temporary
+# credentials which stay valid for longer than ttl + margin
+CREDENTIALS_CACHE_TTL = 15 * 60
+CREDENTIALS_EXPIRY_MARGIN = 5 * 60
+
 
 def version():
     """Output version of gcdt tools and plugins."""
@@ -172,17 +182,68 @@ def _execute_script(file_name):
 
 def check_gcdt_update():
     """Check whether a newer gcdt is available and output a warning.
-
+    The result of the PyPi check is cached on disk
+    ('GCDT_UPDATE_CHECK_TTL' seconds, default one day). If the cached result
+    is outdated the check runs in a background thread so the command does
+    not need to wait for PyPi (the warning is output on the next run).
+    The check is marked as done before PyPi is asked so short gcdt runs
+    do not start a new check every time. At exit gcdt waits
+    UPDATE_CHECK_JOIN_TIMEOUT seconds for the check to finish.
+
+    :return: background thread or None
     """
+    from .gcdt_cache import get_cache_dir
+    filename = os.path.join(get_cache_dir(), 'gcdt_update_check.json')
+    ttl = float(os.getenv('GCDT_UPDATE_CHECK_TTL', DEFAULT_UPDATE_CHECK_TTL))
     try:
-        inst_version, latest_version = get_package_versions('gcdt')
-        if inst_version < latest_version:
+        with open(filename, 'r') as jfile:
+            result = json.load(jfile)
+    except (IOError, OSError, ValueError):
+        result = None
+    if result and result.get('installed') == __version__ and \
+            result.get('checked', 0) + ttl > time.time():
+        if result.get('latest') is None:
+            log.debug('PyPi appears to be down - we currently can\'t check '
+                      'for newer gcdt versions')
+        elif result.get('update_available'):
             log.warn('Please consider an update to gcdt version: %s' %
-                                 latest_version)
-    except GracefulExit:
-        raise
+                     result['latest'])
+        return None
+
+    _write_update_check(filename, {
+        'checked': time.time(), 'installed': __version__,
+        'latest': None, 'update_available': False})
+    thread = threading.Thread(target=_check_gcdt_update, args=(filename,))
+    thread.daemon = True  # do not keep gcdt from exiting
+    thread.start()
+    atexit.register(thread.join, UPDATE_CHECK_JOIN_TIMEOUT)
+    return thread
+
+
+def _check_gcdt_update(filename):
+    """Get the latest gcdt version from PyPi and store it in the file."""
+    # package_utils uses pip internals which are expensive to import
+    from .package_utils import get_package_versions
+    result = {'checked': time.time(), 'installed': __version__,
+              'latest': None, 'update_available': False}
+    try:
+        inst_version, latest_version = get_package_versions('gcdt')
+        if latest_version is not None:
+            result['latest'] = str(latest_version)
+            result['update_available'] = inst_version < latest_version
     except Exception:
-        log.warn('PyPi appears to be down - we currently can\'t check for newer gcdt versions')
+        # we also cache this so we do not ask PyPi on every run
+        log.debug('PyPi appears to be down - we currently can\'t check for '
+                  'newer gcdt versions')
+    _write_update_check(filename, result)
+
+
+def _write_update_check(filename, result):
+    from .gcdt_cache import write_json_atomic
+    try:
+        write_json_atomic(filename, result)
+    except (IOError, OSError) as e:
+        log.debug('could not write the update check result: %s', e)
 
 
 # adapted from:
@@ -221,22 +282,76 @@ def dict_merge(a, b, path=None):
 # TODO move to gcdt-checks!
 def are_credentials_still_valid(awsclient):
     """Check whether the credentials have expired.
+    We use sts.get_caller_identity for this since it is the cheapest call
+    (it does not even require permissions). For temporary credentials the
+    positive result is cached (in GCDT_CACHE_DIR) for CREDENTIALS_CACHE_TTL.
 
     :param awsclient:
     :return: exit_code
     """
-    client = awsclient.get_client('lambda')
+    key = _get_credentials_key(awsclient)
+    cache = _read_credentials_cache()
+    now = time.time()
+    if key and cache.get(key, 0) > now:
+        log.debug('using cached credential check')
+        return 0
+
+    client = awsclient.get_client('sts')
     try:
-        client.list_functions()
+        client.get_caller_identity()
     except GracefulExit:
         raise
     except Exception as e:
         log.debug(e)
         log.error(e)
         return 1
+    if key and _credentials_outlive_cache(awsclient):
+        cache = {k: v for k, v in cache.items() if v > now}
+        cache[key] = now + CREDENTIALS_CACHE_TTL
+        _write_credentials_cache(cache)
     return 0
 
 
+def _credentials_outlive_cache(awsclient):
+    """Only temporary credentials which are valid for longer than the cache
+    entry are cached. Static credentials are not cached at all."""
+    credentials = awsclient.get_credentials()
+    if not hasattr(credentials, 'refresh_needed'):
+        return False
+    return not awsclient.credentials_expire_within(
+        CREDENTIALS_CACHE_TTL + CREDENTIALS_EXPIRY_MARGIN)
+
+
+def _get_credentials_key(awsclient):
+    """Identify the credentials without storing the access key."""
+    credentials = awsclient.get_credentials()
+    access_key = getattr(credentials, 'access_key', None)
+    if not access_key:
+        return None
+    return hashlib.sha256(access_key.encode('utf-8')).hexdigest()
+
+
+def _get_credentials_cache_file():
+    from .gcdt_cache import get_cache_dir
+    return os.path.join(get_cache_dir(), 'credentials.json')
+
+
+def _read_credentials_cache():
+    try:
+        with open(_get_credentials_cache_file(), 'r') as jfile:
+            return json.load(jfile)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _write_credentials_cache(cache):
+    from .gcdt_cache import write_json_atomic
+    try:
+        write_json_atomic(_get_credentials_cache_file(), cache)
+    except (IOError, OSError) as e:
+        log.debug('could not write the credentials cache: %s', e)
+
+
 # http://code.activestate.com/recipes/578948-flattening-an-arbitrarily-nested-list-in-python/
 def flatten(lis):
     """Given a list, possibly nested to any level, return it flattened."""
@@ -279,6 +394,7 @@ def json2table(json):
     :param json:
     :return:
     """
+    from tabulate import tabulate
     filter_terms = ['ResponseMetadata']
     table = []
     try:
@@ -333,13 +449,78 @@ def time_now():
     return int(time.time()) * 1000
 
 
+# (request parameter, response key) of the pagination styles of the AWS apis
+PAGINATION_TOKENS = [
+    ('nextToken', 'nextToken'),  # logs, codedeploy, ...
+    ('NextToken', 'NextToken'),  # cloudformation, ec2, ...
+    ('Marker', 'NextMarker'),  # lambda, cloudfront
+    ('ContinuationToken', 'NextContinuationToken'),  # s3 (list_objects_v2)
+    ('Marker', 'Marker'),  # iam, rds, ...
+]
+
+
+def iter_pages(method, request=None, tokens=None, callback=None):
+    """Generator for the pages (responses) of a botocore service method.
+    The pages are requested lazily so you can stop iterating at any time.
+    The request is copied, so the caller's request dict is not changed.
+
+    :param method: service method
+    :param request: request dictionary for service call
+    :param tokens: list of (request parameter, response key) tuples
+        (per default the token style is detected from the response)
+    :param callback: function called with each response, return False
+        to stop after this page
+    :return: generator of responses
+    """
+    request = dict(request or {})
+    if tokens is None:
+        tokens = PAGINATION_TOKENS
+    while True:
+        response = method(**request)
+        yield response
+        if callback is not None and callback(response) is False:
+            return
+        for param, key in tokens:
+            token = response.get(key)
+            # some apis echo the token of the request
+            if token and token != request.get(param):
+                request[param] = token
+                break
+        else:
+            return
+
+
+def iter_items(method, request, accessor, cond=None, tokens=None,
+               callback=None):
+    """Generator for the resources of all pages of a botocore service method.
+
+    :param method: service method
+    :param request: request dictionary for service call
+    :param accessor: function to extract data from each response
+    :param cond: filter function to return True / False based on a response
+    :param tokens: list of (request parameter, response key) tuples
+    :param callback: function called with each response, return False
+        to stop after this page
+    :return: generator of resources
+    """
+    for response in iter_pages(method, request, tokens, callback):
+        if cond is None or cond(response):
+            data = accessor(response)
+            if data:
+                if isinstance(data, list):
+                    for item in data:
+                        yield item
+                else:
+                    yield data
+
+
 def all_pages(method, request, accessor, cond=None):
     """Helper to process all pages using botocore service methods (exhausts NextToken).
     note: `cond` is optional... you can use it to make filtering more explicit
     if you like. Alternatively you can do the filtering in the `accessor` which
     is perfectly fine, too
-    Note: lambda uses a slightly different mechanism so there is a specific version in
-    ramuda_utils.
+    Note: use iter_items to process large listings without keeping them in
+    memory.
 
     :param method: service method
     :param request: request dictionary for service call
@@ -347,23 +528,18 @@ def all_pages(method, request, accessor, cond=None):
     :param cond: filter function to return True / False based on a response
     :return: list of collected resources
     """
-    if cond is None:
-        cond = lambda x: True
-    result = []
-    next_token = None
-    while True:
-        if next_token:
-            request['nextToken'] = next_token
-        response = method(**request)
-        if cond(response):
-            data = accessor(response)
-            if data:
-                if isinstance(data, list):
-                    result.extend(data)
-                else:
-                    result.append(data)
-        if 'nextToken' not in response:
-            break
-        next_token = response['nextToken']
+    return list(iter_items(method, request, accessor, cond))
 
-    return result
\ No newline at end of file
+
+def percentile(values, p):
+    """Nearest-rank percentile of the given values.
+
+    :param values: list of numbers
+    :param p: percentile in 0..100
+    :return: value at percentile p (None for an empty list)
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = int(math.ceil(p / 100.0 * len(ordered))) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
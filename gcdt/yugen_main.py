@@ -3,12 +3,10 @@
 from __future__ import unicode_literals, print_function
 import sys
 
-from .yugen_core import list_api_keys, get_lambdas, delete_api, \
-    export_to_swagger, create_api_key, list_apis, \
-    deploy_custom_domain, delete_api_key, deploy_api
 from . import utils
 from .gcdt_cmd_dispatcher import cmd
 from . import gcdt_lifecycle
+# note: the tool modules are imported in the cmds to keep the startup fast
 
 
 # creating docopt parameters and usage help
@@ -39,6 +37,7 @@ def version_cmd():
 
 @cmd(spec=['list'])
 def list_cmd(**tooldata):
+    from .yugen_core import list_apis
     context = tooldata.get('context')
     awsclient = context.get('_awsclient')
     return list_apis(awsclient)
@@ -46,6 +45,7 @@ def list_cmd(**tooldata):
 
 @cmd(spec=['deploy'])
 def deploy_cmd(**tooldata):
+    from .yugen_core import get_lambdas, deploy_api, deploy_custom_domain
     context = tooldata.get('context')
     config = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -100,6 +100,7 @@ def deploy_cmd(**tooldata):
 
 @cmd(spec=['delete', '-f'])
 def delete_cmd(force, **tooldata):
+    from .yugen_core import delete_api
     context = tooldata.get('context')
     config = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -113,6 +114,7 @@ def delete_cmd(force, **tooldata):
 
 @cmd(spec=['export'])
 def export_cmd(**tooldata):
+    from .yugen_core import get_lambdas, export_to_swagger
     context = tooldata.get('context')
     config = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -136,6 +138,7 @@ def export_cmd(**tooldata):
 
 @cmd(spec=['apikey-create', '<keyname>'])
 def apikey_create_cmd(keyname, **tooldata):
+    from .yugen_core import create_api_key
     context = tooldata.get('context')
     config = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -145,6 +148,7 @@ def apikey_create_cmd(keyname, **tooldata):
 
 @cmd(spec=['apikey-delete'])
 def apikey_delete_cmd(**tooldata):
+    from .yugen_core import delete_api_key
     context = tooldata.get('context')
     config = tooldata.get('config')
     awsclient = context.get('_awsclient')
@@ -154,6 +158,7 @@ def apikey_delete_cmd(**tooldata):
 
 @cmd(spec=['apikey-list'])
 def apikey_list_cmd(**tooldata):
+    from .yugen_core import list_api_keys
     context = tooldata.get('context')
     awsclient = context.get('_awsclient')
     list_api_keys(awsclient)
@@ -161,6 +166,7 @@ def apikey_list_cmd(**tooldata):
 
 @cmd(spec=['custom-domain-create'])
 def custom_domain_create_cmd(**tooldata):
+    from .yugen_core import deploy_custom_domain
     context = tooldata.get('context')
     config = tooldata.get('config')
     awsclient = context.get('_awsclient')
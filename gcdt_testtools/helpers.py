@@ -8,11 +8,13 @@ import tarfile
 from tempfile import NamedTemporaryFile, mkdtemp
 from zipfile import ZipFile
 
+import botocore.session
 import os
 import pytest
 from testfixtures import LogCapture
 
 from gcdt import utils
+from gcdt.gcdt_awsclient import AWSClient
 
 
 # http://code.activestate.com/recipes/52308-the-simple-but-handy-collector-of-a-bunch-of-named/?in=user-97991
@@ -76,6 +78,38 @@ def temp_folder():
     shutil.rmtree(folder)
 
 
+@pytest.fixture(scope='function')  # 'function' or 'module'
+def temp_cache_dir():
+    # point GCDT_CACHE_DIR to a temp folder so tests do not use (and write)
+    # the real gcdt caches
+    folder = mkdtemp()
+    old_cache_dir = os.environ.get('GCDT_CACHE_DIR')
+    os.environ['GCDT_CACHE_DIR'] = folder
+    yield folder
+    # cleanup
+    if old_cache_dir is None:
+        del os.environ['GCDT_CACHE_DIR']
+    else:
+        os.environ['GCDT_CACHE_DIR'] = old_cache_dir
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+@pytest.fixture(scope='function')  # 'function' or 'module'
+def stubbed_session():
+    # botocore session with region and fake credentials for tests which
+    # use the botocore Stubber
+    session = botocore.session.Session()
+    session.set_config_variable('region', 'eu-west-1')
+    session.set_credentials('access_key', 'secret_key')
+    return session
+
+
+@pytest.fixture(scope='function')  # 'function' or 'module'
+def stubbed_awsclient(stubbed_session):
+    # AWSClient for tests which use the botocore Stubber
+    return AWSClient(stubbed_session)
+
+
 @pytest.fixture(scope='function')  # 'function' or 'module'
 def random_file():
     # provide a named file with some random content
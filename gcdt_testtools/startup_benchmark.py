@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Measure the cold start of the gcdt tools.
+Every tool invocation (even `version` or `--help`) pays for the imports of
+the tool's main module. Track this so it does not regress:
+
+    $ python -m gcdt_testtools.startup_benchmark [--runs=5] [--json]
+"""
+from __future__ import unicode_literals, print_function
+import json
+import re
+import subprocess
+import sys
+import time
+
+TOOL_MODULES = [
+    'gcdt.gcdt_main',
+    'gcdt.kumo_main',
+    'gcdt.ramuda_main',
+    'gcdt.tenkai_main',
+    'gcdt.yugen_main',
+]
+
+# these modules must only be imported once a command needs them
+HEAVY_MODULES = [
+    'botocore.session',
+    'maya',
+    'pkg_resources',
+    'pybars',
+    'pyspin',
+    's3transfer',
+    'tabulate',
+    'troposphere',
+]
+
+_IMPORTTIME_RE = re.compile(r'import time:\s+\d+ \|\s+(?P<cumulative>\d+) \| (?P<module>.*)$')
+
+
+def _run_python(code, *options):
+    cmd = [sys.executable] + list(options) + ['-c', code]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    if proc.returncode:
+        raise Exception('\'%s\' failed: %s' % (' '.join(cmd), err.decode('utf-8')))
+    return out.decode('utf-8'), err.decode('utf-8')
+
+
+def measure_import_time(module):
+    """Cold start import time of the module in seconds.
+    Uses `python -X importtime` if available (Python >= 3.7) otherwise
+    the wall clock time of a fresh interpreter (including its startup).
+
+    :param module: module name
+    :return: seconds
+    """
+    if sys.version_info >= (3, 7):
+        _, err = _run_python('import %s' % module, '-X', 'importtime')
+        for line in err.splitlines():
+            m = _IMPORTTIME_RE.match(line)
+            if m and m.group('module').strip() == module:
+                return int(m.group('cumulative')) / 1000000.0
+    start = time.time()
+    _run_python('import %s' % module)
+    return time.time() - start
+
+
+def loaded_heavy_modules(module):
+    """Heavy modules which are loaded on import of the given module.
+
+    :param module: module name
+    :return: list of module names
+    """
+    out, _ = _run_python(
+        'import sys, json; import %s; print(json.dumps(list(sys.modules)))' %
+        module)
+    loaded = json.loads(out.splitlines()[-1])
+    return sorted(m for m in HEAVY_MODULES if m in loaded)
+
+
+def benchmark(modules=None, runs=5):
+    """Measure the cold start of the given modules (best of n runs).
+
+    :param modules: list of module names (defaults to the gcdt tools)
+    :param runs: number of runs per module
+    :return: list of dicts
+    """
+    if modules is None:
+        modules = TOOL_MODULES
+    result = []
+    for module in modules:
+        timings = [measure_import_time(module) for _ in range(runs)]
+        result.append({
+            'module': module,
+            'best': min(timings),
+            'worst': max(timings),
+            'heavy_modules': loaded_heavy_modules(module)
+        })
+    return result
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    runs = 5
+    for arg in args:
+        if arg.startswith('--runs='):
+            runs = int(arg[7:])
+    result = benchmark(runs=runs)
+    if '--json' in args:
+        print(json.dumps(result, indent=2))
+    else:
+        for r in result:
+            print('%-20s best %6.3fs  worst %6.3fs  %s' % (
+                r['module'], r['best'], r['worst'],
+                ', '.join(r['heavy_modules'])))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import pytest
+
+from gcdt_testtools.helpers import temp_cache_dir  # fixtures!
+
+
+@pytest.fixture(scope='function', autouse=True)
+def isolated_cache_dir(temp_cache_dir):
+    # no test uses the real gcdt caches in ~/.gcdt/cache
+    yield temp_cache_dir
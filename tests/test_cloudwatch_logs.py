@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import mock
+from botocore.stub import Stubber
+
+from gcdt.cloudwatch_logs import LogTailer, TAIL_MIN_INTERVAL, \
+    TAIL_MAX_INTERVAL, TAIL_LOOKBACK, merge_log_events, list_log_groups, iter_log_events
+from gcdt_testtools.helpers import stubbed_session, \
+    stubbed_awsclient  # fixtures!
+
+
+def _event(event_id, timestamp):
+    return {'eventId': event_id, 'timestamp': timestamp,
+            'message': 'message %s' % event_id, 'logStreamName': 'stream'}
+
+
+def test_log_tailer_dedupe_and_late_events(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    tailer = LogTailer(awsclient, '/aws/lambda/foo', 1000, lookback=500)
+    with Stubber(awsclient.get_client('logs')) as stubber:
+        stubber.add_response('filter_log_events', {
+            'events': [_event('1', 1000), _event('2', 2000)]
+        }, {'logGroupName': '/aws/lambda/foo', 'startTime': 1000,
+            'interleaved': True})
+        # same millisecond and a late event within the lookback window
+        stubber.add_response('filter_log_events', {
+            'events': [_event('3', 1800), _event('2', 2000),
+                       _event('4', 2000)]
+        }, {'logGroupName': '/aws/lambda/foo', 'startTime': 1500,
+            'interleaved': True})
+        assert [e['message'] for e in tailer.poll()] == \
+            ['message 1', 'message 2']
+        assert [e['message'] for e in tailer.poll()] == \
+            ['message 3', 'message 4']
+        stubber.assert_no_pending_responses()
+
+
+def test_log_tailer_rereads_a_short_window(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    tailer = LogTailer(awsclient, '/aws/lambda/foo', 1000)
+    latest = 1000 + 10 * TAIL_LOOKBACK
+    with Stubber(awsclient.get_client('logs')) as stubber:
+        stubber.add_response('filter_log_events', {
+            'events': [_event('1', 1000), _event('2', latest)]
+        }, {'logGroupName': '/aws/lambda/foo', 'startTime': 1000,
+            'interleaved': True})
+        # the next poll does not start over with the whole stream
+        stubber.add_response('filter_log_events', {
+            'events': [_event('2', latest)]
+        }, {'logGroupName': '/aws/lambda/foo',
+            'startTime': latest - TAIL_LOOKBACK, 'interleaved': True})
+        assert len(tailer.poll()) == 2
+        assert tailer.poll() == []
+        stubber.assert_no_pending_responses()
+
+
+def test_log_tailer_resumes_with_next_token(monkeypatch,
+                                            stubbed_awsclient):
+    monkeypatch.setattr('gcdt.cloudwatch_logs.TAIL_MAX_PAGES_PER_POLL', 1)
+    awsclient = stubbed_awsclient
+    tailer = LogTailer(awsclient, '/aws/lambda/foo', 1000)
+    with Stubber(awsclient.get_client('logs')) as stubber:
+        stubber.add_response('filter_log_events', {
+            'events': [_event('1', 1000)], 'nextToken': 'token1'
+        }, {'logGroupName': '/aws/lambda/foo', 'startTime': 1000,
+            'interleaved': True})
+        stubber.add_response('filter_log_events', {
+            'events': [_event('2', 1100)]
+        }, {'logGroupName': '/aws/lambda/foo', 'startTime': 1000,
+            'interleaved': True, 'nextToken': 'token1'})
+        assert len(tailer.poll()) == 1
+        assert tailer.interval == 0.0  # more pages, poll again right away
+        assert len(tailer.poll()) == 1
+        assert tailer.interval == TAIL_MIN_INTERVAL
+        stubber.assert_no_pending_responses()
+
+
+def test_log_tailer_adaptive_interval(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    tailer = LogTailer(awsclient, '/aws/lambda/foo', 1000)
+    with Stubber(awsclient.get_client('logs')) as stubber:
+        for _ in range(6):
+            stubber.add_response('filter_log_events', {'events': []})
+        intervals = []
+        for _ in range(6):
+            assert tailer.poll() == []
+            intervals.append(tailer.interval)
+    assert intervals == [1.0, 2.0, 4.0, 8.0, TAIL_MAX_INTERVAL,
+                         TAIL_MAX_INTERVAL]
+
+
+def test_merge_log_events():
+    events = merge_log_events([
+        ('foo', [{'timestamp': 1, 'message': 'a'},
+                 {'timestamp': 3, 'message': 'c'}]),
+        ('bar', [{'timestamp': 2, 'message': 'b'},
+                 {'timestamp': 3, 'message': 'd'}]),
+        ('baz', None)
+    ])
+    assert [(e['source'], e['message']) for e in events] == \
+        [('foo', 'a'), ('bar', 'b'), ('foo', 'c'), ('bar', 'd')]
+
+
+def test_list_log_groups(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    with Stubber(awsclient.get_client('logs')) as stubber:
+        stubber.add_response('describe_log_groups', {
+            'logGroups': [{'logGroupName': '/aws/lambda/foo-1'}],
+            'nextToken': 'token1'
+        }, {'logGroupNamePrefix': '/aws/lambda/foo'})
+        stubber.add_response('describe_log_groups', {
+            'logGroups': [{'logGroupName': '/aws/lambda/foo-2'}]
+        }, {'logGroupNamePrefix': '/aws/lambda/foo', 'nextToken': 'token1'})
+        assert list_log_groups(awsclient, '/aws/lambda/foo') == \
+            ['/aws/lambda/foo-1', '/aws/lambda/foo-2']
+
+
+@mock.patch('gcdt.cloudwatch_logs.filter_log_events')
+def test_iter_log_events(mocked_filter_log_events):
+    entries = [{'timestamp': ts, 'message': str(ts)}
+               for ts in [1000, 1999, 2000, 2500, 4999, 5000]]
+    requested = []
+
+    def _filter_log_events(awsclient, log_group_name, start_ts, end_ts,
+                           filter_pattern=None):
+        requested.append((start_ts, end_ts))
+        # unordered like the api
+        return [e for e in reversed(entries)
+                if start_ts <= e['timestamp'] <= end_ts]
+
+    mocked_filter_log_events.side_effect = _filter_log_events
+    events = iter_log_events('my_awsclient', '/aws/lambda/foo', 1000, 5000,
+                             slice_size=1000, workers=2)
+    assert next(events)['timestamp'] == 1000
+    # only the slices for the workers have been requested
+    assert len(requested) <= 3
+    assert [e['timestamp'] for e in events] == [1999, 2000, 2500, 4999, 5000]
+    assert sorted(requested) == [(1000, 1999), (2000, 2999), (3000, 3999),
+                                 (4000, 4999), (5000, 5000)]
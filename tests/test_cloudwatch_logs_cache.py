@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import os
+import time
+
+import mock
+import pytest
+
+from gcdt.cloudwatch_logs_cache import LogCache, get_log_cache_file, \
+    prune_log_cache_files, _get_segments, _merge_ranges
+
+ENTRIES = [{'timestamp': ts, 'message': 'message %d' % ts}
+           for ts in [1000, 2000, 2000, 3500, 5000]]
+
+
+@pytest.fixture(scope='function')
+def log_cache(tmpdir):
+    cache = LogCache('my_awsclient', '/aws/lambda/foo',
+                     str(tmpdir.join('logs', 'foo.sqlite')))
+    yield cache
+    cache.close()
+
+
+@pytest.fixture(scope='function')
+def mocked_filter_log_events():
+    requested = []
+
+    def _filter_log_events(awsclient, log_group_name, start_ts, end_ts,
+                           filter_pattern=None):
+        requested.append((start_ts, end_ts))
+        return [e for e in ENTRIES if start_ts <= e['timestamp'] <= end_ts]
+
+    with mock.patch('gcdt.cloudwatch_logs.filter_log_events',
+                    side_effect=_filter_log_events):
+        yield requested
+
+
+def test_get_segments():
+    ranges = [(1000, 1999), (3000, 3999)]
+    assert _get_segments(ranges, 500, 5000) == [
+        (500, 999, False), (1000, 1999, True), (2000, 2999, False),
+        (3000, 3999, True), (4000, 5000, False)]
+    assert _get_segments(ranges, 1500, 3500) == [
+        (1500, 1999, True), (2000, 2999, False), (3000, 3500, True)]
+    assert _get_segments([], 1, 2) == [(1, 2, False)]
+
+
+def test_merge_ranges():
+    assert _merge_ranges([(3000, 3999), (1000, 1999), (2000, 2500),
+                          (5000, 6000)]) == [(1000, 2500), (3000, 3999),
+                                             (5000, 6000)]
+
+
+def test_log_cache(log_cache, mocked_filter_log_events):
+    events = list(log_cache.iter_log_events(1000, 2999))
+    assert [e['timestamp'] for e in events] == [1000, 2000, 2000]
+    assert log_cache.get_ranges() == [(1000, 2999)]
+    assert mocked_filter_log_events == [(1000, 2999)]
+
+    # only the missing range is fetched
+    del mocked_filter_log_events[:]
+    events = list(log_cache.iter_log_events(1500, 5000))
+    assert [e['timestamp'] for e in events] == [2000, 2000, 3500, 5000]
+    assert mocked_filter_log_events == [(3000, 5000)]
+    assert log_cache.get_ranges() == [(1000, 5000)]
+
+    # cached, filtered locally
+    del mocked_filter_log_events[:]
+    events = list(log_cache.iter_log_events(1000, 5000, pattern='^message [23]'))
+    assert [e['timestamp'] for e in events] == [2000, 2000, 3500]
+    assert mocked_filter_log_events == []
+
+
+def test_log_cache_incomplete_range(log_cache, mocked_filter_log_events):
+    events = log_cache.iter_log_events(1000, 5000)
+    next(events)
+    events.close()  # e.g. Ctrl-C
+    assert log_cache.get_ranges() == []
+    assert [e['timestamp'] for e in log_cache.iter_log_events(1000, 5000)] == \
+        [1000, 2000, 2000, 3500, 5000]
+
+
+def test_log_cache_recent_events_are_not_cached(log_cache,
+                                                mocked_filter_log_events):
+    with mock.patch('gcdt.cloudwatch_logs_cache.time.time', return_value=4.0):
+        # 4000 - lookback
+        assert len(list(log_cache.iter_log_events(1000, 5000))) == 5
+    assert log_cache.get_ranges() == []
+
+
+def test_get_log_cache_file():
+    assert get_log_cache_file('123', 'eu-west-1', '/aws/lambda/foo') != \
+        get_log_cache_file('456', 'eu-west-1', '/aws/lambda/foo')
+
+
+def test_log_cache_drops_old_events(tmpdir, mocked_filter_log_events):
+    filename = str(tmpdir.join('logs', 'foo.sqlite'))
+    cache = LogCache('my_awsclient', '/aws/lambda/foo', filename)
+    list(cache.iter_log_events(1000, 5000))
+    cache.close()
+    with mock.patch('gcdt.cloudwatch_logs_cache.time.time', return_value=6.0):
+        # events older than 3s are dropped
+        cache = LogCache('my_awsclient', '/aws/lambda/foo', filename,
+                         max_age=3)
+    try:
+        assert cache.get_ranges() == [(3000, 5000)]
+        del mocked_filter_log_events[:]
+        assert [e['timestamp'] for e in cache.iter_log_events(3000, 5000)] \
+            == [3500, 5000]
+        assert mocked_filter_log_events == []
+    finally:
+        cache.close()
+
+
+def test_prune_log_cache_files(tmpdir, monkeypatch):
+    monkeypatch.setenv('GCDT_CACHE_DIR', str(tmpdir))
+    logs = tmpdir.mkdir('logs')
+    logs.join('old.sqlite').write('')
+    logs.join('new.sqlite').write('')
+    old = time.time() - 3600
+    os.utime(str(logs.join('old.sqlite')), (old, old))
+    prune_log_cache_files(max_age=60)
+    assert logs.listdir() == [logs.join('new.sqlite')]
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import datetime
+import threading
+
+import mock
+from botocore.credentials import RefreshableCredentials
+from botocore.stub import Stubber
+
+from gcdt.gcdt_awsclient import AWSClient
+from gcdt_testtools.helpers import stubbed_session  # fixtures!
+
+
+def test_get_client_is_cached(stubbed_session):
+    awsclient = AWSClient(stubbed_session)
+    client = awsclient.get_client('lambda')
+    assert awsclient.get_client('lambda') is client
+    assert awsclient.get_client('lambda', 'us-east-1') is not client
+
+
+def test_get_client_max_pool_connections(stubbed_session):
+    awsclient = AWSClient(stubbed_session, max_pool_connections=42)
+    client = awsclient.get_client('lambda')
+    assert client.meta.config.max_pool_connections == 42
+
+
+def test_create_client(stubbed_session):
+    awsclient = AWSClient(stubbed_session)
+    client = awsclient.create_client('lambda')
+    assert client is not awsclient.get_client('lambda')
+    assert awsclient.create_client('lambda') is not client
+
+
+def test_create_client_not_rate_limited(stubbed_session):
+    awsclient = AWSClient(stubbed_session)
+    with mock.patch.object(awsclient._rate_limiter, 'get_bucket',
+                           return_value=None) as mocked_get_bucket:
+        for rate_limited in [False, True]:
+            mocked_get_bucket.reset_mock()
+            client = awsclient.create_client('lambda',
+                                             rate_limited=rate_limited)
+            with Stubber(client) as stubber:
+                stubber.add_response('list_functions', {'Functions': []})
+                client.list_functions()
+            assert mocked_get_bucket.called == rate_limited
+
+
+def test_get_client_shared_between_threads(stubbed_session):
+    awsclient = AWSClient(stubbed_session)
+    clients = []
+
+    def _worker():
+        clients.append(awsclient.get_client('lambda'))
+
+    threads = [threading.Thread(target=_worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(map(id, clients))) == 1
+
+
+def test_get_client_per_thread(stubbed_session):
+    awsclient = AWSClient(stubbed_session, per_thread=True)
+    main_client = awsclient.get_client('lambda')
+    clients = []
+
+    def _worker():
+        clients.append(awsclient.get_client('lambda'))
+        clients.append(awsclient.get_client('lambda'))
+
+    t = threading.Thread(target=_worker)
+    t.start()
+    t.join()
+    assert clients[0] is clients[1]
+    assert clients[0] is not main_client
+
+
+def _metadata(minutes):
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=minutes)
+    return {'access_key': 'access_key', 'secret_key': 'secret_key',
+            'token': 'token',
+            'expiry_time': expiry.strftime('%Y-%m-%dT%H:%M:%SZ')}
+
+
+def test_credentials_expire_within(stubbed_session):
+    awsclient = AWSClient(stubbed_session)
+    # static credentials do not expire
+    assert awsclient.credentials_expire_within(3600) is False
+    stubbed_session._credentials = RefreshableCredentials.create_from_metadata(
+        _metadata(30), refresh_using=None, method='sts-assume-role')
+    assert awsclient.credentials_expire_within(20 * 60) is False
+    assert awsclient.credentials_expire_within(40 * 60) is True
+
+
+def test_refresh_credentials(stubbed_session):
+    refresh = mock.Mock(return_value=_metadata(60))
+    stubbed_session._credentials = RefreshableCredentials.create_from_metadata(
+        _metadata(12), refresh_using=refresh, method='sts-assume-role')
+    awsclient = AWSClient(stubbed_session)
+    assert awsclient.refresh_credentials() is True
+    refresh.assert_called_once_with()
+    assert awsclient.credentials_expire_within(50 * 60) is False
+    # nothing to do for credentials which are valid long enough
+    assert awsclient.refresh_credentials() is True
+    refresh.assert_called_once_with()
+
+
+def test_refresh_credentials_failed(stubbed_session):
+    refresh = mock.Mock(side_effect=Exception('no refresh'))
+    stubbed_session._credentials = RefreshableCredentials.create_from_metadata(
+        _metadata(12), refresh_using=refresh, method='sts-assume-role')
+    awsclient = AWSClient(stubbed_session)
+    assert awsclient.refresh_credentials() is False
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import json
+
+from botocore.stub import Stubber
+import mock
+
+from gcdt.gcdt_awsclient import AWSClient
+from gcdt.gcdt_cache import write_json_atomic
+from gcdt_testtools.helpers import stubbed_session  # fixtures!
+
+
+def _function(name):
+    return {'Configuration': {'FunctionName': name}}
+
+
+def test_response_cache_hit(stubbed_session):
+    awsclient = AWSClient(stubbed_session, response_cache_ttl=60)
+    client_lambda = awsclient.get_client('lambda')
+    with Stubber(client_lambda) as stubber:
+        stubber.add_response('get_function', _function('foo'))
+        stubber.add_response('get_function', _function('bar'))
+        assert client_lambda.get_function(FunctionName='foo') == \
+            _function('foo')
+        assert client_lambda.get_function(FunctionName='foo') == \
+            _function('foo')
+        assert client_lambda.get_function(FunctionName='bar') == \
+            _function('bar')
+        stubber.assert_no_pending_responses()
+    assert awsclient.response_cache.hits == 1
+    assert awsclient.response_cache.misses == 2
+    # cache hits are not counted as api calls
+    summary = awsclient.api_metrics.summary()
+    assert summary[0]['count'] == 2
+
+
+def test_response_cache_invalidated_by_mutation(stubbed_session):
+    awsclient = AWSClient(stubbed_session, response_cache_ttl=60)
+    client_lambda = awsclient.get_client('lambda')
+    with Stubber(client_lambda) as stubber:
+        stubber.add_response('get_function', _function('foo'))
+        stubber.add_response('get_function', _function('bar'))
+        stubber.add_response('delete_function', {})
+        stubber.add_response('get_function', _function('foo'))
+        client_lambda.get_function(FunctionName='foo')
+        client_lambda.get_function(FunctionName='bar')
+        client_lambda.delete_function(FunctionName='foo')
+        client_lambda.get_function(FunctionName='foo')  # miss
+        stubber.assert_no_pending_responses()
+    # note: the stubber complains about calls once its queue is empty
+    assert client_lambda.get_function(FunctionName='bar') == _function('bar')
+    assert awsclient.response_cache.hits == 1
+
+
+def test_response_cache_ttl(stubbed_session):
+    awsclient = AWSClient(stubbed_session, response_cache_ttl=10)
+    client_lambda = awsclient.get_client('lambda')
+    with Stubber(client_lambda) as stubber:
+        stubber.add_response('get_function', _function('foo'))
+        stubber.add_response('get_function', _function('foo'))
+        with mock.patch('gcdt.gcdt_cache.time.time', return_value=1000.0):
+            client_lambda.get_function(FunctionName='foo')
+        with mock.patch('gcdt.gcdt_cache.time.time', return_value=1011.0):
+            client_lambda.get_function(FunctionName='foo')
+        stubber.assert_no_pending_responses()
+
+
+def test_response_cache_uncached(stubbed_session):
+    awsclient = AWSClient(stubbed_session, response_cache_ttl=60)
+    client_lambda = awsclient.get_client('lambda')
+    with Stubber(client_lambda) as stubber:
+        stubber.add_response('get_function', _function('foo'))
+        stubber.add_response('get_function', _function('foo'))
+        client_lambda.get_function(FunctionName='foo')
+        with awsclient.uncached():
+            client_lambda.get_function(FunctionName='foo')
+        stubber.assert_no_pending_responses()
+
+
+def test_response_cache_uncached_nested(stubbed_session):
+    awsclient = AWSClient(stubbed_session, response_cache_ttl=60)
+    client_lambda = awsclient.get_client('lambda')
+    with Stubber(client_lambda) as stubber:
+        stubber.add_response('get_function', _function('foo'))
+        stubber.add_response('get_function', _function('foo'))
+        stubber.add_response('get_function', _function('foo'))
+        client_lambda.get_function(FunctionName='foo')  # cached
+        with awsclient.uncached():
+            with awsclient.uncached():
+                client_lambda.get_function(FunctionName='foo')
+            # still uncached after the inner block
+            client_lambda.get_function(FunctionName='foo')
+        stubber.assert_no_pending_responses()
+
+
+def test_response_cache_not_enabled_per_default(stubbed_session):
+    awsclient = AWSClient(stubbed_session)
+    assert awsclient.response_cache is None
+    with awsclient.uncached():
+        pass
+
+
+def test_write_json_atomic(tmpdir):
+    filename = str(tmpdir.join('cache', 'data.json'))
+    write_json_atomic(filename, {'a': 1})
+    write_json_atomic(filename, {'a': 2})
+    with open(filename) as jfile:
+        assert json.load(jfile) == {'a': 2}
+    # no temp files are left behind
+    assert tmpdir.join('cache').listdir() == [tmpdir.join('cache', 'data.json')]
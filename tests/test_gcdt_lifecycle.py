@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
+import json
 import os
+import threading
 import textwrap
 
 import pytest
 import mock
 
-from gcdt.gcdt_lifecycle import main, lifecycle, _load_hooks
+from gcdt.gcdt_lifecycle import main, lifecycle, _load_hooks, \
+    lifecycle_all, get_config_folders, format_results
 from gcdt.kumo_main import DOC
 from gcdt import gcdt_signals
 from gcdt_testtools.helpers import create_tempfile
@@ -210,3 +213,95 @@ def test_load_hooks():
 
     assert module.COUNT['register'] == 1
     os.unlink(tfile)
+
+
+@mock.patch('gcdt.gcdt_lifecycle.cmd.dispatch', return_value=0)
+@mock.patch('gcdt.gcdt_lifecycle.are_credentials_still_valid', return_value=False)
+@mock.patch('gcdt.gcdt_lifecycle.check_gcdt_update')
+@mock.patch('gcdt.gcdt_lifecycle.load_plugins')
+def test_lifecycle_trace(mocked_load_plugins, mocked_check_gcdt_update,
+                         mocked_are_credentials_still_valid,
+                         mocked_cmd_dispatch, tmpdir, monkeypatch):
+    trace_file = str(tmpdir.join('trace.json'))
+    monkeypatch.setenv('GCDT_TRACE', trace_file)
+
+    def _lookup(params):
+        params[1]['kumo'] = {}
+    gcdt_signals.lookup_init.connect(_lookup)
+
+    exit_code = lifecycle('my_awsclient', 'dev', 'kumo', 'deploy', {})
+    gcdt_signals.lookup_init.disconnect(_lookup)
+    assert exit_code == 0
+
+    with open(trace_file) as tfile:
+        trace = json.load(tfile)
+    events = {(e['cat'], e['name']) for e in trace['traceEvents']}
+    assert ('signal', 'lookup_init') in events
+    assert ('receiver', 'tests.test_gcdt_lifecycle._lookup') in events
+    assert ('phase', 'command') in events
+
+
+def test_get_config_folders(tmpdir):
+    tmpdir.mkdir('lambda_a').join('gcdt_dev.json').write('{}')
+    tmpdir.mkdir('lambda_b').join('gcdt_dev.yaml').write('')
+    tmpdir.mkdir('lambda_c').join('gcdt_prod.json').write('{}')
+    tmpdir.mkdir('other')
+
+    folders = get_config_folders('dev', str(tmpdir))
+    assert [os.path.basename(f) for f in folders] == ['lambda_a', 'lambda_b']
+
+
+@mock.patch('gcdt.gcdt_lifecycle.are_credentials_still_valid', return_value=False)
+@mock.patch('gcdt.gcdt_lifecycle.check_gcdt_update')
+@mock.patch('gcdt.gcdt_lifecycle.load_plugins')
+def test_lifecycle_all(mocked_load_plugins, mocked_check_gcdt_update,
+                       mocked_are_credentials_still_valid, tmpdir):
+    for name in ['lambda_a', 'lambda_b', 'lambda_c']:
+        tmpdir.mkdir(name)
+
+    def _config_reader(params):
+        # like the config reader plugin this works on the current directory
+        name = os.path.basename(os.getcwd())
+        if name != 'lambda_c':
+            params[1]['ramuda'] = {'name': name}
+
+    dispatched = []
+
+    def _dispatch(arguments, context, config):
+        assert arguments['--all'] is False
+        dispatched.append(config['name'])
+        context['artifact'] = config['name']
+        return 0
+
+    signal_threads = set()
+
+    def _command_signal(params):
+        signal_threads.add(threading.current_thread().ident)
+
+    gcdt_signals.config_read_init.connect(_config_reader)
+    gcdt_signals.command_init.connect(_command_signal)
+    gcdt_signals.command_finalized.connect(_command_signal)
+    try:
+        with mock.patch('gcdt.gcdt_lifecycle.cmd.dispatch',
+                        side_effect=_dispatch):
+            results = lifecycle_all(
+                'my_awsclient', 'dev', 'ramuda', 'deploy',
+                {'deploy': True, '--all': True, '<folder>': []},
+                [str(tmpdir.join(n)) for n in ['lambda_a', 'lambda_b',
+                                               'lambda_c']],
+                workers=2)
+    finally:
+        gcdt_signals.config_read_init.disconnect(_config_reader)
+        gcdt_signals.command_init.disconnect(_command_signal)
+        gcdt_signals.command_finalized.disconnect(_command_signal)
+
+    assert sorted(dispatched) == ['lambda_a', 'lambda_b']
+    # plugins get the command signals on the main thread
+    assert signal_threads == {threading.current_thread().ident}
+    assert [(r['artifact'], r['exit_code']) for r in results] == \
+        [('lambda_a', 0), ('lambda_b', 0), ('', 1)]
+    assert results[2]['error'] == 'Configuration missing for \'ramuda\'.'
+    # the checks only run once
+    assert mocked_check_gcdt_update.call_count == 1
+    assert mocked_are_credentials_still_valid.call_count == 1
+    assert 'lambda_a' in format_results(results)
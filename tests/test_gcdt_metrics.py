@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import json
+
+from botocore.stub import Stubber
+
+from gcdt.gcdt_metrics import ApiCallMetrics, format_summary
+from gcdt_testtools.helpers import stubbed_session, \
+    stubbed_awsclient  # fixtures!
+
+
+def test_api_call_metrics(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    client_lambda = awsclient.get_client('lambda')
+    with Stubber(client_lambda) as stubber:
+        stubber.add_response('list_functions', {'Functions': []})
+        stubber.add_response('list_functions', {'Functions': []})
+        stubber.add_response('get_alias', {'FunctionVersion': '1'})
+        client_lambda.list_functions()
+        client_lambda.list_functions()
+        client_lambda.get_alias(FunctionName='foo', Name='ACTIVE')
+
+    summary = awsclient.api_metrics.summary()
+    counts = dict((e['operation'], e['count']) for e in summary)
+    assert counts == {'lambda.ListFunctions': 2, 'lambda.GetAlias': 1}
+    for entry in summary:
+        assert entry['total'] >= entry['p95'] >= 0.0
+        assert entry['retries'] == 0
+        assert entry['throttles'] == 0
+
+
+def test_format_summary():
+    summary = ApiCallMetrics().summary()
+    assert summary == []
+    summary = [{'operation': 'logs.FilterLogEvents', 'count': 2,
+                'total': 1.0, 'avg': 0.5, 'p95': 0.6, 'retries': 1,
+                'throttles': 1}]
+    assert 'logs.FilterLogEvents' in format_summary(summary)
+    assert json.loads(format_summary(summary, 'json')) == summary
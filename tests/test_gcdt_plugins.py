@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
 
+import sys
+import types
+
 import mock
+import pytest
 
+from gcdt import gcdt_plugins, gcdt_signals
 from gcdt.gcdt_plugins import load_plugins, get_plugin_versions
 from gcdt.gcdt_signals import check_hook_mechanism_is_intact
+from gcdt.gcdt_tracing import LifecycleTracer
 
 
 def test_load_plugins():
@@ -13,7 +19,7 @@ def test_load_plugins():
     ep.load.return_value = plugin
 
     with mock.patch('pkg_resources.iter_entry_points', return_value=[ep]):
-        load_plugins()
+        load_plugins(cached=False)
         ep.load.assert_called_once()
         plugin.register.assert_called_once()
 
@@ -42,3 +48,121 @@ def test_get_plugin_versions():
     versions = get_plugin_versions()
     assert 'gcdt-bundler' in versions
     assert 'gcdt-lookups' in versions
+
+
+@pytest.fixture(scope='function')  # 'function' or 'module'
+def dummy_plugin(tmpdir, monkeypatch):
+    # a plugin listening to 'command_init' and an index in a temp folder
+    monkeypatch.setenv('GCDT_CACHE_DIR', str(tmpdir))
+    plugin = types.ModuleType(str('gcdt_dummy_plugin'))
+    plugin.calls = []
+
+    def _command_init(context):
+        plugin.calls.append(context)
+    plugin._command_init = _command_init
+    plugin.register = mock.Mock(
+        side_effect=lambda: gcdt_signals.command_init.connect(_command_init))
+    plugin.deregister = lambda: gcdt_signals.command_init.disconnect(
+        _command_init)
+    entry = {'name': 'dummy', 'module': 'gcdt_dummy_plugin', 'attrs': [],
+             'dist': 'gcdt-dummy-plugin', 'version': '0.0.1', 'signals': None}
+    with mock.patch.dict(sys.modules, {'gcdt_dummy_plugin': plugin}), \
+            mock.patch.dict(gcdt_plugins._lazy_plugins, clear=True), \
+            mock.patch('gcdt.gcdt_plugins._scan_entry_points',
+                       side_effect=lambda group: [dict(entry)]) as scan:
+        yield plugin, scan
+        plugin.deregister()
+        for lazy_plugin in gcdt_plugins._lazy_plugins.values():
+            lazy_plugin.disconnect()
+
+
+def test_load_plugins_cached(dummy_plugin):
+    plugin, scan = dummy_plugin
+    # first run registers the plugin and records its signals
+    load_plugins()
+    assert plugin.register.call_count == 1
+    assert scan.call_count == 1
+
+    # next run (new process) registers the plugin once its signal fires
+    plugin.deregister()
+    gcdt_plugins._lazy_plugins.clear()
+    load_plugins()
+    assert scan.call_count == 1
+    assert plugin.register.call_count == 1
+
+    gcdt_signals.command_init.send({'id': 1})
+    assert plugin.register.call_count == 2
+    gcdt_signals.command_init.send({'id': 2})
+    assert plugin.calls == [{'id': 1}, {'id': 2}]
+
+
+def test_load_plugins_cached_traces_plugin_receivers(dummy_plugin):
+    plugin, _ = dummy_plugin
+    load_plugins()
+    plugin.deregister()
+    gcdt_plugins._lazy_plugins.clear()
+    load_plugins()
+
+    tracer = LifecycleTracer()
+    tracer.send(gcdt_signals.command_init, {'id': 1})
+    assert plugin.calls == [{'id': 1}]
+    names = [e['name'] for e in tracer.events if e['category'] == 'receiver']
+    # the plugin import and the plugin receiver are timed separately
+    assert names == ['gcdt_dummy_plugin.load',
+                     'tests.test_gcdt_plugins._command_init']
+
+
+def test_load_plugins_index_rebuilt_on_change(dummy_plugin):
+    _, scan = dummy_plugin
+    with mock.patch('gcdt.gcdt_plugins._get_fingerprint', return_value='a'):
+        get_plugin_versions()
+        assert get_plugin_versions() == {'gcdt-dummy-plugin': '0.0.1'}
+    assert scan.call_count == 1
+    with mock.patch('gcdt.gcdt_plugins._get_fingerprint', return_value='b'):
+        get_plugin_versions()
+    assert scan.call_count == 2
+
+
+def test_load_plugins_cached_keeps_receiver_order(tmpdir, monkeypatch):
+    monkeypatch.setenv('GCDT_CACHE_DIR', str(tmpdir))
+    calls = []
+    plugins = {}
+    entries = []
+    for name in ['gcdt_plugin_a', 'gcdt_plugin_b']:
+        plugin = types.ModuleType(str(name))
+
+        def _command_init(context, name=name):
+            calls.append(name)
+        plugin._command_init = _command_init
+        plugin.register = (lambda p: lambda: gcdt_signals.command_init.connect(
+            p._command_init))(plugin)
+        plugin.deregister = (lambda p: lambda: gcdt_signals.command_init.
+                             disconnect(p._command_init))(plugin)
+        plugins[name] = plugin
+        entries.append({'name': name, 'module': name, 'attrs': [],
+                        'dist': name, 'version': '0.0.1',
+                        'signals': ['command_init']})
+
+    def _other_receiver(context):
+        calls.append('other')
+
+    with mock.patch.dict(sys.modules, plugins), \
+            mock.patch.dict(gcdt_plugins._lazy_plugins, clear=True), \
+            mock.patch('gcdt.gcdt_plugins._scan_entry_points',
+                       side_effect=lambda group: [dict(e) for e in entries]):
+        load_plugins()
+        gcdt_signals.command_init.connect(_other_receiver)
+        receivers = list(gcdt_signals.command_init.receivers)
+        try:
+            gcdt_signals.command_init.send({})  # imports the plugins
+            assert list(gcdt_signals.command_init.receivers) == receivers
+            gcdt_signals.command_init.send({})
+        finally:
+            gcdt_signals.command_init.disconnect(_other_receiver)
+            for plugin in plugins.values():
+                plugin.deregister()
+            for lazy_plugin in gcdt_plugins._lazy_plugins.values():
+                lazy_plugin.disconnect()
+    # the plugin receivers are not reconnected so the order does not change
+    assert sorted(calls[:3]) == ['gcdt_plugin_a', 'gcdt_plugin_b', 'other']
+    assert calls[3:] == calls[:3]
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import mock
+
+from gcdt.gcdt_ratelimit import TokenBucket, RateLimiter, \
+    is_throttling_error, DEFAULT_START_RATE
+
+
+def test_token_bucket_first_token_is_free():
+    bucket = TokenBucket(1.0)
+    assert bucket.acquire() == 0.0
+
+
+@mock.patch('gcdt.gcdt_ratelimit.time.sleep')
+def test_token_bucket_waits_for_token(mocked_sleep):
+    bucket = TokenBucket(2.0)
+    bucket.acquire()
+    wait = bucket.acquire()
+    assert 0.0 < wait <= 0.5
+    mocked_sleep.assert_called_once_with(wait)
+
+
+def test_token_bucket_increase_decrease():
+    bucket = TokenBucket(4.0, min_rate=1.0, max_rate=4.5)
+    bucket.increase()
+    assert bucket.rate == 4.5
+    bucket.increase()
+    assert bucket.rate == 4.5  # max_rate
+    bucket.decrease()
+    assert bucket.rate == 2.25
+    bucket.decrease()
+    bucket.decrease()
+    assert bucket.rate == 1.0  # min_rate
+
+
+def _operation(service_name):
+    operation = mock.Mock()
+    operation.service_model.service_name = service_name
+    return operation
+
+
+def _throttle(limiter, operation):
+    response = (mock.Mock(status_code=429),
+                {'Error': {'Code': 'TooManyRequestsException'}})
+    assert limiter._needs_retry(operation, response=response) is None
+
+
+def _call(limiter, operation, status_code=200):
+    context = {}
+    limiter._before_call(model=operation, context=context)
+    limiter._after_call(mock.Mock(status_code=status_code), model=operation,
+                        context=context)
+
+
+def test_rate_limiter_only_limits_throttled_services():
+    limiter = RateLimiter()
+    lambda_ = _operation('lambda')
+    _call(limiter, lambda_)
+    assert limiter.get_bucket('lambda') is None
+    _throttle(limiter, lambda_)
+    assert limiter.get_bucket('lambda').rate == DEFAULT_START_RATE
+    assert limiter.get_bucket('logs') is None
+
+
+def test_rate_limiter_backs_off_on_throttling():
+    limiter = RateLimiter(start_rate=8.0)
+    operation = _operation('apigateway')
+    _throttle(limiter, operation)
+    _throttle(limiter, operation)
+    assert limiter.get_bucket('apigateway').rate == 4.0
+
+    _call(limiter, operation)
+    assert limiter.get_bucket('apigateway').rate == 4.5
+
+
+def test_rate_limiter_stops_limiting_after_recovery():
+    limiter = RateLimiter(start_rate=9.0, max_rate=10.0)
+    operation = _operation('lambda')
+    _throttle(limiter, operation)
+    _call(limiter, operation)
+    assert limiter.get_bucket('lambda').rate == 9.5
+    _call(limiter, operation)
+    assert limiter.get_bucket('lambda') is None
+
+
+def test_rate_limiter_max_rate_from_env():
+    with mock.patch.dict('os.environ', {'GCDT_MAX_REQUEST_RATE': '4'}):
+        limiter = RateLimiter()
+    _throttle(limiter, _operation('lambda'))
+    assert limiter.get_bucket('lambda').rate == 4.0
+
+
+def test_rate_limiter_ignores_cache_hits():
+    limiter = RateLimiter(start_rate=8.0)
+    operation = _operation('lambda')
+    _throttle(limiter, operation)
+    # cached responses skip before-call so there is no request marker
+    limiter._after_call(mock.Mock(status_code=200), model=operation,
+                        context={})
+    assert limiter.get_bucket('lambda').rate == 8.0
+
+
+def test_is_throttling_error():
+    assert is_throttling_error({'Error': {'Code': 'Throttling'}})
+    assert not is_throttling_error({'Error': {'Code': 'AccessDenied'}})
+    assert not is_throttling_error({})
+    assert not is_throttling_error(None)
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
+import base64
+import io
 import os
 import sys
 import logging
@@ -16,16 +18,28 @@ import pytest
 import mock
 import maya
 
-from gcdt.ramuda_core import cleanup_bundle, bundle_lambda
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+from gcdt.ramuda_core import cleanup_bundle, bundle_lambda, \
+    _wait_for_lambda_function, _get_configuration_changes, deploy_lambda, \
+    _update_reserved_concurrency, _update_provisioned_concurrency, \
+    logs, get_fleet_metrics, sort_fleet_metrics, format_fleet_metrics, \
+    FLEET_METRICS, get_function_list, format_function_list, load_test, warm
 from gcdt.ramuda_utils import unit, \
     aggregate_datapoints, create_sha256, ProgressPercentage, \
     list_of_dict_equals, create_aws_s3_arn, get_rule_name_from_event_arn, \
     get_bucket_from_s3_arn, build_filter_rules, create_sha256_urlsafe, \
-    check_and_format_logs_params
+    check_and_format_logs_params, s3_upload, Bundle, get_bundle, \
+    parse_report_line, parse_report_lines, get_report_stats, \
+    format_report_stats, parse_duration, \
+    read_payloads, get_latency_histogram, get_load_test_stats, \
+    format_load_test_stats, format_warm_stats
 from gcdt.utils import json2table
 from gcdt_testtools.helpers import create_tempfile, get_size, temp_folder, \
     cleanup_tempfiles
-from gcdt_testtools.helpers import logcapture  # fixtures!
+from gcdt_testtools.helpers import logcapture, stubbed_session, \
+    stubbed_awsclient  # fixtures!
 from . import here
 
 
@@ -172,6 +186,45 @@ def test_bundle_lambda(temp_folder, logcapture):
     assert records[0][2] == 'Finished - a bundle.zip is waiting for you...'
 
 
+def test_bundle_lambda_from_file(temp_folder):
+    with open('source.zip', 'wb') as zfile:
+        zfile.write(b'that was easy__')
+    exit_code = bundle_lambda(get_bundle(os.path.abspath('source.zip')))
+    assert exit_code == 0
+    with open('bundle.zip', 'rb') as zfile:
+        assert zfile.read() == b'that was easy__'
+
+
+def test_bundle(temp_folder):
+    data = b'Meine Oma f\xc3\xa4hrt im H\xc3\xbchnerstall Motorrad'
+    with open('bundle.zip', 'wb') as zfile:
+        zfile.write(data)
+    for bundle in [get_bundle(data), get_bundle(os.path.abspath('bundle.zip'))]:
+        assert isinstance(bundle, Bundle)
+        assert bundle.size == len(data)
+        assert bundle.read() == data
+        assert bundle.sha256 == create_sha256(data).decode('ascii')
+        assert bundle.sha256_urlsafe == \
+            create_sha256_urlsafe(data).decode('ascii')
+        with bundle.open() as bfile:
+            assert bfile.read() == data
+
+
+def test_get_bundle():
+    bundle = Bundle(data=b'code')
+    assert get_bundle(bundle) is bundle
+    assert get_bundle(None) is None
+    assert not get_bundle(b'')
+
+
+def test_bundle_sha256_is_cached():
+    bundle = Bundle(data=b'code')
+    with mock.patch.object(bundle, 'open', wraps=bundle.open) as mocked_open:
+        assert bundle.sha256 == bundle.sha256
+        assert bundle.sha256_urlsafe
+    assert mocked_open.call_count == 1
+
+
 LOGS_PARAM_CASES = [
     ('2w', '1w', False, '2014-12-18 03:00:00', '2014-12-25 03:00:00'),
     ('2w', '2d', False, '2014-12-18 03:00:00', '2014-12-30 03:00:00'),
@@ -194,3 +247,566 @@ def test_check_and_format_logs_params(mocked_maya_now, start, end, tail, exp_sta
         assert end_ts is None
     else:
         assert end_ts == maya.parse(exp_end_ts).datetime(naive=True)
+
+
+@mock.patch('gcdt.ramuda_core.time.sleep')
+def test_wait_for_lambda_function(mocked_sleep, stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    client_lambda = awsclient.get_client('lambda')
+    with Stubber(client_lambda) as stubber:
+        stubber.add_response('get_function_configuration',
+                             {'FunctionName': 'foo', 'State': 'Pending'})
+        stubber.add_response('get_function_configuration',
+                             {'FunctionName': 'foo', 'State': 'Active',
+                              'LastUpdateStatus': 'InProgress'})
+        stubber.add_response('get_function_configuration',
+                             {'FunctionName': 'foo', 'State': 'Active',
+                              'LastUpdateStatus': 'Successful'})
+        with mock.patch.object(awsclient, 'refresh_credentials') as \
+                mocked_refresh_credentials:
+            configuration = _wait_for_lambda_function(
+                awsclient, 'foo', {'FunctionName': 'foo', 'State': 'Pending'})
+        stubber.assert_no_pending_responses()
+    assert configuration['State'] == 'Active'
+    # long waits must not run out of credentials
+    assert mocked_refresh_credentials.call_count == 3
+    # poll intervals grow (note: the rate limiter sleeps shorter intervals)
+    delays = [c[0][0] for c in mocked_sleep.call_args_list]
+    assert [d for d in delays if d >= 0.5] == [0.5, 0.75, 1.125]
+
+
+def test_wait_for_lambda_function_ready(stubbed_awsclient):
+    # no polling if the function is ready
+    awsclient = stubbed_awsclient
+    with Stubber(awsclient.get_client('lambda')):
+        assert _wait_for_lambda_function(
+            awsclient, 'foo', {'State': 'Active'}) == {'State': 'Active'}
+
+
+def test_wait_for_lambda_function_failed(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    with pytest.raises(Exception) as einfo:
+        _wait_for_lambda_function(
+            awsclient, 'foo',
+            {'State': 'Failed', 'StateReason': 'ENI limit reached'})
+    assert 'ENI limit reached' in str(einfo.value)
+
+
+def _configuration(**kwargs):
+    configuration = {
+        'FunctionName': 'foo', 'Role': 'arn:role', 'Handler': 'handler.handle',
+        'Description': 'foo function', 'Timeout': 300, 'MemorySize': 256,
+        'Environment': {'Variables': {'ENV': 'DEV'}}, 'Version': '$LATEST',
+        'VpcConfig': {'SubnetIds': ['subnet-1', 'subnet-2'],
+                      'SecurityGroupIds': ['sg-1'], 'VpcId': 'vpc-1'}
+    }
+    configuration.update(kwargs)
+    return configuration
+
+
+def test_get_configuration_changes():
+    args = ['arn:role', 'handler.handle', 'foo function', '300', '256',
+            ['subnet-2', 'subnet-1'], ['sg-1'], {'ENV': 'DEV'}]
+    assert _get_configuration_changes(_configuration(), *args) == []
+    assert _get_configuration_changes(
+        _configuration(MemorySize=128, Environment={}), *args) == \
+        ['Environment', 'MemorySize']
+    assert _get_configuration_changes(
+        _configuration(VpcConfig={}), *args) == ['VpcConfig']
+
+
+def test_deploy_lambda_up_to_date(stubbed_awsclient):
+    zipfile = b'some code'
+    awsclient = stubbed_awsclient
+    client_lambda = awsclient.get_client('lambda')
+    configuration = _configuration(
+        CodeSha256=create_sha256(zipfile).decode('ascii'))
+    with Stubber(client_lambda) as stubber:
+        stubber.add_response('get_function',
+                             {'Configuration': configuration})
+        stubber.add_response('get_alias', {'FunctionVersion': '$LATEST'})
+        # no update, ping and alias deployment
+        exit_code = deploy_lambda(
+            awsclient, 'foo', 'arn:role', 'handler.py', 'handler.handle',
+            [], 'foo function', 300, 256,
+            subnet_ids=['subnet-1', 'subnet-2'], security_groups=['sg-1'],
+            zipfile=zipfile, environment={'ENV': 'DEV'})
+        stubber.assert_no_pending_responses()
+    assert exit_code == 0
+
+
+@mock.patch('gcdt.ramuda_core._deploy_alias')
+@mock.patch('gcdt.ramuda_core.ping')
+@mock.patch('gcdt.ramuda_core._update_lambda', return_value='4')
+def test_deploy_lambda_after_failed_ping(mocked_update_lambda, mocked_ping,
+                                         mocked_deploy_alias,
+                                         stubbed_awsclient):
+    zipfile = b'some code'
+    awsclient = stubbed_awsclient
+    kwargs = dict(subnet_ids=['subnet-1', 'subnet-2'],
+                  security_groups=['sg-1'], zipfile=zipfile,
+                  environment={'ENV': 'DEV'},
+                  fail_deployment_on_unsuccessful_ping=True)
+    args = [awsclient, 'foo', 'arn:role', 'handler.py', 'handler.handle',
+            [], 'foo function', 300, 256]
+    old_configuration = _configuration(CodeSha256='old code', Version='3')
+    new_configuration = _configuration(
+        CodeSha256=create_sha256(zipfile).decode('ascii'))
+    with Stubber(awsclient.get_client('lambda')) as stubber:
+        # the new code is published but the ping fails
+        stubber.add_response('get_function',
+                             {'Configuration': old_configuration})
+        mocked_ping.return_value = 'error'
+        assert deploy_lambda(*args, **kwargs) == 1
+        assert not mocked_deploy_alias.called
+
+        # $LATEST is up to date, the alias still points to the old version
+        stubber.add_response('get_function',
+                             {'Configuration': new_configuration})
+        stubber.add_response('get_alias', {'FunctionVersion': '3'},
+                             {'FunctionName': 'foo', 'Name': 'ACTIVE'})
+        stubber.add_response('get_function_configuration', old_configuration,
+                             {'FunctionName': 'foo', 'Qualifier': '3'})
+        mocked_ping.return_value = '"alive"'
+        assert deploy_lambda(*args, **kwargs) == 0
+        stubber.assert_no_pending_responses()
+    mocked_deploy_alias.assert_called_once_with(
+        awsclient, 'foo', '4', provisioned_concurrency=None)
+
+
+def test_s3_upload_skips_existing_bundle(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    client_s3 = awsclient.get_client('s3')
+    # the key does not depend on the function name
+    key = 'ramuda/eu-west-1/bundles/%s.zip' % \
+        create_sha256_urlsafe(b'some code').decode('ascii')
+    with Stubber(client_s3) as stubber:
+        stubber.add_response('head_object',
+                             {'ETag': '"etag"', 'VersionId': 'v1'},
+                             {'Bucket': 'bucket', 'Key': key})
+        assert s3_upload(awsclient, 'bucket', b'some code', 'foo') == \
+            (key, '"etag"', 'v1')
+        stubber.add_response('head_object',
+                             {'ETag': '"etag"', 'VersionId': 'v1'},
+                             {'Bucket': 'bucket', 'Key': key})
+        assert s3_upload(awsclient, 'bucket', b'some code', 'bar') == \
+            (key, '"etag"', 'v1')
+        stubber.assert_no_pending_responses()
+
+
+def test_s3_upload_from_memory(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    client_s3 = awsclient.get_client('s3')
+    with Stubber(client_s3) as stubber:
+        stubber.add_client_error('head_object', '404', http_status_code=404)
+        stubber.add_response('put_object',
+                             {'ETag': '"etag"', 'VersionId': 'v1'})
+        dest_key, etag, version_id = s3_upload(awsclient, 'bucket',
+                                               b'some code', 'foo')
+        stubber.assert_no_pending_responses()
+    assert (etag, version_id) == ('"etag"', 'v1')
+
+
+def test_s3_upload_without_list_bucket_permission(stubbed_awsclient):
+    # S3 answers 403 for missing objects without s3:ListBucket permission
+    awsclient = stubbed_awsclient
+    client_s3 = awsclient.get_client('s3')
+    with Stubber(client_s3) as stubber:
+        stubber.add_client_error('head_object', '403', http_status_code=403)
+        stubber.add_response('put_object',
+                             {'ETag': '"etag"', 'VersionId': 'v1'})
+        dest_key, etag, version_id = s3_upload(awsclient, 'bucket',
+                                               b'some code', 'foo')
+        stubber.assert_no_pending_responses()
+    assert (etag, version_id) == ('"etag"', 'v1')
+
+
+@mock.patch('gcdt.cloudwatch_logs.filter_log_events')
+def test_logs_merges_functions(mocked_filter_log_events, logcapture):
+    logcapture.level = logging.INFO
+    entries = {
+        '/aws/lambda/foo': [{'timestamp': 1420070400000, 'message': 'foo 1'},
+                            {'timestamp': 1420070402000, 'message': 'foo 2'}],
+        '/aws/lambda/bar': [{'timestamp': 1420070401000, 'message': 'bar 1'}]
+    }
+    mocked_filter_log_events.side_effect = \
+        lambda awsclient, log_group_name, start_ts, end_ts, **kwargs: \
+        [e for e in entries[log_group_name]
+         if start_ts <= e['timestamp'] <= end_ts]
+    exit_code = logs('my_awsclient', ['foo', 'bar'],
+                     maya.when('2015-01-01').datetime(),
+                     maya.when('2015-01-01 01:00').datetime())
+    assert exit_code == 0
+    records = [r[2] for r in logcapture.actual() if r[1] == 'INFO']
+    assert records == ['2015-01-01', '00:00:00  foo  foo 1',
+                       '00:00:01  bar  bar 1', '00:00:02  foo  foo 2']
+
+
+REPORT_LINE = 'REPORT RequestId: 3604209a-e9a3-11e6-939a-754dd98c7be3\t' \
+              'Duration: 12.50 ms\tBilled Duration: 100 ms \t' \
+              'Memory Size: 128 MB\tMax Memory Used: 18 MB\t'
+
+
+def test_parse_report_line():
+    assert parse_report_line(REPORT_LINE) == {
+        'request_id': '3604209a-e9a3-11e6-939a-754dd98c7be3',
+        'duration': 12.5, 'billed_duration': 100.0, 'memory_size': 128,
+        'max_memory_used': 18, 'init_duration': None
+    }
+    report = parse_report_line(REPORT_LINE + 'Init Duration: 150.25 ms\t\n')
+    assert report['init_duration'] == 150.25
+    assert parse_report_line('START RequestId: 3604209a Version: $LATEST') \
+        is None
+
+
+def test_parse_report_lines():
+    messages = [REPORT_LINE, 'START RequestId: 3604209a Version: $LATEST',
+                REPORT_LINE + 'Init Duration: 150.25 ms\t\n', REPORT_LINE]
+    # batches do not need to line up with the REPORT lines
+    columns = parse_report_lines(messages, batch_size=2)
+    assert list(columns['duration']) == [12.5, 12.5, 12.5]
+    assert list(columns['billed_duration']) == [100.0, 100.0, 100.0]
+    assert list(columns['memory_size']) == [128, 128, 128]
+    assert list(columns['max_memory_used']) == [18, 18, 18]
+    assert list(columns['init_duration']) == [150.25]
+
+
+def test_get_report_stats():
+    messages = [
+        'REPORT RequestId: %d\tDuration: %d.00 ms\tBilled Duration: 100 ms'
+        '\tMemory Size: 128 MB\tMax Memory Used: %d MB\t%s' % (
+            d, d, 32 + d % 3, 'Init Duration: 200.00 ms' if d % 10 == 0
+            else '')
+        for d in range(1, 101)]
+    stats = get_report_stats(parse_report_lines(messages))
+    assert stats['invocations'] == 100
+    assert (stats['duration_p50'], stats['duration_p90'],
+            stats['duration_p99']) == (50.0, 90.0, 99.0)
+    assert stats['cold_starts'] == 10
+    assert stats['cold_start_rate'] == 0.1
+    assert stats['init_duration_p99'] == 200.0
+    assert stats['max_memory_used'] == 34
+    assert stats['memory_headroom'] == 1.0 - 34 / 128.0
+    assert stats['billed_waste'] == 1.0 - 5050 / 10000.0
+    assert 'cold starts' in format_report_stats(stats)
+    assert get_report_stats(parse_report_lines([])) is None
+
+
+def test_parse_duration():
+    assert parse_duration('300') == 300
+    assert parse_duration('5m') == 300
+    assert parse_duration('1h') == 3600
+    assert parse_duration('3d') == 3 * 24 * 3600
+    assert parse_duration('2w') == 14 * 24 * 3600
+
+
+@mock.patch('gcdt.ramuda_core.METRICS_MAX_QUERIES', len(FLEET_METRICS))
+def test_get_fleet_metrics(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    end_dt = maya.when('2018-05-01').datetime()
+    values = {'Invocations': [10.0, 30.0], 'Errors': [1.0],
+              'Throttles': [], 'Duration': [400.0, 800.0],
+              'ConcurrentExecutions': [2.0, 5.0], 'IteratorAge': []}
+
+    def _results(fidx, factor):
+        results = []
+        for midx, (_, metric, stat) in enumerate(FLEET_METRICS):
+            vals = [v * factor for v in values[metric]]
+            if stat == 'p99':
+                vals = [90.0 * factor, 120.0 * factor]
+            results.append({'Id': 'm%d_%d' % (fidx, midx),
+                            'Label': metric, 'Values': vals,
+                            'StatusCode': 'Complete'})
+        return results
+
+    with Stubber(awsclient.get_client('cloudwatch')) as stubber:
+        # one batch per function, first batch paginated
+        stubber.add_response('get_metric_data', {
+            'MetricDataResults': _results(0, 1)[:3], 'NextToken': 'token1'})
+        stubber.add_response('get_metric_data', {
+            'MetricDataResults': _results(0, 1)[3:]})
+        stubber.add_response('get_metric_data', {
+            'MetricDataResults': _results(1, 2)})
+        with mock.patch('gcdt.ramuda_core.METRICS_MAX_WORKERS', 1):
+            rows = get_fleet_metrics(awsclient, ['foo', 'bar'], period=300,
+                                     window=3600, end_dt=end_dt)
+        stubber.assert_no_pending_responses()
+
+    assert rows[0] == {'function': 'foo', 'invocations': 40, 'errors': 1,
+                       'throttles': 0, 'duration_avg': 30.0,
+                       'duration_p99': 120.0, 'concurrency_max': 5.0,
+                       'iterator_age_max': None}
+    assert rows[1]['invocations'] == 80
+    assert [r['function'] for r in sort_fleet_metrics(rows)] == \
+        ['bar', 'foo']
+    assert [r['function'] for r in sort_fleet_metrics(rows, 'function')] == \
+        ['bar', 'foo']
+    with pytest.raises(ValueError):
+        sort_fleet_metrics(rows, 'foo')
+    assert 'duration p99 [ms]' in format_fleet_metrics(rows)
+    assert '"invocations": 40' in format_fleet_metrics(rows, 'json')
+
+
+def _function(name, runtime='python3.6'):
+    return {'FunctionName': name, 'Runtime': runtime, 'MemorySize': 128,
+            'Timeout': 30, 'CodeSize': 1024,
+            'LastModified': '2018-05-01T12:00:00.000+0000'}
+
+
+@mock.patch('gcdt.ramuda_core.LIST_MAX_WORKERS', 1)
+def test_get_function_list(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    with Stubber(awsclient.get_client('lambda')) as stubber:
+        stubber.add_response('list_functions', {
+            'Functions': [_function('foo-b'), _function('bar')],
+            'NextMarker': 'marker1'})
+        stubber.add_response('list_functions', {
+            'Functions': [_function('foo-a', 'nodejs6.10')]})
+        rows = get_function_list(awsclient, prefix='foo')
+        stubber.assert_no_pending_responses()
+    assert [r['function'] for r in rows] == ['foo-a', 'foo-b']
+    assert rows[0]['runtime'] == 'nodejs6.10'
+    assert 'active_version' not in rows[0]
+
+    with Stubber(awsclient.get_client('lambda')) as stubber:
+        stubber.add_response('list_functions', {
+            'Functions': [_function('foo-a', 'nodejs6.10'),
+                          _function('foo-b')]})
+        stubber.add_response('list_aliases', {
+            'Aliases': [{'Name': 'ACTIVE', 'FunctionVersion': '3'}]},
+            {'FunctionName': 'foo-b'})
+        stubber.add_response('get_function_concurrency', {
+            'ReservedConcurrentExecutions': 5}, {'FunctionName': 'foo-b'})
+        rows = get_function_list(awsclient, runtime='python3.6', details=True)
+        stubber.assert_no_pending_responses()
+    assert rows == [{
+        'function': 'foo-b', 'runtime': 'python3.6', 'memory': 128,
+        'timeout': 30, 'code_size': 1024,
+        'last_modified': '2018-05-01T12:00:00.000+0000',
+        'active_version': '3', 'reserved_concurrency': 5}]
+    assert 'reserved_concurrency' in format_function_list(rows)
+    assert format_function_list([]) == ''
+
+    # versions are only counted on request
+    with Stubber(awsclient.get_client('lambda')) as stubber:
+        stubber.add_response('list_functions', {
+            'Functions': [_function('foo-b')]})
+        stubber.add_response('list_versions_by_function', {
+            'Versions': [{'Version': '$LATEST'}, {'Version': '2'},
+                         {'Version': '3'}]},
+            {'FunctionName': 'foo-b'})
+        rows = get_function_list(awsclient, versions=True)
+        stubber.assert_no_pending_responses()
+    assert rows[0]['versions'] == 2
+    assert '"versions": 2' in format_function_list(rows, 'json')
+
+
+def test_read_payloads(tmpdir):
+    jsonl = tmpdir.join('payloads.jsonl')
+    jsonl.write('{"id": 1}\n\n{"id": 2}\n')
+    assert read_payloads(str(jsonl)) == ['{"id": 1}', '{"id": 2}']
+    jsonl.write('{"id": 1}\n{"id": \n')
+    with pytest.raises(ValueError) as e:
+        read_payloads(str(jsonl))
+    assert 'payloads.jsonl:2' in str(e.value)
+
+
+def test_get_load_test_stats():
+    assert get_latency_histogram([5, 10, 11, 20000], [10, 100]) == \
+        [(10, 2), (100, 1), (None, 1)]
+    results = [(float(l), 'ok') for l in range(1, 101)] + \
+        [(200.0, 'error'), (1.0, 'throttled')]
+    stats = get_load_test_stats(results, 2.0)
+    assert stats['invocations'] == 102
+    assert stats['throughput'] == 51.0
+    assert stats['errors'] == 1
+    assert stats['throttles'] == 1
+    assert stats['latency_p50'] == 51.0
+    assert stats['latency_p99'] == 100.0
+    assert stats['latency_max'] == 200.0
+    table = format_load_test_stats(stats)
+    assert '<= 10 ms' in table
+    assert '> 10000 ms' not in table
+    assert '"throttles": 1' in format_load_test_stats(stats, 'json')
+
+
+def _invoke_response(payload=b'{"ramuda_response": "alive"}', **kwargs):
+    kwargs.update({'StatusCode': 200,
+                   'Payload': StreamingBody(io.BytesIO(payload),
+                                            len(payload))})
+    return kwargs
+
+
+def test_load_test(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    client_lambda = awsclient.get_client('lambda')
+    with Stubber(client_lambda) as stubber:
+        for payload in ['{"id": 1}', '{"id": 2}', '{"id": 1}']:
+            stubber.add_response('invoke', _invoke_response(), {
+                'FunctionName': 'foo', 'InvocationType': 'RequestResponse',
+                'Payload': payload, 'Qualifier': 'ACTIVE'})
+        stubber.add_response('invoke', _invoke_response(
+            b'{"errorMessage": "boom"}', FunctionError='Unhandled'))
+        stubber.add_client_error('invoke', 'TooManyRequestsException',
+                                 http_status_code=429)
+        with mock.patch.object(awsclient, 'create_client',
+                               return_value=client_lambda):
+            stats = load_test(awsclient, 'foo', ['{"id": 1}', '{"id": 2}'],
+                              count=5, concurrency=1)
+        stubber.assert_no_pending_responses()
+    assert stats['invocations'] == 5
+    assert stats['errors'] == 1
+    assert stats['throttles'] == 1
+    assert sum(count for _, count in stats['histogram']) == 4
+
+
+def _log_result(init_duration=None):
+    report = 'REPORT RequestId: 1c2d\tDuration: 1.20 ms\t' \
+             'Billed Duration: 100 ms\tMemory Size: 128 MB\t' \
+             'Max Memory Used: 20 MB\t'
+    if init_duration:
+        report += 'Init Duration: %0.2f ms\t' % init_duration
+    return base64.b64encode(
+        ('START RequestId: 1c2d\nEND RequestId: 1c2d\n%s\n' % report)
+        .encode('utf-8')).decode('ascii')
+
+
+def test_warm(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    client_lambda = awsclient.get_client('lambda')
+    expected_params = {
+        'FunctionName': 'foo', 'InvocationType': 'RequestResponse',
+        'Payload': '{"ramuda_action": "ping"}', 'Qualifier': 'ACTIVE',
+        'LogType': 'Tail'}
+    with Stubber(client_lambda) as stubber:
+        stubber.add_response('invoke', _invoke_response(
+            LogResult=_log_result(250.0)), expected_params)
+        stubber.add_response('invoke', _invoke_response(
+            LogResult=_log_result(350.0)), expected_params)
+        stubber.add_response('invoke', _invoke_response(
+            LogResult=_log_result()), expected_params)
+        stubber.add_client_error('invoke', 'ServiceException',
+                                 http_status_code=500)
+        with mock.patch.object(awsclient, 'create_client',
+                               return_value=client_lambda):
+            stats = warm(awsclient, 'foo', 4)
+        stubber.assert_no_pending_responses()
+    assert stats == {'containers': 4, 'cold': 2, 'warm': 1, 'errors': 1,
+                     'init_duration_p50': 250.0, 'init_duration_max': 350.0}
+    assert '250.0 ms / 350.0 ms' in format_warm_stats(stats)
+
+
+@mock.patch('gcdt.ramuda_core.warm', return_value={
+    'containers': 2, 'cold': 2, 'warm': 0, 'errors': 0})
+@mock.patch('gcdt.ramuda_core._deploy_alias')
+@mock.patch('gcdt.ramuda_core.ping', return_value='alive')
+@mock.patch('gcdt.ramuda_core._update_lambda', return_value='2')
+def test_deploy_lambda_warm(mocked_update_lambda, mocked_ping,
+                            mocked_deploy_alias, mocked_warm,
+                            stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    with Stubber(awsclient.get_client('lambda')) as stubber:
+        stubber.add_response('get_function',
+                             {'Configuration': _configuration(MemorySize=128)})
+        exit_code = deploy_lambda(
+            awsclient, 'foo', 'arn:role', 'handler.py', 'handler.handle',
+            [], 'foo function', 300, 256,
+            subnet_ids=['subnet-1', 'subnet-2'], security_groups=['sg-1'],
+            environment={'ENV': 'DEV'}, warm_containers=2)
+        stubber.assert_no_pending_responses()
+    assert exit_code == 0
+    mocked_deploy_alias.assert_called_once_with(
+        awsclient, 'foo', '2', provisioned_concurrency=None)
+    mocked_warm.assert_called_once_with(awsclient, 'foo', 2)
+
+
+def test_update_reserved_concurrency(stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    with Stubber(awsclient.get_client('lambda')) as stubber:
+        stubber.add_response('put_function_concurrency',
+                             {'ReservedConcurrentExecutions': 50},
+                             {'FunctionName': 'foo',
+                              'ReservedConcurrentExecutions': 50})
+        stubber.add_response('delete_function_concurrency', {},
+                             {'FunctionName': 'foo'})
+        _update_reserved_concurrency(awsclient, 'foo', 50, 50)  # no change
+        _update_reserved_concurrency(awsclient, 'foo', 50, 10)
+        _update_reserved_concurrency(awsclient, 'foo', None, 50)
+        stubber.assert_no_pending_responses()
+
+
+def _provisioned_config(status, requested=5, **kwargs):
+    kwargs.update({'RequestedProvisionedConcurrentExecutions': requested,
+                   'Status': status})
+    return kwargs
+
+
+@mock.patch('gcdt.ramuda_core.time.sleep')
+def test_update_provisioned_concurrency(mocked_sleep, stubbed_awsclient):
+    awsclient = stubbed_awsclient
+    params = {'FunctionName': 'foo', 'Qualifier': 'ACTIVE'}
+    with Stubber(awsclient.get_client('lambda')) as stubber:
+        stubber.add_client_error(
+            'get_provisioned_concurrency_config',
+            'ProvisionedConcurrencyConfigNotFoundException',
+            http_status_code=404)
+        stubber.add_response(
+            'put_provisioned_concurrency_config',
+            _provisioned_config('IN_PROGRESS'),
+            dict(params, ProvisionedConcurrentExecutions=5))
+        stubber.add_response('get_provisioned_concurrency_config',
+                             _provisioned_config('IN_PROGRESS'), params)
+        stubber.add_response('get_provisioned_concurrency_config',
+                             _provisioned_config('READY'), params)
+        _update_provisioned_concurrency(awsclient, 'foo', 'ACTIVE', 5)
+        stubber.assert_no_pending_responses()
+    # note: the rate limiter sleeps, too
+    assert mock.call(1.0) in mocked_sleep.call_args_list
+    assert mock.call(1.5) in mocked_sleep.call_args_list
+
+    # unchanged but the alias moved to a new version
+    with Stubber(awsclient.get_client('lambda')) as stubber:
+        stubber.add_response('get_provisioned_concurrency_config',
+                             _provisioned_config('FAILED',
+                                                 StatusReason='no capacity'),
+                             params)
+        with pytest.raises(Exception) as einfo:
+            _update_provisioned_concurrency(awsclient, 'foo', 'ACTIVE', 5)
+        assert 'no capacity' in str(einfo.value)
+
+    with Stubber(awsclient.get_client('lambda')) as stubber:
+        stubber.add_response('get_provisioned_concurrency_config',
+                             _provisioned_config('READY'), params)
+        stubber.add_response('delete_provisioned_concurrency_config', {},
+                             params)
+        _update_provisioned_concurrency(awsclient, 'foo', 'ACTIVE', 0)
+        stubber.assert_no_pending_responses()
+
+
+@mock.patch('gcdt.ramuda_core._update_provisioned_concurrency')
+def test_deploy_lambda_up_to_date_concurrency(
+        mocked_update_provisioned_concurrency, stubbed_awsclient):
+    zipfile = b'some code'
+    awsclient = stubbed_awsclient
+    configuration = _configuration(
+        CodeSha256=create_sha256(zipfile).decode('ascii'))
+    with Stubber(awsclient.get_client('lambda')) as stubber:
+        stubber.add_response('get_function', {
+            'Configuration': configuration,
+            'Concurrency': {'ReservedConcurrentExecutions': 10}})
+        stubber.add_response('get_alias', {'FunctionVersion': '$LATEST'})
+        stubber.add_response('put_function_concurrency',
+                             {'ReservedConcurrentExecutions': 20},
+                             {'FunctionName': 'foo',
+                              'ReservedConcurrentExecutions': 20})
+        exit_code = deploy_lambda(
+            awsclient, 'foo', 'arn:role', 'handler.py', 'handler.handle',
+            [], 'foo function', 300, 256,
+            subnet_ids=['subnet-1', 'subnet-2'], security_groups=['sg-1'],
+            zipfile=zipfile, environment={'ENV': 'DEV'},
+            concurrency={'reservedConcurrentExecutions': 20})
+        stubber.assert_no_pending_responses()
+    assert exit_code == 0
+    # not configured means no provisioned concurrency
+    mocked_update_provisioned_concurrency.assert_called_once_with(
+        awsclient, 'foo', 'ACTIVE', 0)
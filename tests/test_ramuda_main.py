@@ -9,7 +9,8 @@ import pytest
 
 from gcdt import utils
 from gcdt.ramuda_main import version_cmd, clean_cmd, list_cmd, deploy_cmd, \
-    delete_cmd, metrics_cmd, ping_cmd, bundle_cmd, invoke_cmd, logs_cmd
+    delete_cmd, metrics_cmd, ping_cmd, bundle_cmd, invoke_cmd, logs_cmd, \
+    load_test_cmd
 from gcdt_bundler.bundler import bundle
 
 from gcdt_testtools.helpers_aws import check_preconditions, get_tooldata, \
@@ -49,6 +50,18 @@ def test_clean_cmd(temp_folder):
         assert not os.path.exists(path)
 
 
+@pytest.mark.parametrize('concurrency, count', [
+    ('0', None), ('-1', '10'), ('2', '0'), ('two', None)
+])
+def test_load_test_cmd_invalid_numbers(concurrency, count, logcapture):
+    tooldata = {'context': {'_awsclient': None}}
+    assert load_test_cmd('foo', None, concurrency, count, None, None, False,
+                         **tooldata) == 1
+    records = list(logcapture.actual())
+    assert records[-1][1] == 'ERROR'
+    assert 'must be a positive number' in records[-1][2]
+
+
 @pytest.mark.aws
 @check_preconditions
 def test_list_cmd(awsclient, vendored_folder, temp_lambda, logcapture):
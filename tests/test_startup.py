@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import pytest
+
+from gcdt_testtools.startup_benchmark import TOOL_MODULES, \
+    loaded_heavy_modules, measure_import_time
+
+
+@pytest.mark.parametrize('module', TOOL_MODULES)
+def test_tool_startup_defers_heavy_imports(module):
+    # the heavy modules are imported once a command needs them
+    assert loaded_heavy_modules(module) == []
+
+
+def test_measure_import_time():
+    assert measure_import_time('gcdt.gcdt_cmd_dispatcher') > 0.0
@@ -1,19 +1,28 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
 
+import datetime
 import nose
 import os
 import sys
 import json
+import threading
 from collections import OrderedDict
+from itertools import islice
 
+import botocore.session
+from botocore.credentials import RefreshableCredentials
+from botocore.stub import Stubber
+import mock
 import pytest
 from nose.tools import assert_equal
 
 from gcdt import utils
+from gcdt.gcdt_awsclient import AWSClient
 from gcdt.utils import retries, \
     get_command, dict_merge, get_env, get_context, flatten, json2table, \
-    fix_old_kumo_config, dict_selective_merge, all_pages
+    fix_old_kumo_config, dict_selective_merge, all_pages, check_gcdt_update, \
+    are_credentials_still_valid, iter_pages, iter_items
 from gcdt_testtools.helpers import create_tempfile, preserve_env  # fixtures!
 from gcdt_testtools.helpers import logcapture  # fixtures!
 
@@ -304,7 +313,7 @@ def test_all_pages():
     state = {'counter': 0}
 
     def dummy_method(**kwargs):
-        # I represent the service method
+        # stub for a paginated service method with nextToken
         nextToken = kwargs.pop('nextToken', None)
         if nextToken:
             assert nextToken == state['counter']
@@ -326,7 +335,7 @@ def test_all_pages_no_condition():
     state = {'counter': 0}
 
     def dummy_method(**kwargs):
-        # I represent the service method
+        # stub for a paginated service method with nextToken
         nextToken = kwargs.pop('nextToken', None)
         if nextToken:
             assert nextToken == state['counter']
@@ -343,6 +352,50 @@ def test_all_pages_no_condition():
     assert actual == ['bar1', 'bar2', 'bar3', 'bar4', 'bar5', 'bar']
 
 
+def _marker_pages(pages):
+    # stub for a paginated service method with Marker / NextMarker
+    calls = []
+
+    def dummy_method(**kwargs):
+        calls.append(kwargs)
+        index = int(kwargs.get('Marker', 0))
+        response = {'Marker': kwargs.get('Marker', ''), 'Items': [index]}
+        if index + 1 < pages:
+            response['NextMarker'] = str(index + 1)
+        return response
+    return dummy_method, calls
+
+
+def test_iter_pages_does_not_change_request():
+    method, calls = _marker_pages(3)
+    request = {'foo': 'bar'}
+    pages = list(iter_pages(method, request))
+    assert len(pages) == 3
+    assert request == {'foo': 'bar'}
+    assert calls == [{'foo': 'bar'}, {'foo': 'bar', 'Marker': '1'},
+                     {'foo': 'bar', 'Marker': '2'}]
+
+
+def test_iter_pages_is_lazy():
+    method, calls = _marker_pages(100)
+    assert list(islice(iter_items(method, {}, lambda r: r['Items']), 2)) == \
+        [0, 1]
+    assert len(calls) == 2
+
+
+def test_iter_pages_callback_stops():
+    method, calls = _marker_pages(100)
+    seen = []
+
+    def _callback(response):
+        seen.append(response['Items'][0])
+        return len(seen) < 3
+
+    assert list(iter_items(method, {}, lambda r: r['Items'],
+                           callback=_callback)) == [0, 1, 2]
+    assert seen == [0, 1, 2]
+
+
 # def all_pages(method, request, accessor, cond=None):
 """Helper to process all pages using botocore service methods (exhausts NextToken).
 note: `cond` is optional... you can use it to make filtering more explicit
@@ -359,5 +412,101 @@ is perfectly fine, too
 
 
 
+@mock.patch('gcdt.package_utils.get_package_versions',
+            return_value=('0.0.1', '0.0.2'))
+def test_check_gcdt_update_is_cached(mocked_get_package_versions, tmpdir,
+                                     monkeypatch, logcapture):
+    monkeypatch.setenv('GCDT_CACHE_DIR', str(tmpdir))
+    # first run checks PyPi in the background
+    check_gcdt_update().join()
+    mocked_get_package_versions.assert_called_once_with('gcdt')
+    # next run uses the cached result
+    assert check_gcdt_update() is None
+    mocked_get_package_versions.assert_called_once_with('gcdt')
+    records = list(logcapture.actual())
+    assert records[-1] == ('gcdt.utils', 'WARNING',
+                           'Please consider an update to gcdt version: 0.0.2')
+
+
+@mock.patch('gcdt.package_utils.get_package_versions',
+            side_effect=Exception('PyPi is down'))
+def test_check_gcdt_update_pypi_down(mocked_get_package_versions, tmpdir,
+                                     monkeypatch):
+    monkeypatch.setenv('GCDT_CACHE_DIR', str(tmpdir))
+    check_gcdt_update().join()
+    # the failed check is cached, too
+    assert check_gcdt_update() is None
+    mocked_get_package_versions.assert_called_once_with('gcdt')
+
+
+def test_check_gcdt_update_marked_before_pypi(tmpdir, monkeypatch):
+    monkeypatch.setenv('GCDT_CACHE_DIR', str(tmpdir))
+    pypi = threading.Event()
+
+    def _get_package_versions(package):
+        pypi.wait()
+        return '0.0.1', '0.0.1'
+
+    with mock.patch('gcdt.package_utils.get_package_versions',
+                    side_effect=_get_package_versions) as mocked:
+        thread = check_gcdt_update()
+        # PyPi has not answered yet but the check is already marked as done
+        assert check_gcdt_update() is None
+        pypi.set()
+        thread.join()
+        mocked.assert_called_once_with('gcdt')
+    assert tmpdir.listdir() == [tmpdir.join('gcdt_update_check.json')]
+
+
+def _awsclient_with_temporary_credentials(expiry):
+    session = botocore.session.Session()
+    session.set_config_variable('region', 'eu-west-1')
+    metadata = {'access_key': 'access_key', 'secret_key': 'secret_key',
+                'token': 'token', 'expiry_time': expiry}
+    session._credentials = RefreshableCredentials.create_from_metadata(
+        metadata, refresh_using=lambda: metadata, method='sts-assume-role')
+    return AWSClient(session)
+
+
+def test_are_credentials_still_valid_is_cached(tmpdir, monkeypatch):
+    monkeypatch.setenv('GCDT_CACHE_DIR', str(tmpdir))
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    awsclient = _awsclient_with_temporary_credentials(
+        expiry.strftime('%Y-%m-%dT%H:%M:%SZ'))
+    client_sts = awsclient.get_client('sts')
+    with Stubber(client_sts) as stubber:
+        stubber.add_response('get_caller_identity', {'Account': '123'})
+        assert are_credentials_still_valid(awsclient) == 0
+        stubber.assert_no_pending_responses()
+    # the positive result is cached
+    with Stubber(client_sts) as stubber:
+        assert are_credentials_still_valid(awsclient) == 0
+
+
+def test_are_credentials_still_valid_expire_soon(tmpdir, monkeypatch):
+    monkeypatch.setenv('GCDT_CACHE_DIR', str(tmpdir))
+    # the credentials expire before a cache entry would
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=10)
+    awsclient = _awsclient_with_temporary_credentials(
+        expiry.strftime('%Y-%m-%dT%H:%M:%SZ'))
+    client_sts = awsclient.get_client('sts')
+    with Stubber(client_sts) as stubber:
+        stubber.add_response('get_caller_identity', {'Account': '123'})
+        stubber.add_response('get_caller_identity', {'Account': '123'})
+        assert are_credentials_still_valid(awsclient) == 0
+        assert are_credentials_still_valid(awsclient) == 0
+        stubber.assert_no_pending_responses()
+
+
+def test_are_credentials_still_valid_expired(tmpdir, monkeypatch):
+    monkeypatch.setenv('GCDT_CACHE_DIR', str(tmpdir))
+    awsclient = AWSClient(botocore.session.Session())
+    client_sts = awsclient.get_client('sts', 'eu-west-1')
+    with mock.patch.object(awsclient, 'get_client', return_value=client_sts), \
+            Stubber(client_sts) as stubber:
+        stubber.add_client_error('get_caller_identity', 'ExpiredToken')
+        assert are_credentials_still_valid(awsclient) == 1
+
+
 # TODO get_outputs_for_stack
 # TODO test_make_command